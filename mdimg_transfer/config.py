@@ -1,8 +1,18 @@
 import os
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 from pathlib import Path
 
+def _parse_host_limits(value: str) -> Dict[str, int]:
+    """解析形如 "host1=2,host2=4" 的按主机并发数配置"""
+    limits = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        host, limit = item.split('=', 1)
+        limits[host.strip().lower()] = int(limit.strip())
+    return limits
+
 @dataclass
 class Config:
     # 数据库配置
@@ -18,6 +28,12 @@ class Config:
     R2_SECRET_ACCESS_KEY: str = os.getenv('R2_SECRET_ACCESS_KEY', '')
     R2_BUCKET_NAME: str = os.getenv('R2_BUCKET_NAME', '')
     R2_PUBLIC_URL: str = os.getenv('R2_PUBLIC_URL', '')  # R2 bucket 的公共访问URL
+    R2_UPLOAD_WORKERS: int = int(str(os.getenv('R2_UPLOAD_WORKERS', 10)).strip())  # 上传线程数
+    R2_MAX_POOL_CONNECTIONS: int = int(str(os.getenv('R2_MAX_POOL_CONNECTIONS', 10)).strip())  # HTTP 连接池大小
+    R2_MULTIPART_THRESHOLD: int = int(str(os.getenv('R2_MULTIPART_THRESHOLD', 8 * 1024 * 1024)).strip())  # 超过该大小使用分片上传
+    R2_MULTIPART_CHUNKSIZE: int = int(str(os.getenv('R2_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024)).strip())  # 分片大小
+    R2_MULTIPART_CONCURRENCY: int = int(str(os.getenv('R2_MULTIPART_CONCURRENCY', 4)).strip())  # 单个对象的分片并发数
+    R2_CONTENT_ADDRESSED: bool = os.getenv('R2_CONTENT_ADDRESSED', 'true').lower() in ('1', 'true', 'yes')  # 按内容哈希命名对象并去重
     
     # 文件路径配置
     BASE_DIR: str = str(Path(__file__).parent.parent)
@@ -25,12 +41,32 @@ class Config:
     PROCESSED_FOLDER: str = os.path.join(BASE_DIR, os.getenv('PROCESSED_FOLDER', 'processed'))
     IMAGE_FOLDER: str = os.path.join(BASE_DIR, os.getenv('IMAGE_FOLDER', 'images'))
     TEMP_DIR: str = os.path.join(BASE_DIR, os.getenv('TEMP_DIR', 'temp'))  # 添加临时目录配置
+    HTTP_CACHE_DIR: str = os.path.join(BASE_DIR, os.getenv('HTTP_CACHE_DIR', 'cache/http'))  # 图片下载的HTTP缓存目录
     
     # 应用配置
     MAX_FILE_SIZE: int = int(str(os.getenv('MAX_FILE_SIZE', 50 * 1024 * 1024)).strip())  # 默认50MB
     MAX_CONCURRENT_DOWNLOADS: int = int(str(os.getenv('MAX_CONCURRENT_DOWNLOADS', 5)).strip())
     DOWNLOAD_TIMEOUT: int = int(str(os.getenv('DOWNLOAD_TIMEOUT', 30)).strip())
     MAX_RETRIES: int = int(str(os.getenv('MAX_RETRIES', 3)).strip())
+    DOWNLOAD_LIMIT_PER_HOST: int = int(str(os.getenv('DOWNLOAD_LIMIT_PER_HOST', 3)).strip())  # 单个主机的下载并发数
+    DOWNLOAD_HOST_LIMITS: Dict[str, int] = field(default_factory=lambda: _parse_host_limits(
+        os.getenv('DOWNLOAD_HOST_LIMITS', 'mmbiz.qpic.cn=2')
+    ))  # 指定主机的下载并发数，格式 host=n,host=n
+    DOWNLOAD_KEEPALIVE_TIMEOUT: int = int(str(os.getenv('DOWNLOAD_KEEPALIVE_TIMEOUT', 30)).strip())  # 空闲连接保持时间（秒）
+    IMAGE_VALIDATION: str = os.getenv('IMAGE_VALIDATION', 'header').strip().lower()  # 下载验证级别：header 只检查文件头，full 另在线程中完整验证
+    FAILED_URL_CACHE_SIZE: int = int(str(os.getenv('FAILED_URL_CACHE_SIZE', 10000)).strip())  # 最多记录的失败URL数
+    FAILED_URL_BACKOFF: int = int(str(os.getenv('FAILED_URL_BACKOFF', 60)).strip())  # 失败URL首次跳过的秒数，之后每次失败翻倍
+    FAILED_URL_BACKOFF_MAX: int = int(str(os.getenv('FAILED_URL_BACKOFF_MAX', 3600)).strip())  # 失败URL跳过时间上限（秒）
+    PROCESSING_STATE_SIZE: int = int(str(os.getenv('PROCESSING_STATE_SIZE', 10000)).strip())  # 保留的下载状态记录数
+    WECHAT_COOKIE_TTL: int = int(str(os.getenv('WECHAT_COOKIE_TTL', 1800)).strip())  # 微信cookies缓存时间（秒）
+    HTTP_POOL_SIZE: int = int(str(os.getenv('HTTP_POOL_SIZE', 50)).strip())  # 共享HTTP会话的连接池大小
+    HTTP_POOL_SIZE_PER_HOST: int = int(str(os.getenv('HTTP_POOL_SIZE_PER_HOST', 0)).strip())  # 单个主机的连接数，0 表示按下载限流配置计算
+    DOWNLOAD_DNS_CACHE_TTL: int = int(str(os.getenv('DOWNLOAD_DNS_CACHE_TTL', 300)).strip())  # DNS 解析缓存时间（秒）
+    TEMP_DIR_QUOTA: int = int(str(os.getenv('TEMP_DIR_QUOTA', 2 * 1024 * 1024 * 1024)).strip())  # 临时目录配额，默认2GB，0 表示不限制
+    HTTP_CACHE_ENABLED: bool = os.getenv('HTTP_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    HTTP_CACHE_MAX_SIZE: int = int(str(os.getenv('HTTP_CACHE_MAX_SIZE', 1024 * 1024 * 1024)).strip())  # HTTP缓存上限，默认1GB
+    MAX_CONCURRENT_UPLOADS: int = int(str(os.getenv('MAX_CONCURRENT_UPLOADS', 5)).strip())
+    PIPELINE_QUEUE_SIZE: int = int(str(os.getenv('PIPELINE_QUEUE_SIZE', 10)).strip())  # 下载与上传之间的队列容量
     
     # 图片处理配置
     MAX_IMAGE_WIDTH: int = int(os.getenv('MAX_IMAGE_WIDTH', 1920))
@@ -45,6 +81,12 @@ class Config:
         'image/tiff'
     ])
     
+    IMAGE_PROCESSING_BACKEND: str = os.getenv('IMAGE_PROCESSING_BACKEND', 'thread').strip().lower()  # 图片处理后端：thread 或 process
+    IMAGE_PROCESSING_WORKERS: int = int(str(os.getenv('IMAGE_PROCESSING_WORKERS', 0)).strip())  # 进程后端的 worker 数，0 表示使用 CPU 核心数
+    IMAGE_VARIANT_WIDTHS: Tuple[int, ...] = tuple(
+        int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '').split(',') if width.strip()
+    )  # 响应式图片宽度，格式 480,960,1920；为空时直接上传原图
+    
     # 监控配置
     METRICS_PORT: int = int(os.getenv('METRICS_PORT', 9090))
     
@@ -72,9 +114,42 @@ class Config:
         if not (1 <= cls.MAX_CONCURRENT_DOWNLOADS <= 10):
             errors.append("MAX_CONCURRENT_DOWNLOADS must be between 1 and 10")
             
+        if not (1 <= cls.DOWNLOAD_LIMIT_PER_HOST <= cls.MAX_CONCURRENT_DOWNLOADS):
+            errors.append("DOWNLOAD_LIMIT_PER_HOST must be between 1 and MAX_CONCURRENT_DOWNLOADS")
+            
+        if not (1 <= cls.MAX_CONCURRENT_UPLOADS <= 20):
+            errors.append("MAX_CONCURRENT_UPLOADS must be between 1 and 20")
+            
+        if cls.HTTP_POOL_SIZE < 1 or cls.HTTP_POOL_SIZE_PER_HOST < 0:
+            errors.append("HTTP_POOL_SIZE must be at least 1 and HTTP_POOL_SIZE_PER_HOST must not be negative")
+            
+        if cls.PIPELINE_QUEUE_SIZE < 1:
+            errors.append("PIPELINE_QUEUE_SIZE must be at least 1")
+            
+        if cls.R2_MULTIPART_CHUNKSIZE < 5 * 1024 * 1024:
+            errors.append("R2_MULTIPART_CHUNKSIZE must be at least 5MB")
+            
         if not (5 <= cls.DOWNLOAD_TIMEOUT <= 60):
             errors.append("DOWNLOAD_TIMEOUT must be between 5 and 60 seconds")
             
+        if cls.FAILED_URL_CACHE_SIZE < 1 or cls.PROCESSING_STATE_SIZE < 1:
+            errors.append("FAILED_URL_CACHE_SIZE and PROCESSING_STATE_SIZE must be at least 1")
+            
+        if not (0 <= cls.FAILED_URL_BACKOFF <= cls.FAILED_URL_BACKOFF_MAX):
+            errors.append("FAILED_URL_BACKOFF must be between 0 and FAILED_URL_BACKOFF_MAX")
+            
+        if cls.TEMP_DIR_QUOTA < 0:
+            errors.append("TEMP_DIR_QUOTA must not be negative")
+            
+        if cls.IMAGE_PROCESSING_BACKEND not in ('thread', 'process'):
+            errors.append("IMAGE_PROCESSING_BACKEND must be 'thread' or 'process'")
+            
+        if any(width < 1 for width in cls.IMAGE_VARIANT_WIDTHS):
+            errors.append("IMAGE_VARIANT_WIDTHS must be positive")
+            
+        if cls.IMAGE_VALIDATION not in ('header', 'full'):
+            errors.append("IMAGE_VALIDATION must be 'header' or 'full'")
+            
         if not (1 <= cls.MAX_RETRIES <= 5):
             errors.append("MAX_RETRIES must be between 1 and 5")
             
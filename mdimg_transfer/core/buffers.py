@@ -0,0 +1,78 @@
+"""
+内存缓冲区工具模块。
+图片数据在处理和上传之间以内存缓冲区传递，尽量不复制数据。
+"""
+
+import io
+import hashlib
+from typing import BinaryIO, Union
+
+# 可直接处理和上传的内存缓冲区类型
+Buffer = Union[bytes, bytearray, memoryview, io.BytesIO]
+
+class _ViewReader(io.RawIOBase):
+    """
+    从头读取 memoryview 的只读文件对象
+
+    不复制底层数据，也不改变原缓冲区（例如调用方持有的 BytesIO）的读写位置。
+    文件对象关闭前，BytesIO 的大小不能改变。
+    """
+
+    def __init__(self, view: memoryview):
+        self._view = view.cast('B')
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+def as_fileobj(data: Buffer) -> BinaryIO:
+    """
+    将内存缓冲区包装为从头读取的文件对象，不复制数据
+
+    每次调用返回新的文件对象，不改变调用方 BytesIO 的读写位置。
+    """
+    if isinstance(data, bytes):
+        return io.BytesIO(data)
+    if isinstance(data, io.BytesIO):
+        return _ViewReader(data.getbuffer())
+    return _ViewReader(memoryview(data))
+
+def buffer_size(data: Buffer) -> int:
+    """获取内存缓冲区的字节数"""
+    if isinstance(data, io.BytesIO):
+        return data.getbuffer().nbytes
+    return memoryview(data).nbytes
+
+def buffer_sha256(data: Buffer) -> str:
+    """计算内存缓冲区的 SHA-256，不复制数据"""
+    if isinstance(data, io.BytesIO):
+        with data.getbuffer() as view:
+            return hashlib.sha256(view).hexdigest()
+    return hashlib.sha256(data).hexdigest()
@@ -1,34 +1,83 @@
 """缓存管理模块"""
 
+import time
+import zlib
 import asyncio
 import hashlib
 import logging
-from datetime import datetime, timedelta
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Dict, Optional, TypeVar
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union
 
+from .cache_backend import CacheBackend
 from .metrics import metrics
+from ..monitoring.metrics import CACHE_OPERATIONS
 
 logger = logging.getLogger(__name__)
 T = TypeVar('T')
 
+class _Sentinel:
+    """哨兵对象"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __repr__(self) -> str:
+        return self._name
+
+# 缓存中不存在该键
+MISSING = _Sentinel('MISSING')
+# 缓存的 None 结果（负缓存），在 backend 中保存为 null
+_NONE = _Sentinel('_NONE')
+
 class Cache:
-    """LRU缓存实现"""
+    """
+    LRU缓存实现
 
-    def __init__(self, max_size: int = 1000, ttl: int = 3600):
+    条目按最近使用顺序保存在 OrderedDict 中，读取、写入和淘汰都是 O(1)。
+    提供 weigher 时按权重（例如字节数）计算容量。
+    提供 backend 时作为二级存储：写入同时写到 backend，内存未命中时从 backend
+    读取并放回内存。多个进程共享同一个 backend 时，各进程内存中的值可能
+    在有效期内落后于其他进程的写入。
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: int = 3600,
+                 weigher: Optional[Callable[[Any], int]] = None,
+                 max_weight: Optional[int] = None,
+                 backend: Optional[CacheBackend] = None,
+                 shard: Optional[int] = None):
         """
         初始化缓存
 
         Args:
             max_size: 最大缓存条目数
-            ttl: 缓存过期时间(秒)
+            ttl: 缓存过期时间(秒)，从最近一次访问开始计算
+            weigher: 计算缓存值权重的函数，例如 len；未提供时每个条目权重为1
+            max_weight: 所有条目的最大总权重，None 表示只限制条目数
+            backend: 二级存储，例如 SQLiteBackend；None 表示只使用内存
+            shard: 作为 ShardedCache 分片时的编号，操作按分片记入 CACHE_OPERATIONS
         """
-        self._cache: Dict[str, Any] = {}
-        self._access_times: Dict[str, datetime] = {}
+        # 键 -> (值, 权重, 过期时间, 有效期)，按最近使用从旧到新排列
+        self._cache: "OrderedDict[str, Tuple[Any, int, float, float]]" = OrderedDict()
         self._max_size = max_size
         self._ttl = ttl
+        self._weigher = weigher
+        self._max_weight = max_weight
+        self._weight = 0
+        self._backend = backend
+        self._shard = shard
+        # 分片的 CACHE_OPERATIONS 计数器，按 (操作, 状态) 缓存，避免每次查找标签
+        self._counters: Dict[Tuple[str, str], Any] = {}
         self._lock = asyncio.Lock()
 
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def weight(self) -> int:
+        """当前所有条目的总权重"""
+        return self._weight
+
     async def get(self, key: str) -> Optional[Any]:
         """
         获取缓存值
@@ -39,65 +88,245 @@ class Cache:
         Returns:
             缓存值，不存在返回None
         """
-        async with self._lock:
-            if key not in self._cache:
-                metrics.track_cache_operation("get", "miss")
-                return None
-
+        # 内存层读取中没有 await，在事件循环中不会被打断，无需加锁
+        item = self._cache.get(key)
+        if item is not None:
             # 检查是否过期
-            access_time = self._access_times[key]
-            if datetime.now() - access_time > timedelta(seconds=self._ttl):
-                await self._remove(key)
-                metrics.track_cache_operation("get", "miss")
-                return None
+            value, weight, expires_at, ttl = item
+            now = time.monotonic()
+            if now < expires_at:
+                # 更新访问时间
+                self._cache[key] = (value, weight, now + ttl, ttl)
+                self._cache.move_to_end(key)
+                self._track("get", "success")
+                return value
+            self._remove(key)
+
+        value, stale = await self._load_backend(key)
+        if value is MISSING or stale:
+            self._track("get", "miss")
+            return None
+        self._track("get", "disk")
+        return value
+
+    async def lookup(self, key: str, stale_ttl: float = 0) -> Tuple[Any, bool]:
+        """
+        获取缓存值，区分不存在和已过期
+
+        与 get 不同，读取不会延长有效期，过期时间始终从写入时计算。
+
+        Args:
+            key: 缓存键
+            stale_ttl: 过期后仍可返回旧值的秒数
+
+        Returns:
+            Tuple[Any, bool]: (缓存值, 是否已过期)，不存在时缓存值为 MISSING
+        """
+        item = self._cache.get(key)
+        if item is not None:
+            value, _, expires_at, _ = item
+            now = time.monotonic()
+            if now < expires_at + stale_ttl:
+                self._cache.move_to_end(key)
+                stale = now >= expires_at
+                self._track("get", "stale" if stale else "success")
+                return value, stale
+            self._remove(key)
+
+        value, stale = await self._load_backend(key, stale_ttl)
+        if value is MISSING:
+            self._track("get", "miss")
+        else:
+            self._track("get", "stale" if stale else "disk")
+        return value, stale
+
+    async def _load_backend(self, key: str, stale_ttl: float = 0) -> Tuple[Any, bool]:
+        """
+        从 backend 读取缓存项并放回内存
+
+        Returns:
+            Tuple[Any, bool]: (缓存值, 是否已过期)，不存在时缓存值为 MISSING
+        """
+        if self._backend is None:
+            return MISSING, False
+        item = await self._call_backend(self._backend.get, key)
+        if item is None:
+            return MISSING, False
+        value, expires_at = item
+        if value is None:
+            value = _NONE
+        # backend 使用墙上时间，换算为剩余有效期
+        remaining = expires_at - time.time()
+        if remaining <= -stale_ttl:
+            return MISSING, False
+        async with self._lock:
+            self._store(key, value, time.monotonic() + remaining, self._ttl)
+        return value, remaining <= 0
 
-            # 更新访问时间
-            self._access_times[key] = datetime.now()
-            metrics.track_cache_operation("get", "success")
-            return self._cache[key]
+    async def _call_backend(self, func: Callable, *args) -> Any:
+        """在线程中调用 backend，出错时记录日志并按未命中处理"""
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception as e:
+            logger.warning(f"缓存二级存储操作失败: {e}")
+            self._track("backend", "error")
+            return None
 
-    async def set(self, key: str, value: Any) -> None:
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
         """
         设置缓存值
 
         Args:
             key: 缓存键
             value: 缓存值
+            ttl: 该条目的有效期(秒)，None表示使用缓存默认值
         """
+        ttl = self._ttl if ttl is None else ttl
         async with self._lock:
-            # 检查容量
-            if len(self._cache) >= self._max_size:
-                # 移除最久未使用的项
-                oldest_key = min(
-                    self._access_times.items(),
-                    key=lambda x: x[1]
-                )[0]
-                await self._remove(oldest_key)
-
-            self._cache[key] = value
-            self._access_times[key] = datetime.now()
-            metrics.update_cache_size(len(self._cache))
-            metrics.track_cache_operation("set", "success")
-
-    async def _remove(self, key: str) -> None:
+            stored = self._store(key, value, time.monotonic() + ttl, ttl)
+        if self._backend is not None:
+            await self._call_backend(self._backend.set, key,
+                                     None if value is _NONE else value, time.time() + ttl)
+        self._track("set", "success" if stored else "skipped")
+
+    def _store(self, key: str, value: Any, expires_at: float, ttl: float) -> bool:
+        """
+        写入内存层，调用方需持有锁
+
+        Returns:
+            bool: 是否写入；单个条目超过总容量时不缓存
+        """
+        weight = self._weigher(value) if self._weigher and value is not _NONE else 1
+        if key in self._cache:
+            self._remove(key)
+        if self._max_weight is not None and weight > self._max_weight:
+            return False
+
+        self._cache[key] = (value, weight, expires_at, ttl)
+        self._weight += weight
+        # 移除最久未使用的项
+        while len(self._cache) > self._max_size or (
+                self._max_weight is not None and self._weight > self._max_weight):
+            self._remove(next(iter(self._cache)))
+        self._update_size(self._size())
+        return True
+
+    def _track(self, operation: str, status: str) -> None:
+        """记录缓存操作，分片只记入按分片编号区分的 CACHE_OPERATIONS"""
+        if self._shard is None:
+            metrics.track_cache_operation(operation, status)
+            return
+        counter = self._counters.get((operation, status))
+        if counter is None:
+            counter = self._counters[operation, status] = CACHE_OPERATIONS.labels(
+                operation=operation, status=status, shard=str(self._shard)
+            )
+        counter.inc()
+
+    def _update_size(self, size: int) -> None:
+        """更新缓存大小指标；各分片的大小不代表整个缓存，不更新"""
+        if self._shard is None:
+            metrics.update_cache_size(size)
+
+    def _size(self) -> int:
+        """缓存大小指标：提供 weigher 时为总权重，否则为条目数"""
+        return self._weight if self._weigher else len(self._cache)
+
+    def _remove(self, key: str) -> None:
         """
         移除缓存项
 
         Args:
             key: 缓存键
         """
-        del self._cache[key]
-        del self._access_times[key]
-        metrics.update_cache_size(len(self._cache))
-        metrics.track_cache_operation("delete", "success")
+        _, weight, _, _ = self._cache.pop(key)
+        self._weight -= weight
+        self._update_size(self._size())
+        self._track("delete", "success")
 
     async def clear(self) -> None:
         """清空缓存"""
         async with self._lock:
             self._cache.clear()
-            self._access_times.clear()
-            metrics.update_cache_size(0)
-            metrics.track_cache_operation("clear", "success")
+            self._weight = 0
+            self._update_size(0)
+        if self._backend is not None:
+            await self._call_backend(self._backend.clear)
+        self._track("clear", "success")
+
+    def close(self) -> None:
+        """关闭二级存储"""
+        if self._backend is not None:
+            self._backend.close()
+
+class ShardedCache:
+    """
+    分片LRU缓存
+
+    按键的 CRC32 把条目分到多个独立的 Cache 分片，每个分片有自己的 LRU 和写锁。
+    各分片的操作按分片编号记入 CACHE_OPERATIONS，分片编号在各工作进程中一致，
+    可以看出热点键是否集中在少数分片。
+
+    Cache 只在不含 await 的代码段内持有锁，单个事件循环中分片并不会减少等待，
+    吞吐量与 Cache 基本相同；保留它是为了按分片观察命中率和键的分布，
+    接口与 Cache 一致，可以直接替换。
+    """
+
+    def __init__(self, shards: int = 16, max_size: int = 1000, ttl: int = 3600,
+                 weigher: Optional[Callable[[Any], int]] = None,
+                 max_weight: Optional[int] = None,
+                 backend: Optional[CacheBackend] = None):
+        """
+        初始化分片缓存
+
+        Args:
+            shards: 分片数
+            max_size: 最大缓存条目数，平均分配到各分片
+            ttl: 缓存过期时间(秒)
+            weigher: 计算缓存值权重的函数
+            max_weight: 所有条目的最大总权重，平均分配到各分片
+            backend: 所有分片共享的二级存储
+        """
+        self._shards = [
+            Cache(max(1, max_size // shards), ttl, weigher,
+                  None if max_weight is None else max(1, max_weight // shards),
+                  backend, shard=index)
+            for index in range(shards)
+        ]
+        self._backend = backend
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    @property
+    def weight(self) -> int:
+        """当前所有条目的总权重"""
+        return sum(shard.weight for shard in self._shards)
+
+    def shard_index(self, key: str) -> int:
+        """键所在的分片编号；不使用 hash()，其结果在每个进程中不同"""
+        return zlib.crc32(key.encode('utf-8')) % len(self._shards)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，不存在返回None"""
+        return await self._shards[self.shard_index(key)].get(key)
+
+    async def lookup(self, key: str, stale_ttl: float = 0) -> Tuple[Any, bool]:
+        """获取缓存值，区分不存在和已过期，参见 Cache.lookup"""
+        return await self._shards[self.shard_index(key)].lookup(key, stale_ttl)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """设置缓存值"""
+        await self._shards[self.shard_index(key)].set(key, value, ttl)
+
+    async def clear(self) -> None:
+        """清空缓存"""
+        await asyncio.gather(*(shard.clear() for shard in self._shards))
+
+    def close(self) -> None:
+        """关闭二级存储"""
+        if self._backend is not None:
+            self._backend.close()
 
 def cache_key(*args, **kwargs) -> str:
     """生成缓存键
@@ -123,36 +352,68 @@ def cache_key(*args, **kwargs) -> str:
     key = hashlib.md5(":".join(key_parts).encode()).hexdigest()
     return key
 
-def cached(cache_instance: Cache, ttl: Optional[int] = None):
+def cached(cache_instance: Union[Cache, ShardedCache], ttl: Optional[int] = None,
+           negative_ttl: Optional[int] = None, stale_ttl: int = 0):
     """
     缓存装饰器
 
+    同一个键的并发未命中只执行一次被装饰的协程，其余调用等待同一结果；
+    协程抛出的异常会传给所有等待者，不会被缓存。
+
     Args:
         cache_instance: 缓存实例
         ttl: 过期时间(秒)，None表示使用缓存默认值
+        negative_ttl: 返回 None 时的缓存时间(秒)，None表示不缓存 None 结果
+        stale_ttl: 过期后继续返回旧值的秒数，期间在后台刷新一次
 
     Returns:
         装饰器函数
     """
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        # 键 -> 进行中的加载任务
+        inflight: Dict[str, asyncio.Task] = {}
+
+        async def load(key: str, args: tuple, kwargs: dict) -> T:
+            result = await func(*args, **kwargs)
+            if result is not None:
+                await cache_instance.set(key, result, ttl)
+            elif negative_ttl is not None:
+                await cache_instance.set(key, _NONE, negative_ttl)
+            return result
+
+        def on_done(key: str, task: asyncio.Task) -> None:
+            if inflight.get(key) is task:
+                del inflight[key]
+            if not task.cancelled() and task.exception() is not None:
+                logger.debug(f"{func.__name__} 加载失败: {task.exception()!r}")
+
+        def start_load(key: str, args: tuple, kwargs: dict) -> asyncio.Task:
+            task = inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(load(key, args, kwargs))
+                task.add_done_callback(lambda t: on_done(key, t))
+                inflight[key] = task
+            return task
+
         @wraps(func)
         async def wrapper(*args, **kwargs) -> T:
             # 生成缓存键
             key = cache_key(func.__name__, *args, **kwargs)
 
             # 尝试从缓存获取
-            cached_value = await cache_instance.get(key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit for {func.__name__}")
-                return cached_value
+            cached_value, stale = await cache_instance.lookup(key, stale_ttl)
+            if cached_value is not MISSING:
+                if stale:
+                    # 返回旧值，同时在后台刷新
+                    logger.debug(f"Cache stale for {func.__name__}, refreshing")
+                    start_load(key, args, kwargs)
+                else:
+                    logger.debug(f"Cache hit for {func.__name__}")
+                return None if cached_value is _NONE else cached_value
 
-            # 执行函数
+            # 执行函数，并发调用共享同一次加载，调用方取消时不影响其他等待者
             logger.debug(f"Cache miss for {func.__name__}")
-            result = await func(*args, **kwargs)
-
-            # 存入缓存
-            await cache_instance.set(key, result)
-            return result
+            return await asyncio.shield(start_load(key, args, kwargs))
 
         return wrapper
     return decorator
@@ -0,0 +1,114 @@
+"""
+缓存磁盘层模块。
+为 core.cache.Cache 提供可替换的二级存储，内存层未命中时从这里读取；
+SQLite 实现可由同一主机上的多个工作进程共享，重启后缓存仍然有效。
+"""
+
+import json
+import base64
+import logging
+from typing import Any, Optional, Tuple
+
+from .sqlite_index import SQLiteIndex
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """
+    缓存二级存储接口
+
+    方法均为同步调用，由 Cache 放到线程中执行。过期时间使用 time.time()，
+    以便在进程之间和重启之后保持一致。缓存值限于可 JSON 序列化的类型和 bytes，
+    写入其他类型时抛出 TypeError。
+    """
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        读取缓存项
+
+        Returns:
+            Optional[Tuple[Any, float]]: (缓存值, 过期时间)，不存在时返回None
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        """写入缓存项"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """删除缓存项"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """清空缓存"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """释放资源"""
+
+# 编码后的 bytes 值：{"__bytes__": "<base64>"}
+_BYTES_TAG = '__bytes__'
+
+def encode_value(value: Any) -> bytes:
+    """
+    把缓存值编码为 JSON，bytes 以 base64 保存
+
+    不使用 pickle：数据库文件可被其他进程写入，反序列化不能执行代码。
+    """
+    def default(obj):
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            return {_BYTES_TAG: base64.b64encode(obj).decode('ascii')}
+        raise TypeError(f"缓存值不支持的类型: {type(obj).__name__}")
+    return json.dumps(value, default=default, separators=(',', ':')).encode('utf-8')
+
+def decode_value(data: bytes) -> Any:
+    """解码 encode_value 生成的 JSON"""
+    def object_hook(obj):
+        if len(obj) == 1 and _BYTES_TAG in obj:
+            return base64.b64decode(obj[_BYTES_TAG])
+        return obj
+    return json.loads(data, object_hook=object_hook)
+
+
+class SQLiteBackend(SQLiteIndex, CacheBackend):
+    """
+    基于 SQLite 的缓存二级存储，按编码后的字节数做近似 LRU 淘汰
+
+    使用 WAL 模式，多个进程可以同时读取，写入由 SQLite 文件锁串行化。
+    读取时的访问时间按 TOUCH_INTERVAL 秒的粒度更新。
+    """
+
+    def __init__(self, path: str, max_size: int = 256 * 1024 * 1024,
+                 busy_timeout: float = 5.0):
+        """
+        初始化 SQLite 存储
+
+        Args:
+            path: 数据库文件路径
+            max_size: 缓存值编码后的最大总字节数
+            busy_timeout: 等待其他进程释放写锁的秒数
+        """
+        super().__init__(path, max_size, busy_timeout)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        row = self._read(key)
+        if row is None:
+            return None
+        try:
+            return decode_value(row[0]), row[1]
+        except ValueError as e:
+            logger.warning(f"缓存项无法解码，已删除: {key}, {e}")
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        data = encode_value(value)
+        if len(data) > self.max_size:
+            return
+        self._write(key, data, len(data), expires_at)
+
+    def delete(self, key: str) -> None:
+        self._delete(key)
+
+    def clear(self) -> None:
+        self._delete_all()
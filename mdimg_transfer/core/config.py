@@ -6,7 +6,7 @@
 import os
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 from dataclasses import dataclass
@@ -19,10 +19,17 @@ class ImageConfig:
     max_width: int = 1920
     max_height: int = 1080
     quality: int = 85
-    format: str = 'auto'  # auto, jpeg, png, webp
+    format: str = 'auto'  # auto, jpeg, png, webp, avif
     optimize: bool = True
     strip_metadata: bool = True
     max_file_size: int = 50 * 1024 * 1024  # 50MB
+    size_tolerance: float = 0.05  # 超出大小限制时查找质量，结果在限制的该比例以内即停止
+    draft_gap: float = 1.5  # JPEG 解码时按 DCT 缩放，之后至少还要缩小的倍数；0 表示完整解码
+    auto_formats: Tuple[str, ...] = ('WEBP', 'AVIF')  # auto 模式下与原格式比较的输出格式
+    auto_min_psnr: float = 38.0  # auto 模式下有损候选格式的最低峰值信噪比（dB）
+    variant_widths: Tuple[int, ...] = (480, 960, 1920)  # 响应式图片默认生成的宽度
+    result_cache_size: int = 1024 * 1024 * 1024  # 处理结果缓存上限，默认1GB，0 表示不缓存
+    encode_workers: int = 2  # 单张图片同时编码的数量（auto 模式的候选格式、响应式尺寸）
 
 class Config:
     """配置管理器"""
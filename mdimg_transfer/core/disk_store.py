@@ -0,0 +1,125 @@
+"""
+磁盘文件存储模块。
+HTTP 缓存和处理结果缓存共用的存储层：正文保存为缓存目录中的文件，
+索引保存在 SQLite 中，写入只修改单个条目，可由同一主机上的多个工作进程共享。
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from .buffers import Buffer, as_fileobj
+from .sqlite_index import SQLiteIndex
+
+logger = logging.getLogger(__name__)
+
+class DiskStore(SQLiteIndex):
+    """
+    按正文字节数做近似 LRU 淘汰的磁盘文件存储
+
+    每个条目由键、正文文件名和一个可 JSON 序列化的记录组成，索引由 SQLiteIndex 维护，
+    读取时的访问时间按 TOUCH_INTERVAL 秒的粒度更新。方法均为同步调用，
+    在事件循环中使用时应通过 asyncio.to_thread 调用。
+    """
+
+    INDEX_FILE = 'index.db'
+
+    def __init__(self, cache_dir: str, max_size: int, busy_timeout: float = 5.0):
+        """
+        初始化存储
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 正文文件的最大总字节数
+            busy_timeout: 等待其他进程释放写锁的秒数
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        super().__init__(os.path.join(cache_dir, self.INDEX_FILE), max_size, busy_timeout)
+
+    def body_path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, filename)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查找条目，正文文件已丢失时删除条目
+
+        Returns:
+            Optional[Dict[str, Any]]: 条目记录，不存在时为None
+        """
+        row = self._read(key)
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        if not os.path.exists(self.body_path(value['filename'])):
+            self._delete(key)
+            return None
+        return value['record']
+
+    def put(self, key: str, filename: str, source: Union[str, Buffer],
+            record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        保存正文和记录，记录中的 size 由正文大小填写
+
+        Args:
+            key: 条目键
+            filename: 正文文件名
+            source: 正文文件路径或内存中的正文
+            record: 条目记录
+
+        Returns:
+            Optional[Dict[str, Any]]: 保存的记录，正文超过存储上限时为None
+        """
+        # 先写入临时文件再替换，避免其他进程读到不完整的正文
+        body_path = self.body_path(filename)
+        tmp_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if isinstance(source, str):
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(as_fileobj(source), f)
+        size = os.path.getsize(tmp_path)
+        if size > self.max_size:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, body_path)
+
+        record = dict(record, size=size)
+        evicted = self._write(key, self._encode(filename, record), size)
+        self._remove_files(evicted)
+        return record
+
+    def update(self, key: str, record: Dict[str, Any]) -> None:
+        """替换条目记录，不修改正文"""
+        row = self._read(key)
+        if row is not None:
+            filename = json.loads(row[0])['filename']
+            self._replace(key, self._encode(filename, record))
+
+    @staticmethod
+    def _encode(filename: str, record: Dict[str, Any]) -> bytes:
+        return json.dumps({'filename': filename, 'record': record}).encode('utf-8')
+
+    def _remove_files(self, values: List[bytes]) -> None:
+        """删除条目对应的正文文件"""
+        for value in values:
+            try:
+                os.remove(self.body_path(json.loads(value)['filename']))
+            except FileNotFoundError:
+                pass
+
+    def remove(self, key: str) -> None:
+        """删除条目及其正文"""
+        value = self._delete(key)
+        if value is not None:
+            self._remove_files([value])
+
+    def clear(self) -> None:
+        """清空存储"""
+        self._remove_files(self._delete_all())
@@ -0,0 +1,116 @@
+"""
+下载失败记录模块。
+记录失败的URL并按指数退避暂时跳过，到期后允许重试；
+记录数量有上限，长期运行的进程不会无限增长。
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class BoundedDict(OrderedDict):
+    """按最近使用淘汰的有界字典"""
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def __getitem__(self, key: Any) -> Any:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+@dataclass
+class FailureRecord:
+    """单个URL的失败记录"""
+    failures: int
+    retry_at: float
+    expires_at: float
+    last_error: Optional[str] = None
+
+class FailureCache:
+    """
+    带指数退避和容量上限的失败URL记录
+
+    退避期结束后记录再保留同样时长，期间再次失败时退避时间翻倍，
+    之后记录过期，URL 重新从首次失败开始计算。
+    """
+
+    def __init__(self, max_size: int, base_ttl: float, max_ttl: float):
+        """
+        初始化失败记录
+
+        Args:
+            max_size: 最多记录的URL数，超出时淘汰最久未失败的记录
+            base_ttl: 首次失败后跳过的秒数，之后每次失败翻倍
+            max_ttl: 跳过时间的上限
+        """
+        self.max_size = max_size
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self._records: "OrderedDict[str, FailureRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, url: str) -> bool:
+        """URL当前是否处于退避期，应跳过下载"""
+        return self.retry_after(url) > 0
+
+    def get(self, url: str, now: Optional[float] = None) -> Optional[FailureRecord]:
+        """获取未过期的失败记录"""
+        record = self._records.get(url)
+        if record is None:
+            return None
+        if (now or time.monotonic()) >= record.expires_at:
+            del self._records[url]
+            return None
+        return record
+
+    def retry_after(self, url: str) -> float:
+        """距离允许重试还有多少秒，不在退避期时为0"""
+        now = time.monotonic()
+        record = self.get(url, now)
+        if record is None:
+            return 0.0
+        return max(0.0, record.retry_at - now)
+
+    def record_failure(self, url: str, error: Optional[str] = None) -> FailureRecord:
+        """
+        记录一次失败，延长退避时间
+
+        Args:
+            url: 失败的URL
+            error: 错误信息
+
+        Returns:
+            FailureRecord: 更新后的记录
+        """
+        now = time.monotonic()
+        previous = self.get(url, now)
+        failures = previous.failures + 1 if previous else 1
+        ttl = min(self.base_ttl * 2 ** (failures - 1), self.max_ttl)
+        record = FailureRecord(failures, now + ttl, now + ttl * 2, error)
+        self._records[url] = record
+        self._records.move_to_end(url)
+        while len(self._records) > self.max_size:
+            self._records.popitem(last=False)
+        logger.debug(f"记录下载失败: {url}, 第{failures}次, {ttl:.0f}秒后允许重试")
+        return record
+
+    def record_success(self, url: str) -> None:
+        """下载成功后清除失败记录"""
+        self._records.pop(url, None)
+
+    def clear(self) -> None:
+        self._records.clear()
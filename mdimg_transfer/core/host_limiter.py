@@ -0,0 +1,121 @@
+"""
+按主机限流模块。
+在全局并发上限之外为每个主机单独设置并发数，避免单个慢速源站占满全部下载名额。
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+def host_of(url: str) -> str:
+    """返回URL的小写主机名，无法解析时返回空字符串"""
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+def interleave_by_host(urls: Iterable[str]) -> List[str]:
+    """
+    按主机轮流排列URL，使顺序取用的下载任务尽量分散到不同主机
+
+    Args:
+        urls: URL列表
+
+    Returns:
+        List[str]: 重新排列后的URL列表，同一主机内保持原有顺序
+    """
+    groups: "OrderedDict[str, List[str]]" = OrderedDict()
+    for url in urls:
+        groups.setdefault(host_of(url), []).append(url)
+    queues = [iter(group) for group in groups.values()]
+    result = []
+    while queues:
+        remaining = []
+        for queue in queues:
+            url = next(queue, None)
+            if url is not None:
+                result.append(url)
+                remaining.append(queue)
+        queues = remaining
+    return result
+
+class HostLimiter:
+    """全局并发上限加每个主机独立的并发上限"""
+
+    def __init__(self, global_limit: int, per_host_limit: int,
+                 host_limits: Optional[Mapping[str, int]] = None):
+        """
+        初始化限流器
+
+        Args:
+            global_limit: 所有主机合计的最大并发数
+            per_host_limit: 单个主机的默认最大并发数
+            host_limits: 指定主机的并发数覆盖，键为主机名
+        """
+        self.global_limit = global_limit
+        self.per_host_limit = per_host_limit
+        self.host_limits = {host.lower(): limit for host, limit in (host_limits or {}).items()}
+        self._global = asyncio.Semaphore(global_limit)
+        # 只保存有请求持有或等待名额的主机，长期运行时不随处理过的主机数增长
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._users: Dict[str, int] = {}
+        self._active: Dict[str, int] = {}
+
+    def limit_for(self, host: str) -> int:
+        """主机的并发上限，不超过全局上限"""
+        return min(self.host_limits.get(host, self.per_host_limit), self.global_limit)
+
+    def connection_limits(self) -> Tuple[int, int]:
+        """
+        与限流配置一致的连接池大小
+
+        请求并发由限流器控制；连接池留出余量给获取 cookies 和重定向等附带请求。
+
+        Returns:
+            Tuple[int, int]: (连接池总连接数, 单个主机的连接数)
+        """
+        per_host = max([self.per_host_limit, *self.host_limits.values()])
+        return self.global_limit * 2, min(per_host, self.global_limit) * 2
+
+    def active(self, host: Optional[str] = None) -> int:
+        """当前正在进行的请求数，未指定主机时返回总数"""
+        if host is None:
+            return sum(self._active.values())
+        return self._active.get(host, 0)
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[None]:
+        """
+        为URL所在主机占用一个并发名额
+
+        先占用主机名额再占用全局名额，等待慢速主机的请求不会占住全局名额。
+
+        Args:
+            url: 请求的URL
+        """
+        host = host_of(url)
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.limit_for(host))
+        self._users[host] = self._users.get(host, 0) + 1
+        try:
+            async with semaphore:
+                async with self._global:
+                    self._active[host] = self._active.get(host, 0) + 1
+                    try:
+                        yield
+                    finally:
+                        self._active[host] -= 1
+                        if not self._active[host]:
+                            del self._active[host]
+        finally:
+            self._users[host] -= 1
+            # 没有请求持有或等待该主机的名额时删除信号量，下次请求重新创建
+            if not self._users[host]:
+                del self._users[host]
+                del self._hosts[host]
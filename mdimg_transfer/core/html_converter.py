@@ -1,10 +1,16 @@
 import aiohttp
 import html2text
-from typing import Tuple
+from typing import Optional, Tuple
 from bs4 import BeautifulSoup
+from .http_session import HTTPSessionManager
 
 class HTMLConverter:
-    def __init__(self):
+    def __init__(self, session_manager: Optional[HTTPSessionManager] = None):
+        """
+        Args:
+            session_manager: 应用范围的共享会话；未提供时每次请求创建临时会话
+        """
+        self.session_manager = session_manager
         self.html2text = html2text.HTML2Text()
         self.html2text.ignore_links = False
         self.html2text.ignore_images = False
@@ -14,18 +20,24 @@ class HTMLConverter:
         """
         获取网页HTML内容和标题
         """
+        if self.session_manager is not None:
+            session = await self.session_manager.get_session()
+            return await self._fetch(session, url)
         async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise ValueError(f"Failed to fetch URL: {url}, status: {response.status}")
-                
-                html_content = await response.text()
-                
-                # 使用BeautifulSoup解析HTML获取标题
-                soup = BeautifulSoup(html_content, 'html.parser')
-                title = soup.title.string if soup.title else "Untitled"
-                
-                return html_content, title.strip()
+            return await self._fetch(session, url)
+            
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Tuple[str, str]:
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise ValueError(f"Failed to fetch URL: {url}, status: {response.status}")
+            
+            html_content = await response.text()
+            
+            # 使用BeautifulSoup解析HTML获取标题
+            soup = BeautifulSoup(html_content, 'html.parser')
+            title = soup.title.string if soup.title else "Untitled"
+            
+            return html_content, title.strip()
     
     def convert_to_markdown(self, html_content: str) -> str:
         """
@@ -0,0 +1,196 @@
+"""
+HTTP 条件请求缓存模块。
+在磁盘上保存下载过的图片及其校验头，重新处理时通过 If-None-Match /
+If-Modified-Since 重新验证，未变化的图片直接使用本地副本。
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Mapping, Optional
+
+from .disk_store import DiskStore
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheEntry:
+    """缓存条目"""
+    url: str
+    filename: str
+    size: int
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    cache_control: Optional[str] = None
+    sha256: Optional[str] = None
+    format: Optional[str] = None  # 从正文识别的图片格式，决定本地文件扩展名
+
+    @property
+    def max_age(self) -> Optional[int]:
+        """Cache-Control 中的 max-age，未设置时为None"""
+        for directive in _parse_cache_control(self.cache_control):
+            if directive.startswith('max-age='):
+                try:
+                    return int(directive.split('=', 1)[1].strip('"'))
+                except ValueError:
+                    return None
+        return None
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        """在 max-age 内且未要求重新验证时可直接使用"""
+        directives = _parse_cache_control(self.cache_control)
+        if 'no-cache' in directives or 'must-revalidate' in directives:
+            return False
+        max_age = self.max_age
+        if not max_age:
+            return False
+        return (now or time.time()) - self.stored_at < max_age
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """重新验证所需的条件请求头"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+def _parse_cache_control(value: Optional[str]) -> set:
+    """解析 Cache-Control 头为小写指令集合"""
+    if not value:
+        return set()
+    return {part.strip().lower() for part in value.split(',') if part.strip()}
+
+class HTTPCache:
+    """基于磁盘的 HTTP 响应缓存，按字节数做 LRU 淘汰，可由多个工作进程共享"""
+
+    def __init__(self, cache_dir: str, max_size: int):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 缓存正文的最大总字节数
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._store = DiskStore(cache_dir, max_size)
+
+    @property
+    def total_size(self) -> int:
+        """当前缓存正文的总字节数"""
+        return self._store.total_size
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _body_path(self, entry: CacheEntry) -> str:
+        return self._store.body_path(entry.filename)
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """
+        查找缓存条目
+
+        Args:
+            url: 规范化后的URL
+
+        Returns:
+            Optional[CacheEntry]: 缓存条目，不存在时为None
+        """
+        record = self._store.get(url)
+        if record is None:
+            return None
+        try:
+            return CacheEntry(**record)
+        except TypeError:
+            self._store.remove(url)
+            return None
+
+    def materialize(self, entry: CacheEntry, dest_path: str) -> str:
+        """
+        将缓存正文放到目标路径，同一文件系统上使用硬链接避免复制
+
+        Args:
+            entry: 缓存条目
+            dest_path: 目标路径
+
+        Returns:
+            str: 目标路径
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(self._body_path(entry), dest_path)
+        except OSError:
+            shutil.copyfile(self._body_path(entry), dest_path)
+        return dest_path
+
+    def store(self, url: str, src_path: str, headers: Mapping[str, str],
+              sha256: Optional[str] = None, format: Optional[str] = None) -> Optional[CacheEntry]:
+        """
+        保存下载结果。没有校验头且不可缓存的响应不会被保存。
+
+        写入正文和索引，在事件循环中应通过 asyncio.to_thread 调用。
+
+        Args:
+            url: 规范化后的URL
+            src_path: 已下载的文件路径
+            headers: 响应头
+            sha256: 正文的内容哈希
+            format: 从正文识别的图片格式
+
+        Returns:
+            Optional[CacheEntry]: 新的缓存条目
+        """
+        cache_control = headers.get('Cache-Control')
+        entry = CacheEntry(
+            url=url,
+            filename=hashlib.sha256(url.encode('utf-8')).hexdigest(),
+            size=os.path.getsize(src_path),
+            stored_at=time.time(),
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            cache_control=cache_control,
+            sha256=sha256,
+            format=format
+        )
+        if 'no-store' in _parse_cache_control(cache_control):
+            return None
+        if not (entry.etag or entry.last_modified or entry.max_age):
+            return None
+        if self._store.put(url, entry.filename, src_path, asdict(entry)) is None:
+            return None
+        return entry
+
+    def revalidated(self, url: str, headers: Mapping[str, str]) -> Optional[CacheEntry]:
+        """
+        处理 304 响应：刷新存储时间和校验头
+
+        Args:
+            url: 规范化后的URL
+            headers: 304 响应头
+
+        Returns:
+            Optional[CacheEntry]: 更新后的缓存条目
+        """
+        entry = self.get(url)
+        if entry is None:
+            return None
+        entry.stored_at = time.time()
+        entry.etag = headers.get('ETag', entry.etag)
+        entry.last_modified = headers.get('Last-Modified', entry.last_modified)
+        entry.cache_control = headers.get('Cache-Control', entry.cache_control)
+        self._store.update(url, asdict(entry))
+        return entry
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._store.clear()
+
+    def close(self) -> None:
+        """关闭索引"""
+        self._store.close()
@@ -0,0 +1,90 @@
+"""
+共享 HTTP 会话模块。
+应用范围内只创建一个 aiohttp 会话，各个抓取组件复用其连接池，
+避免每个文档都重新建立到同一 CDN 的 TCP/TLS 连接。
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import aiohttp
+
+from ..config import config
+from ..monitoring.metrics import HTTP_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+class HTTPSessionManager:
+    """应用范围的 aiohttp 会话管理器，记录连接新建与复用次数"""
+
+    def __init__(self, limit: Optional[int] = None, limit_per_host: Optional[int] = None):
+        """
+        初始化会话管理器，会话在首次使用时创建
+
+        Args:
+            limit: 连接池总连接数，默认使用 HTTP_POOL_SIZE
+            limit_per_host: 单个主机的连接数，默认使用 HTTP_POOL_SIZE_PER_HOST（0 表示不限制）
+        """
+        self.limit = config.HTTP_POOL_SIZE if limit is None else limit
+        self.limit_per_host = config.HTTP_POOL_SIZE_PER_HOST if limit_per_host is None else limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self._stats: Dict[str, int] = {'created': 0, 'reused': 0}
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    def stats(self) -> Dict[str, int]:
+        """连接新建与复用次数"""
+        return dict(self._stats)
+
+    def _record(self, kind: str) -> None:
+        self._stats[kind] += 1
+        HTTP_CONNECTIONS.labels(type=kind).inc()
+
+    async def _on_connection_create_end(self, session, context, params) -> None:
+        self._record('created')
+
+    async def _on_connection_reuseconn(self, session, context, params) -> None:
+        self._record('reused')
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=config.DOWNLOAD_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.DOWNLOAD_DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        # 共享会话不保存 cookies，避免不同请求之间互相影响；需要时按请求传入
+        return aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            trace_configs=[trace_config]
+        )
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        获取共享会话，已关闭时重新创建
+
+        Returns:
+            aiohttp.ClientSession: 共享会话
+        """
+        if self.closed:
+            async with self._lock:
+                if self.closed:
+                    self._session = self._create_session()
+                    logger.info("已创建共享HTTP会话")
+        return self._session
+
+    async def close(self) -> None:
+        """关闭共享会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("已关闭共享HTTP会话，连接统计: %s", self._stats)
+        self._session = None
@@ -2,52 +2,158 @@
 图片下载和处理模块
 """
 import os
+import mmap
 import asyncio
+import hashlib
 import aiohttp
 import aiofiles
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple
-from urllib.parse import urlparse, unquote
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote
 import logging
 import time
 from ..config import config
+from ..monitoring.metrics import VALIDATION_TIME
+from .http_cache import CacheEntry, HTTPCache
+from .host_limiter import HostLimiter
+from .http_session import HTTPSessionManager
+from .wechat_cookies import WeChatCookieCache
+from .failure_cache import BoundedDict, FailureCache
+from .temp_storage import TempJob, TempQuotaExceeded, TempStorage
 from PIL import Image
-import io
 from bs4 import BeautifulSoup
 
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """
+    根据文件开头的字节识别图片格式
+    
+    Args:
+        head: 文件开头的字节
+        
+    Returns:
+        Optional[str]: PIL 风格的格式名，无法识别时为None
+    """
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'GIF'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    if head.startswith(b'BM'):
+        return 'BMP'
+    if head.startswith((b'II*\x00', b'MM\x00*')):
+        return 'TIFF'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'AVIF'
+    if head.startswith(b'\x00\x00\x01\x00'):
+        return 'ICO'
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if text.startswith((b'<svg', b'<?xml', b'<!DOCTYPE svg', b'<!--')):
+        return 'SVG'
+    return None
+
+# 按识别出的格式确定临时文件扩展名
+FORMAT_EXTENSIONS = {
+    'GIF': '.gif', 'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp', 'BMP': '.bmp',
+    'TIFF': '.tiff', 'AVIF': '.avif', 'ICO': '.ico', 'SVG': '.svg',
+}
+
 class ImageDownloader:
     """图片下载器，用于下载远程图片到本地临时目录"""
     
-    def __init__(self):
-        """初始化图片下载器"""
+    # 流式下载的分块大小
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    # 用于识别格式的文件头长度
+    SNIFF_SIZE = 32
+    # 图片请求的默认请求头，使用共享会话时按请求附加
+    SESSION_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Referer': 'https://mp.weixin.qq.com/'
+    }
+    
+    def __init__(self, http_cache: Optional[HTTPCache] = None,
+                 limiter: Optional[HostLimiter] = None,
+                 session_manager: Optional[HTTPSessionManager] = None,
+                 temp_storage: Optional[TempStorage] = None):
+        """
+        初始化图片下载器
+        
+        Args:
+            http_cache: HTTP 条件请求缓存，默认根据 HTTP_CACHE_* 配置创建
+            limiter: 按主机的并发限制，默认使用 MAX_CONCURRENT_DOWNLOADS 作为全局上限、
+                DOWNLOAD_LIMIT_PER_HOST 和 DOWNLOAD_HOST_LIMITS 作为单主机上限
+            session_manager: 应用范围的共享会话；未提供时每次进入上下文创建自己的会话
+            temp_storage: 临时文件存储，默认在 TEMP_DIR 下创建并使用 TEMP_DIR_QUOTA 配额
+        """
         self.session: Optional[aiohttp.ClientSession] = None
-        self.download_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_DOWNLOADS)
+        self.session_manager = session_manager
+        self._owns_session = False
+        self._session_depth = 0
+        self.limiter = limiter or HostLimiter(
+            config.MAX_CONCURRENT_DOWNLOADS,
+            config.DOWNLOAD_LIMIT_PER_HOST,
+            config.DOWNLOAD_HOST_LIMITS
+        )
         self.max_retries = config.MAX_RETRIES
         self.download_timeout = config.DOWNLOAD_TIMEOUT
         self.max_file_size = config.MAX_FILE_SIZE
-        self.temp_dir = config.TEMP_DIR
-        self.processing_state: Dict[str, Dict[str, any]] = {}
-        self.failed_urls: set[str] = set()
+        self.temp_storage = temp_storage or TempStorage(config.TEMP_DIR, config.TEMP_DIR_QUOTA)
+        self.temp_dir = self.temp_storage.root
+        self.validation = config.IMAGE_VALIDATION
+        # 下载器通常是长期存在的单例，状态和失败记录都需要有上限
+        self.processing_state: Dict[str, Dict[str, any]] = BoundedDict(config.PROCESSING_STATE_SIZE)
+        self.failed_urls = FailureCache(
+            config.FAILED_URL_CACHE_SIZE, config.FAILED_URL_BACKOFF, config.FAILED_URL_BACKOFF_MAX
+        )
+        # 进行中的下载，键为规范化后的URL，相同图片的并发请求共享同一个任务
+        self._inflight: Dict[str, asyncio.Task] = {}
+        if http_cache is None and config.HTTP_CACHE_ENABLED:
+            http_cache = HTTPCache(config.HTTP_CACHE_DIR, config.HTTP_CACHE_MAX_SIZE)
+        self.http_cache = http_cache
+        # 微信 GIF 下载共享的 cookies，只在 403 或验证失败后重新获取
+        self.wechat_cookies = WeChatCookieCache(self._get_wechat_cookies, config.WECHAT_COOKIE_TTL)
         self.logger = logging.getLogger('mdimg_transfer.image_downloader')
         self.logger.setLevel(logging.DEBUG)  # 设置为DEBUG级别以记录详细信息
         
     async def __aenter__(self):
-        """创建HTTP会话"""
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Referer': 'https://mp.weixin.qq.com/'
-            })
+        """获取HTTP会话，可嵌套进入"""
+        self._session_depth += 1
+        if not self.session or self.session.closed:
+            if self.session_manager is not None:
+                self.session = await self.session_manager.get_session()
+                self._owns_session = False
+            else:
+                self.session = aiohttp.ClientSession(
+                    connector=self._create_connector(), headers=self.SESSION_HEADERS
+                )
+                self._owns_session = True
         return self
         
+    def _create_connector(self) -> aiohttp.TCPConnector:
+        """创建与限流配置一致的连接池，复用连接并缓存DNS结果"""
+        limit, limit_per_host = self.limiter.connection_limits()
+        return aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=config.DOWNLOAD_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.DOWNLOAD_DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """关闭HTTP会话"""
-        if self.session:
+        """退出最外层上下文时释放会话，共享会话由管理器负责关闭"""
+        self._session_depth -= 1
+        if self._session_depth > 0:
+            return
+        if self.session and self._owns_session:
+            self.wechat_cookies.close()
             await self.session.close()
-            self.session = None
+        self.session = None
             
     def _get_safe_filename(self, url: str) -> str:
         """从URL中提取文件名"""
@@ -57,7 +163,7 @@ class ImageDownloader:
         
         # 如果URL没有文件名，使用URL的hash作为文件名
         if not filename or '.' not in filename:
-            filename = f"image_{hash(url)}.jpg"
+            filename = f"image_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}.jpg"
             
         return filename
         
@@ -106,6 +212,11 @@ class ImageDownloader:
             self.logger.error(f"获取cookies失败: {str(e)}", exc_info=True)
             return {}
             
+    async def _renew_wechat_cookies(self, cookies: dict) -> dict:
+        """请求使用的 cookies 被拒绝后使其失效并获取新的 cookies"""
+        self.wechat_cookies.invalidate(cookies)
+        return await self.wechat_cookies.get()
+            
     def _get_headers_for_url(self, url: str) -> dict:
         """根据URL获取合适的请求头"""
         is_wechat = 'mmbiz.qpic.cn' in url
@@ -167,7 +278,45 @@ class ImageDownloader:
         query_string = '&'.join(f"{k}={v}" for k, v in params.items())
         return f"{base_url}?{query_string}"
         
-    async def _download_single_image(self, url: str) -> Optional[str]:
+    def _normalize_url(self, url: str) -> str:
+        """规范化URL，用作合并重复下载的键"""
+        if 'mmbiz.qpic.cn' in url:
+            url = self._process_wechat_url(url)
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+    async def _download_single_image(self, url: str, job: Optional[TempJob] = None) -> Optional[str]:
+        """
+        下载单个图片，相同URL的并发请求只会发起一次下载
+        
+        文件写入发起下载的任务目录，其他任务共享结果时硬链接到各自的目录。
+        """
+        job = job or self.temp_storage.shared
+        key = self._normalize_url(url)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_image(url, job))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._on_fetch_done(key, url, done))
+        else:
+            self.logger.debug(f"合并重复的下载请求: {url}")
+        # 单个调用者被取消时不影响其他等待同一下载的调用者
+        path = await asyncio.shield(task)
+        if path and not job.owns(path):
+            try:
+                path = job.adopt(path)
+            except FileNotFoundError:
+                self.logger.error(f"共享的下载文件已被清理: {path}")
+                return None
+        return path
+
+    def _on_fetch_done(self, key: str, url: str, task: asyncio.Task) -> None:
+        """下载任务结束：移出进行中的任务，成功时清除失败记录"""
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and task.result():
+            self.failed_urls.record_success(key)
+
+    async def _fetch_image(self, url: str, job: TempJob) -> Optional[str]:
         """下载单个图片"""
         self.logger.info(f"开始下载图片: {url}")
         
@@ -175,19 +324,24 @@ class ImageDownloader:
             self.logger.error("URL为空")
             return None
             
-        if url in self.failed_urls:
-            self.logger.warning(f"跳过之前失败的URL: {url}")
+        # 微信URL在下载前会被改写，失败记录和处理状态统一使用规范化后的原始URL，
+        # 与合并重复下载的键一致
+        key = self._normalize_url(url)
+        retry_after = self.failed_urls.retry_after(key)
+        if retry_after > 0:
+            self.logger.warning(f"跳过之前失败的URL: {url}, {retry_after:.0f}秒后允许重试")
             return None
             
-        self.processing_state[url] = {
+        state = self.processing_state[key] = {
             'status': 'downloading',
             'retries': 0,
             'start_time': time.time(),
             'errors': []
         }
+        last_error = None
         
         try:
-            async with self.download_semaphore:
+            async with self.limiter.acquire(url):
                 # 处理微信图片URL
                 is_wechat = 'mmbiz.qpic.cn' in url
                 is_gif = 'wx_fmt=gif' in url or '.gif' in url.lower()
@@ -198,7 +352,7 @@ class ImageDownloader:
                     self.logger.debug(f"处理后的微信图片URL: {url}")
                     if is_gif:
                         self.logger.debug("检测到GIF图片，获取微信cookies")
-                        cookies = await self._get_wechat_cookies()
+                        cookies = await self.wechat_cookies.get()
                         if not cookies:
                             self.logger.warning("未能获取微信cookies，尝试使用备用参数")
                             # 尝试不同的参数组合
@@ -217,10 +371,22 @@ class ImageDownloader:
                 if is_gif and not filename.lower().endswith('.gif'):
                     filename = filename.rsplit('.', 1)[0] + '.gif'
                     
-                temp_path = os.path.join(self.temp_dir, f"temp_{filename}")
-                self.logger.debug(f"临时文件路径: {temp_path}")
+                # 临时文件按内容哈希命名，写入期间使用URL哈希作为唯一的中间文件名
+                url_digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+                extension = os.path.splitext(filename)[1].lower()
+                self.logger.debug(f"临时目录: {job.dir}")
+                
+                headers = {**self.SESSION_HEADERS, **self._get_headers_for_url(url)}
                 
-                headers = self._get_headers_for_url(url)
+                # 查找HTTP缓存，未过期时直接使用，否则发起条件请求
+                cache_key = self._normalize_url(url)
+                # 缓存索引由多个进程共享，读写放到线程中执行
+                cached = await asyncio.to_thread(self.http_cache.get, cache_key) if self.http_cache else None
+                if cached is not None:
+                    if cached.is_fresh():
+                        self.logger.info(f"使用未过期的缓存: {url}")
+                        return self._use_cached(cached, job, url_digest, extension, state)
+                    headers.update(cached.conditional_headers())
                 self.logger.debug(f"使用请求头: {headers}")
                 
                 last_error = None
@@ -239,6 +405,11 @@ class ImageDownloader:
                             self.logger.debug(f"响应状态码: {response.status}")
                             self.logger.debug(f"响应头: {response.headers}")
                             
+                            if response.status == 304 and cached is not None:
+                                self.logger.info(f"图片未变化，使用缓存: {url}")
+                                await asyncio.to_thread(self.http_cache.revalidated, cache_key, response.headers)
+                                return self._use_cached(cached, job, url_digest, extension, state)
+                            
                             if response.status == 200:
                                 content_type = response.headers.get('Content-Type', '')
                                 self.logger.debug(f"Content-Type: {content_type}")
@@ -268,63 +439,70 @@ class ImageDownloader:
                                         self.logger.error(error_msg)
                                         raise ValueError(error_msg)
                                 
-                                content = await response.read()
-                                actual_size = len(content)
-                                self.logger.debug(f"下载内容大小: {actual_size:,} bytes")
-                                
-                                if content_length and actual_size != int(content_length):
-                                    error_msg = f"下载内容大小不匹配: 期望 {content_length} bytes, 实际 {actual_size} bytes"
-                                    self.logger.error(error_msg)
-                                    raise ValueError(error_msg)
-                                
-                                # 使用BytesIO验证图片
+                                # 流式写入临时文件，边下载边检查大小并计算哈希
+                                part_path = job.path(f"{url_digest}.part")
                                 try:
-                                    # 检查是否是 SVG
-                                    if any(ct in content_type.lower() for ct in ['svg', 'xml']):
-                                        # SVG 格式验证
-                                        svg_content = content.decode('utf-8')
-                                        if not ('<svg' in svg_content and '</svg>' in svg_content):
-                                            raise ValueError("无效的 SVG 文件")
-                                        self.logger.info("SVG 验证成功")
-                                    else:
-                                        # 其他图片格式验证
-                                        with Image.open(io.BytesIO(content)) as img:
-                                            # 对于GIF，验证帧数
-                                            if img.format == 'GIF':
-                                                try:
-                                                    frames = 0
-                                                    while True:
-                                                        frames += 1
-                                                        img.seek(img.tell() + 1)
-                                                except EOFError:
-                                                    pass
-                                                self.logger.info(f"GIF验证成功: 格式={img.format}, 大小={img.size}, 帧数={frames}")
-                                            else:
-                                                img.verify()
-                                                self.logger.info(f"图片验证成功: 格式={img.format}, 大小={img.size}")
-                                        
-                                    # 验证成功后再保存文件
-                                    async with aiofiles.open(temp_path, 'wb') as f:
-                                        await f.write(content)
-                                        
-                                    return temp_path
+                                    actual_size, content_hash, image_format = await self._stream_to_file(
+                                        response, part_path
+                                    )
+                                    self.logger.debug(f"下载内容大小: {actual_size:,} bytes, 格式: {image_format}")
                                     
+                                    if content_length and actual_size != int(content_length):
+                                        error_msg = f"下载内容大小不匹配: 期望 {content_length} bytes, 实际 {actual_size} bytes"
+                                        self.logger.error(error_msg)
+                                        raise ValueError(error_msg)
+                                except Exception:
+                                    self._remove_file(part_path)
+                                    raise
+                                
+                                try:
+                                    await self._validate_image(part_path, image_format)
                                 except Exception as e:
+                                    self._remove_file(part_path)
                                     error_msg = f"图片验证失败: {str(e)}"
                                     self.logger.error(error_msg)
                                     last_error = e
+                                    if cookies:
+                                        cookies = await self._renew_wechat_cookies(cookies)
                                     if attempt == self.max_retries - 1:
                                         raise ValueError(error_msg)
                                     continue
+                                
+                                # 验证成功后再替换为正式文件；已有文件可能是指向缓存正文的硬链接，
+                                # 替换目录项不会修改缓存内容
+                                temp_path = job.commit(
+                                    part_path,
+                                    content_hash + FORMAT_EXTENSIONS.get(image_format, extension)
+                                )
+                                state.update({
+                                    'status': 'completed',
+                                    'sha256': content_hash,
+                                    'size': actual_size,
+                                    'format': image_format
+                                })
+                                
+                                if self.http_cache is not None:
+                                    await asyncio.to_thread(
+                                        self.http_cache.store, cache_key, temp_path, response.headers,
+                                        sha256=content_hash, format=image_format
+                                    )
+                                    
+                                return temp_path
                                     
                             else:
                                 error_msg = f"下载失败: HTTP {response.status}"
                                 self.logger.error(error_msg)
                                 last_error = ValueError(error_msg)
+                                if response.status == 403 and cookies:
+                                    cookies = await self._renew_wechat_cookies(cookies)
                                 if attempt == self.max_retries - 1:
                                     raise last_error
                                 continue
                                 
+                    except TempQuotaExceeded:
+                        # 磁盘配额不足时重试没有意义
+                        raise
+                        
                     except asyncio.TimeoutError as e:
                         error_msg = f"下载超时 (尝试 {attempt + 1}/{self.max_retries})"
                         self.logger.warning(error_msg)
@@ -345,11 +523,172 @@ class ImageDownloader:
             self.logger.error(f"下载失败: {url}", exc_info=True)
             if last_error:
                 self.logger.error(f"最后一次错误: {str(last_error)}")
-            self.failed_urls.add(url)
-            self.processing_state[url]['status'] = 'failed'
-            self.processing_state[url]['errors'].append(str(e))
+            if not isinstance(e, TempQuotaExceeded):
+                self.failed_urls.record_failure(key, str(e))
+            state['status'] = 'failed'
+            state['errors'].append(str(e))
             return None
             
+    async def _stream_to_file(self, response: aiohttp.ClientResponse,
+                              path: str) -> Tuple[int, str, str]:
+        """
+        将响应正文分块写入文件。
+
+        写入过程中累计大小并在超过 MAX_FILE_SIZE 或临时目录配额时立即中止，
+        同时计算 SHA-256，并根据开头的字节识别图片格式，无需在内存中保留完整正文。
+
+        Returns:
+            Tuple[int, str, str]: (字节数, SHA-256, 图片格式)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        image_format = None
+        try:
+            async with aiofiles.open(path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                    if size + len(chunk) > self.max_file_size:
+                        raise ValueError(f"文件太大: 超过最大限制 {self.max_file_size:,} bytes")
+                    # 写入前占用临时目录配额，超出时中止下载
+                    self.temp_storage.reserve(len(chunk))
+                    size += len(chunk)
+                    if image_format is None:
+                        head += chunk[:self.SNIFF_SIZE - len(head)]
+                        if len(head) >= self.SNIFF_SIZE:
+                            image_format = self._require_format(head)
+                    digest.update(chunk)
+                    await f.write(chunk)
+        finally:
+            # 写入完成后由任务目录登记文件大小
+            self.temp_storage.release(size)
+        if size == 0:
+            raise ValueError("下载内容为空")
+        if image_format is None:
+            image_format = self._require_format(head)
+        return size, digest.hexdigest(), image_format
+
+    @staticmethod
+    def _require_format(head: bytes) -> str:
+        """识别图片格式，无法识别时抛出异常"""
+        image_format = sniff_image_format(head)
+        if image_format is None:
+            raise ValueError(f"无法识别的图片格式: {head[:16]!r}")
+        return image_format
+
+    async def _validate_image(self, path: str, image_format: str) -> None:
+        """
+        分级验证已下载的图片，并记录每一级的耗时
+        
+        文件头检查只解析头部，不解码像素，直接在事件循环中执行；
+        配置为 full 时再在工作线程中做完整的结构验证。
+        """
+        start = time.perf_counter()
+        try:
+            self._check_image_header(path, image_format)
+        finally:
+            VALIDATION_TIME.labels(tier='header').observe(time.perf_counter() - start)
+        
+        if self.validation != 'full':
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._validate_image_file, path, image_format)
+        finally:
+            VALIDATION_TIME.labels(tier='full').observe(time.perf_counter() - start)
+
+    def _check_image_header(self, path: str, image_format: str) -> None:
+        """检查文件头能被解析且与识别出的格式一致"""
+        if image_format == 'SVG':
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b'<svg') == -1 or mm.rfind(b'</svg>') == -1:
+                    raise ValueError("无效的 SVG 文件")
+            return
+        
+        with Image.open(path) as img:
+            width, height = img.size
+            # 多图 JPEG 会被 PIL 识别为 MPO
+            if {'MPO': 'JPEG'}.get(img.format, img.format) != image_format:
+                raise ValueError(f"图片格式与文件头不一致: {img.format} != {image_format}")
+            if width <= 0 or height <= 0:
+                raise ValueError(f"无效的图片尺寸: {img.size}")
+        self.logger.debug(f"图片文件头验证成功: 格式={image_format}, 大小={width}x{height}")
+
+    def _validate_image_file(self, path: str, image_format: str) -> None:
+        """通过 mmap 完整验证已下载的图片文件，避免再复制一份正文；会解码全部GIF帧，应在工作线程中调用"""
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if image_format == 'SVG':
+                if mm.find(b'<svg') == -1 or mm.rfind(b'</svg>') == -1:
+                    raise ValueError("无效的 SVG 文件")
+                self.logger.info("SVG 验证成功")
+                return
+            
+            with Image.open(mm) as img:
+                # 对于GIF，验证帧数
+                if img.format == 'GIF':
+                    try:
+                        frames = 0
+                        while True:
+                            frames += 1
+                            img.seek(img.tell() + 1)
+                    except EOFError:
+                        pass
+                    self.logger.info(f"GIF验证成功: 格式={img.format}, 大小={img.size}, 帧数={frames}")
+                else:
+                    img.verify()
+                    self.logger.info(f"图片验证成功: 格式={img.format}, 大小={img.size}")
+
+    def _use_cached(self, entry: CacheEntry, job: TempJob, url_digest: str,
+                    extension: str, state: Dict[str, any]) -> str:
+        """使用HTTP缓存中的正文作为下载结果，硬链接到任务目录"""
+        state.update({'status': 'completed', 'sha256': entry.sha256, 'size': entry.size,
+                      'format': entry.format})
+        # 与新下载一样按识别出的格式命名，旧索引中没有格式时才使用URL中的扩展名
+        temp_path = job.path((entry.sha256 or url_digest) + FORMAT_EXTENSIONS.get(entry.format, extension))
+        return job.add(self.http_cache.materialize(entry, temp_path))
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """删除文件，文件不存在时忽略"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_content_hash(self, url: str) -> Optional[str]:
+        """
+        获取已下载图片内容的 SHA-256
+        
+        Args:
+            url: 图片URL
+            
+        Returns:
+            Optional[str]: 十六进制哈希，未知时为None
+        """
+        return self.processing_state.get(self._normalize_url(url), {}).get('sha256')
+
+    def close(self) -> None:
+        """删除共享临时目录中的下载文件，关闭HTTP缓存索引"""
+        self.temp_storage.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
+
+    def temp_job(self):
+        """创建临时任务目录，``async with`` 退出时删除其中的全部下载文件"""
+        return self.temp_storage.job()
+
+    async def download_image(self, url: str, job: Optional[TempJob] = None) -> Optional[str]:
+        """
+        下载单个图片，需在 ``async with downloader:`` 会话内调用。
+
+        Args:
+            url: 图片URL
+            job: 临时任务目录，未指定时写入不会自动清理的共享目录
+
+        Returns:
+            Optional[str]: 下载后的文件路径，失败时为None
+        """
+        return await self._download_single_image(url, job)
+
     async def download_url_content(self, url: str) -> str:
         """
         下载URL内容并转换为Markdown格式。
@@ -361,8 +700,10 @@ class ImageDownloader:
             str: 转换后的Markdown内容
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
+            async with self:
+                async with self.session.get(
+                    url, headers={'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8'}
+                ) as response:
                     if response.status != 200:
                         return None
                     
@@ -421,11 +762,13 @@ class ImageDownloader:
             self.logger.error(f"Error downloading URL content: {str(e)}")
             return None
             
-    async def download_images(self, urls: List[str]) -> Dict[str, Optional[str]]:
+    async def download_images(self, urls: List[str],
+                              job: Optional[TempJob] = None) -> Dict[str, Optional[str]]:
         """批量下载图片
         
         Args:
             urls: 图片URL列表
+            job: 临时任务目录，未指定时写入不会自动清理的共享目录
             
         Returns:
             Dict[str, Optional[str]]: 键为URL，值为下载后的文件路径或None（表示下载失败）
@@ -434,11 +777,13 @@ class ImageDownloader:
         
         async with self:  # 确保session被正确创建和关闭
             tasks = []
-            self.logger.info(f"开始批量下载 {len(urls)} 个图片")
+            # 重复的URL只创建一个任务
+            unique_urls = list(dict.fromkeys(urls))
+            self.logger.info(f"开始批量下载 {len(unique_urls)} 个图片")
             
-            for url in urls:
+            for url in unique_urls:
                 task = asyncio.create_task(
-                    self._download_single_image(url)
+                    self._download_single_image(url, job)
                 )
                 tasks.append(task)
                 
@@ -447,7 +792,7 @@ class ImageDownloader:
             completed_tasks = await asyncio.gather(*tasks, return_exceptions=True)
             
             # 处理结果
-            for url, result in zip(urls, completed_tasks):
+            for url, result in zip(unique_urls, completed_tasks):
                 if isinstance(result, Exception):
                     self.logger.error(f"下载失败 {url}: {str(result)}")
                     results[url] = None
@@ -458,5 +803,5 @@ class ImageDownloader:
                         self.logger.error(f"下载失败: {url}")
                     results[url] = result
             
-            self.logger.info(f"批量下载完成，成功: {sum(1 for r in results.values() if r)}/{len(urls)}")
+            self.logger.info(f"批量下载完成，成功: {sum(1 for r in results.values() if r)}/{len(unique_urls)}")
             return results
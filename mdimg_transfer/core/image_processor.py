@@ -5,26 +5,33 @@
 
 import os
 import io
+import math
+import time
 import logging
+import shutil
 import hashlib
 import mimetypes
-from typing import Optional, Tuple, Dict, Any
-from dataclasses import dataclass
-from PIL import Image, ImageOps
+from typing import Optional, Tuple, Dict, Any, List, Callable
+from dataclasses import dataclass, field
+from PIL import Image, ImageChops, ImageOps, ImageStat
 import asyncio
 import aiohttp
 import aiofiles
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from urllib.parse import urlparse
 
 from ..monitoring import MetricsCollector
 from ..errors import (
     ImageProcessingError,
-    handle_processing_error,
     RetryConfig,
     with_retry
 )
 from .config import ImageConfig
+from .failure_cache import BoundedDict
+from .buffers import Buffer, as_fileobj, buffer_sha256, buffer_size
+from .result_cache import ResultCache
+from ..config import config as app_config
 
 logger = logging.getLogger(__name__)
 
@@ -36,22 +43,613 @@ class ProcessingResult:
     mime_type: Optional[str]
     stats: Dict[str, Any]
     error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时（秒）
+    variants: List['ImageVariant'] = field(default_factory=list)  # 响应式图片，从大到小
+    output: Optional[io.BytesIO] = None  # 内存 API 的编码结果
+    cached: bool = False  # 结果来自处理结果缓存，未重新处理
+
+@dataclass
+class ImageVariant:
+    """响应式图片中的一个尺寸"""
+    width: int
+    height: int
+    output_path: Optional[str]
+    size: int
+    output: Optional[io.BytesIO] = None  # 未指定输出目录时的编码结果
+
+def file_sha256(path: str) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 处理结果缓存的版本，处理逻辑改变输出时递增；Pillow 版本同样参与缓存键
+PROCESSOR_VERSION = f"1/{Image.__version__}"
+
+# 可选的处理后端：线程池适合小图，进程池可以让编码和缩放使用多个CPU核心
+BACKENDS = ('thread', 'process')
+
+def _init_worker() -> None:
+    """进程池 worker 初始化，预先加载 PIL 的格式插件"""
+    Image.init()
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+def draft_for_thumbnail(
+        img: Image.Image,
+        max_size: Tuple[int, int],
+        gap: float
+    ) -> int:
+    """
+    JPEG 在解码阶段按 DCT 缩放（1/2、1/4、1/8），跳过不需要的像素
+    
+    只有解码后仍比目标尺寸大 gap 倍以上时才缩放，后续的 LANCZOS 缩小
+    保证输出质量与完整解码一致。必须在图片加载前调用。
+    
+    Args:
+        img: 尚未加载的图片
+        max_size: 缩略图的最大宽高
+        gap: 解码结果相对目标尺寸至少保留的倍数，0 表示不缩放
+        
+    Returns:
+        int: 解码缩小的倍数，1 表示完整解码
+    """
+    max_width, max_height = max_size
+    if img.format != 'JPEG' or not gap or not max_width or not max_height:
+        return 1
+    # 按保持宽高比后的实际尺寸计算，而不是最大宽高
+    ratio = min(max_width / img.width, max_height / img.height)
+    if ratio * gap >= 1:
+        return 1
+    width = img.width
+    img.draft(None, (math.ceil(img.width * ratio * gap), math.ceil(img.height * ratio * gap)))
+    return round(width / img.width)
+
+def _transcode(fp: Any, original_size: int, options: Dict[str, Any]) -> ProcessingResult:
+    """
+    打开并转码图片，编码结果保留在内存中
+    
+    Args:
+        fp: 文件路径或文件对象
+        original_size: 原图字节数
+        options: 由 ImageProcessor._resolve_options 生成的处理选项
+        
+    Returns:
+        ProcessingResult: 处理结果，编码数据在 output 中
+    """
+    with Image.open(fp) as img:
+        # 基本信息
+        format = img.format
+        mime_type = Image.MIME[format]
+        
+        # 检查MIME类型
+        if mime_type not in options['allowed_mime_types']:
+            raise ImageProcessingError(f"不支持的图片格式: {mime_type}")
+        
+        # 处理选项
+        quality = options['quality']
+        max_width = options['max_width']
+        max_height = options['max_height']
+        strip_metadata = options['strip_metadata']
+        target_format = options['format'].upper()
+        
+        if target_format == 'AUTO' and getattr(img, 'is_animated', False):
+            # 候选格式只比较和编码第一帧，动画图片保持原样
+            output = io.BytesIO()
+            if isinstance(fp, str):
+                with open(fp, 'rb') as f:
+                    shutil.copyfileobj(f, output)
+            else:
+                fp.seek(0)
+                shutil.copyfileobj(fp, output)
+            return ProcessingResult(
+                success=True,
+                output_path=None,
+                mime_type=mime_type,
+                stats={
+                    'original_size': original_size,
+                    'processed_size': output.tell(),
+                    'width': img.width,
+                    'height': img.height,
+                    'format': format,
+                    'quality': quality,
+                    'animated': True
+                },
+                output=output
+            )
+        
+        # 调整大小：目标远小于原图时由解码器直接缩小，单独计时
+        timings = {}
+        if max_width or max_height:
+            start = time.perf_counter()
+            scale = draft_for_thumbnail(img, (max_width, max_height), options['draft_gap'])
+            img.load()
+            timings['decode_draft' if scale > 1 else 'decode'] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            img.thumbnail((max_width, max_height), Image.LANCZOS)
+            timings['resize'] = time.perf_counter() - start
+        
+        # 清除元数据
+        if strip_metadata:
+            img = ImageOps.exif_transpose(img)
+            
+        # 选择输出格式并编码
+        candidate_sizes = None
+        if target_format == 'AUTO':
+            output, target_format, candidate_sizes = choose_format(
+                img, format, quality, options['auto_formats'],
+                options['auto_min_psnr'], options['encode_workers']
+            )
+        else:
+            output = encode_image(img, target_format, quality, _keep_lossless(format, options))
+        
+        # 检查输出大小
+        output, quality, img = _fit_file_size(img, target_format, quality, output, options)
+        
+        return ProcessingResult(
+            success=True,
+            output_path=None,
+            mime_type=Image.MIME[target_format],
+            stats={
+                'original_size': original_size,
+                'processed_size': output.tell(),
+                'width': img.width,
+                'height': img.height,
+                'format': target_format,
+                'quality': quality,
+                'format_candidates': candidate_sizes
+            },
+            timings=timings,
+            output=output
+        )
+
+def _keep_lossless(source_format: str, options: Dict[str, Any]) -> bool:
+    """使用缓存的 auto 格式选择时，无损原图与比较时一样使用无损编码"""
+    return options.get('auto_decided', False) and source_format not in LOSSY_FORMATS
+
+def _error_result(error: Exception) -> ProcessingResult:
+    """处理失败的结果；结果可能需要跨进程返回，错误信息只保留字符串"""
+    error_msg = str(error)
+    logger.error(f"图片处理错误: {error_msg}")
+    return ProcessingResult(
+        success=False,
+        output_path=None,
+        mime_type=None,
+        stats={},
+        error=error_msg
+    )
+
+def process_image_file(
+        input_path: str,
+        output_dir: str,
+        options: Dict[str, Any]
+    ) -> ProcessingResult:
+    """
+    处理单个图片文件，结果写入 output_dir
+    
+    只接收路径和普通字典，既可以在线程中调用，也可以提交到进程池；
+    像素数据不会在进程之间传递。
+    
+    Args:
+        input_path: 输入图片路径
+        output_dir: 输出目录
+        options: 由 ImageProcessor._resolve_options 生成的处理选项
+        
+    Returns:
+        ProcessingResult: 处理结果
+    """
+    try:
+        result = _transcode(input_path, os.path.getsize(input_path), options)
+        
+        # 保存结果
+        output_path = os.path.join(
+            output_dir,
+            f"{os.path.splitext(os.path.basename(input_path))[0]}_processed.{result.stats['format'].lower()}"
+        )
+        # 先写入临时文件再替换：输出文件可能与处理结果缓存共享硬链接，不能原地覆盖
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(result.output.getbuffer())
+        os.replace(tmp_path, output_path)
+        result.output_path = output_path
+        result.output = None
+        return result
+            
+    except Exception as e:
+        return _error_result(e)
+
+def process_image_buffer(data: Buffer, options: Dict[str, Any]) -> ProcessingResult:
+    """
+    处理内存中的图片，不读写磁盘
+    
+    bytes 和 BytesIO 输入不会被复制；编码结果以 BytesIO 返回，可直接传给
+    R2Uploader.upload_bytes，无需 getvalue() 复制。
+    
+    Args:
+        data: 图片数据
+        options: 由 ImageProcessor._resolve_options 生成的处理选项
+        
+    Returns:
+        ProcessingResult: 处理结果，编码数据在 output 中，output_path 为 None
+    """
+    try:
+        return _transcode(as_fileobj(data), buffer_size(data), options)
+    except Exception as e:
+        return _error_result(e)
+
+def _fit_file_size(
+        image: Image.Image,
+        format: str,
+        quality: int,
+        output: io.BytesIO,
+        options: Dict[str, Any]
+    ) -> Tuple[io.BytesIO, int, Image.Image]:
+    """输出超出大小限制时降低质量，仍不满足再缩小尺寸"""
+    size = output.tell()
+    if size <= options['max_file_size']:
+        return output, quality, image
+    return optimize_image_size(
+        image, format, quality, options['max_file_size'],
+        tolerance=options['size_tolerance'], initial_size=size
+    )
+
+def process_image_variants(
+        input_path: str,
+        output_dir: Optional[str],
+        widths: Tuple[int, ...],
+        options: Dict[str, Any]
+    ) -> ProcessingResult:
+    """
+    生成同一图片的多个宽度，用于 srcset
+    
+    原图只解码一次：先按最大宽度缩放（JPEG 同样使用解码缩放），再从大到小
+    逐级缩小，所有尺寸使用同一输出格式并行编码。超过原图或 max_width 的宽度
+    合并为最大的一个尺寸。动画图片不生成多个尺寸，variants 为空，调用方应直接使用原图。
+    
+    Args:
+        input_path: 输入图片路径
+        output_dir: 输出目录，文件名形如 <原文件名>_<宽度>w.<扩展名>；
+            为 None 时不写入磁盘，编码结果保存在各尺寸的 output 中
+        widths: 需要的宽度
+        options: 由 ImageProcessor._resolve_options 生成的处理选项
+        
+    Returns:
+        ProcessingResult: 处理结果，variants 从大到小排列，output_path 为最大的尺寸
+    """
+    try:
+        with Image.open(input_path) as img:
+            format = img.format
+            mime_type = Image.MIME[format]
+            if mime_type not in options['allowed_mime_types']:
+                raise ImageProcessingError(f"不支持的图片格式: {mime_type}")
+            if not widths:
+                raise ImageProcessingError("未指定响应式图片宽度")
+            if getattr(img, 'is_animated', False):
+                # 逐帧缩放和编码代价很高，且多数目标格式只保留第一帧
+                return ProcessingResult(
+                    success=True,
+                    output_path=input_path,
+                    mime_type=mime_type,
+                    stats={
+                        'original_size': os.path.getsize(input_path),
+                        'width': img.width,
+                        'height': img.height,
+                        'format': format,
+                        'animated': True
+                    }
+                )
+            
+            quality = options['quality']
+            target_format = options['format'].upper()
+            largest = max(widths)
+            if options['max_width']:
+                largest = min(largest, options['max_width'])
+            box = (largest, options['max_height'] or img.height)
+            
+            # 只解码一次，按最大尺寸缩放
+            timings = {}
+            start = time.perf_counter()
+            scale = draft_for_thumbnail(img, box, options['draft_gap'])
+            img.load()
+            timings['decode_draft' if scale > 1 else 'decode'] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            img.thumbnail(box, Image.LANCZOS)
+            if options['strip_metadata']:
+                img = ImageOps.exif_transpose(img)
+            # 从大到小逐级缩小，每一级都从上一级开始，而不是从原图开始
+            images = [img]
+            for width in sorted(set(widths), reverse=True):
+                current = images[-1]
+                if width < current.width:
+                    height = max(1, round(current.height * width / current.width))
+                    images.append(current.resize((width, height), Image.LANCZOS))
+            timings['resize'] = time.perf_counter() - start
+            
+            # 最大的尺寸决定输出格式，其余尺寸并行编码
+            start = time.perf_counter()
+            candidate_sizes = None
+            if target_format == 'AUTO':
+                first, target_format, candidate_sizes = choose_format(
+                    images[0], format, quality, options['auto_formats'],
+                    options['auto_min_psnr'], options['encode_workers']
+                )
+            else:
+                first = encode_image(images[0], target_format, quality, _keep_lossless(format, options))
+            
+            def encode(index: int) -> Tuple[io.BytesIO, int, Image.Image]:
+                image = images[index]
+                output = first if index == 0 else encode_image(
+                    image, target_format, quality, _keep_lossless(format, options)
+                )
+                return _fit_file_size(image, target_format, quality, output, options)
+            
+            with ThreadPoolExecutor(max_workers=max(1, options['encode_workers'])) as pool:
+                encoded = list(pool.map(encode, range(len(images))))
+            timings['encode'] = time.perf_counter() - start
+            
+            stem = os.path.splitext(os.path.basename(input_path))[0]
+            variants = []
+            for output, _, image in encoded:
+                if output_dir is None:
+                    variants.append(ImageVariant(image.width, image.height, None, output.tell(), output))
+                    continue
+                output_path = os.path.join(
+                    output_dir, f"{stem}_{image.width}w.{target_format.lower()}"
+                )
+                with open(output_path, 'wb') as f:
+                    f.write(output.getbuffer())
+                variants.append(ImageVariant(image.width, image.height, output_path, output.tell()))
+            
+            return ProcessingResult(
+                success=True,
+                output_path=variants[0].output_path,
+                output=variants[0].output,
+                mime_type=Image.MIME[target_format],
+                stats={
+                    'original_size': os.path.getsize(input_path),
+                    'processed_size': sum(v.size for v in variants),
+                    'width': variants[0].width,
+                    'height': variants[0].height,
+                    'format': target_format,
+                    'quality': quality,
+                    'format_candidates': candidate_sizes
+                },
+                timings=timings,
+                variants=variants
+            )
+            
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"生成响应式图片错误: {error_msg}")
+        return ProcessingResult(
+            success=False,
+            output_path=None,
+            mime_type=None,
+            stats={},
+            error=error_msg
+        )
+
+# 有损格式，可以通过降低质量减小文件
+LOSSY_FORMATS = ('JPEG', 'WEBP', 'AVIF')
+
+def encode_image(image: Image.Image, format: str, quality: int,
+                 lossless: bool = False) -> io.BytesIO:
+    """
+    按目标格式编码图片
+    
+    Args:
+        image: PIL图片对象
+        format: 目标格式
+        quality: 压缩质量，仅对有损格式生效
+        lossless: 使用 WebP 无损编码
+        
+    Returns:
+        io.BytesIO: 编码后的图片数据
+    """
+    output = io.BytesIO()
+    save_args = {'format': format}
+    
+    if lossless and format == 'WEBP':
+        save_args['lossless'] = True
+    elif format in LOSSY_FORMATS:
+        save_args['quality'] = quality
+        if format == 'JPEG':
+            save_args['progressive'] = True
+            save_args['optimize'] = True
+        elif format == 'AVIF':
+            # 并行度由候选格式的线程数控制，单次编码只用一个线程
+            save_args['max_threads'] = 1
+    elif format == 'PNG':
+        save_args['optimize'] = True
+    
+    image.save(output, **save_args)
+    return output
+
+def _psnr(reference: Image.Image, data: io.BytesIO) -> float:
+    """编码结果相对参考图片的峰值信噪比（dB），完全一致时为无穷大"""
+    mode = 'RGBA' if 'A' in reference.getbands() else 'RGB'
+    # 直接读取编码结果的缓冲区，不复制每个候选结果
+    with as_fileobj(data) as fp, Image.open(fp) as decoded:
+        diff = ImageChops.difference(reference.convert(mode), decoded.convert(mode))
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(diff).rms) / len(mode)
+    if mse == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mse)
+
+def choose_format(
+        image: Image.Image,
+        source_format: str,
+        quality: int,
+        candidates: Tuple[str, ...],
+        min_psnr: float,
+        workers: int = 1
+    ) -> Tuple[io.BytesIO, str, Dict[str, int]]:
+    """
+    auto 模式下选择输出格式
+    
+    原格式总是参与比较；无损原图（PNG、GIF 等）只与 WebP 无损编码比较，
+    有损原图与各候选格式按相同质量编码，峰值信噪比低于 min_psnr 的结果不采用。
+    取满足条件中最小的一个。
+    
+    Args:
+        image: 已缩放的图片
+        source_format: 原图格式
+        quality: 压缩质量
+        candidates: 参与比较的其他格式，当前环境不支持的格式会被忽略
+        min_psnr: 有损候选格式的最低峰值信噪比（dB）
+        workers: 同时编码的候选格式数，限制单张图片占用的CPU
+        
+    Returns:
+        Tuple[io.BytesIO, str, Dict[str, int]]: (编码结果, 选中的格式, 各格式的编码大小)
+    """
+    Image.init()
+    lossless = source_format not in LOSSY_FORMATS
+    formats = [source_format] + [
+        f for f in candidates
+        if f != source_format and f in Image.SAVE and (not lossless or f == 'WEBP')
+    ]
+    
+    def encode(format: str) -> Tuple[io.BytesIO, bool]:
+        output = encode_image(image, format, quality, lossless=lossless)
+        acceptable = lossless or format == source_format or _psnr(image, output) >= min_psnr
+        return output, acceptable
+    
+    if workers > 1 and len(formats) > 1:
+        # Pillow 编码时释放 GIL，线程即可并行
+        with ThreadPoolExecutor(max_workers=min(workers, len(formats))) as pool:
+            results = list(pool.map(encode, formats))
+    else:
+        results = [encode(f) for f in formats]
+    
+    sizes = {f: output.tell() for f, (output, _) in zip(formats, results)}
+    best = min(
+        (f for f, (_, acceptable) in zip(formats, results) if acceptable),
+        key=lambda f: sizes[f]
+    )
+    return results[formats.index(best)][0], best, sizes
+
+def _search_quality(
+        image: Image.Image,
+        format: str,
+        low: int,
+        high: int,
+        max_size: int,
+        tolerance: float
+    ) -> Tuple[Optional[io.BytesIO], int, int]:
+    """
+    在 [low, high] 内二分查找不超过 max_size 的最高质量
+    
+    结果达到 max_size * (1 - tolerance) 时提前结束。
+    
+    Returns:
+        Tuple[Optional[io.BytesIO], int, int]: (图片数据, 质量, 大小)，
+            最低质量仍超出时图片数据为 None，大小为最后一次编码的结果
+    """
+    best: Optional[io.BytesIO] = None
+    best_quality = size = 0
+    while low <= high:
+        quality = (low + high) // 2
+        output = encode_image(image, format, quality)
+        size = output.tell()
+        if size <= max_size:
+            best, best_quality = output, quality
+            if size >= max_size * (1 - tolerance):
+                break
+            low = quality + 1
+        else:
+            high = quality - 1
+    if best is None:
+        return None, 0, size
+    return best, best_quality, best.tell()
+
+def optimize_image_size(
+        image: Image.Image,
+        format: str,
+        initial_quality: int,
+        max_size: int,
+        tolerance: float = 0.05,
+        min_quality: int = 10,
+        max_downscales: int = 4,
+        initial_size: Optional[int] = None
+    ) -> Tuple[io.BytesIO, int, Image.Image]:
+    """
+    优化图片大小
+    
+    有损格式二分查找满足大小限制的最高质量，最多约 log2(initial_quality) 次编码；
+    最低质量仍超出限制（或无损格式）时按超出比例缩小尺寸后重新查找。
+    
+    Args:
+        image: PIL图片对象，已按目标尺寸缩放
+        format: 目标格式
+        initial_quality: 初始质量，视为已知超出限制
+        max_size: 最大文件大小
+        tolerance: 结果与 max_size 的差距在该比例以内即停止查找
+        min_quality: 最低质量
+        max_downscales: 最多缩小尺寸的次数
+        initial_size: 按初始质量编码的大小，已知时无损格式不必重新编码
+        
+    Returns:
+        Tuple[io.BytesIO, int, Image.Image]: (优化后的图片数据, 最终质量, 最终图片)
+        
+    Raises:
+        ImageProcessingError: 缩小尺寸后仍无法满足大小限制
+    """
+    high = initial_quality - 1
+    for attempt in range(max_downscales + 1):
+        if format in LOSSY_FORMATS:
+            output, quality, size = _search_quality(
+                image, format, min(min_quality, high), high, max_size, tolerance
+            )
+            if output is not None:
+                if attempt:
+                    logger.info(f"图片已缩小到 {image.width}x{image.height} 以满足大小限制")
+                return output, quality, image
+        elif attempt == 0 and initial_size is not None:
+            size = initial_size
+        else:
+            output = encode_image(image, format, initial_quality)
+            size = output.tell()
+            if size <= max_size:
+                logger.info(f"图片已缩小到 {image.width}x{image.height} 以满足大小限制")
+                return output, initial_quality, image
+        
+        # 文件大小大致与像素数成正比，按面积比例缩小，并留出余量
+        scale = min(0.9, (max_size / size) ** 0.5 * 0.95)
+        width, height = max(1, int(image.width * scale)), max(1, int(image.height * scale))
+        if (width, height) == image.size:
+            break
+        image = image.resize((width, height), Image.LANCZOS)
+        high = initial_quality
+    
+    raise ImageProcessingError(f"处理后的图片太大: 无法压缩到 {max_size} bytes 以内")
 
 class ImageProcessor:
     """统一的图片处理器"""
     
     ALLOWED_MIME_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/svg+xml'}
+    # auto 模式按内容哈希缓存的格式选择数量
+    FORMAT_DECISION_CACHE_SIZE = 10000
+    # 缓存目录下保存处理结果缓存的子目录
+    RESULT_CACHE_DIR = 'results'
     
     def __init__(
             self,
-            executor: Optional[ThreadPoolExecutor] = None,
+            executor: Optional[Executor] = None,
             cache_dir: Optional[str] = None,
             retry_config: Optional[RetryConfig] = None,
             max_retries: int = 3,
             timeout: int = 30,
             max_concurrent_downloads: int = 5,
             temp_dir: str = "temp",
-            config: Optional[ImageConfig] = None
+            config: Optional[ImageConfig] = None,
+            backend: Optional[str] = None,
+            max_workers: Optional[int] = None,
+            result_cache_size: Optional[int] = None
         ):
         """
         初始化图片处理器
@@ -65,8 +663,18 @@ class ImageProcessor:
             max_concurrent_downloads: 最大并发下载数
             temp_dir: 临时文件目录
             config: 图片处理配置
+            backend: 未提供 executor 时使用的处理后端，thread 或 process，
+                默认使用 IMAGE_PROCESSING_BACKEND
+            max_workers: 处理 worker 数，进程后端默认使用 IMAGE_PROCESSING_WORKERS 或 CPU 核心数
+            result_cache_size: 处理结果缓存上限（字节），默认使用配置中的 result_cache_size，
+                0 或未设置 cache_dir 时不缓存
         """
-        self.executor = executor or ThreadPoolExecutor(max_workers=3)
+        self.backend = backend or app_config.IMAGE_PROCESSING_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"未知的图片处理后端: {self.backend}")
+        self.max_workers = max_workers
+        self.executor = executor or self._create_executor()
+        self._warmed_up = False
         self.cache_dir = cache_dir
         if cache_dir and not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
@@ -89,12 +697,53 @@ class ImageProcessor:
         # 设置图片处理配置
         self.processing_config = config or ImageConfig()
         self.MAX_IMAGE_SIZE = self.processing_config.max_file_size
+        # (内容哈希, 质量) -> auto 模式选中的格式，相同图片不再重复比较
+        self.format_decisions = BoundedDict(self.FORMAT_DECISION_CACHE_SIZE)
+        # 处理结果缓存，保存在缓存目录下，相同图片和配置不再重新处理
+        if result_cache_size is None:
+            result_cache_size = self.processing_config.result_cache_size
+        self.result_cache = None
+        if cache_dir and result_cache_size:
+            self.result_cache = ResultCache(os.path.join(cache_dir, self.RESULT_CACHE_DIR), result_cache_size)
+
+    def _create_executor(self) -> Executor:
+        """按后端创建执行器"""
+        if self.backend == 'process':
+            workers = self.max_workers or app_config.IMAGE_PROCESSING_WORKERS or os.cpu_count() or 1
+            self.max_workers = workers
+            # spawn 不会复制事件循环和线程池等父进程状态
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        self.max_workers = self.max_workers or 3
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    async def warm_up(self) -> int:
+        """
+        预先启动全部进程池 worker，避免首批图片承担进程启动和导入的开销
+        
+        Returns:
+            int: 已启动的 worker 数，线程后端为0
+        """
+        if not isinstance(self.executor, ProcessPoolExecutor) or self._warmed_up:
+            return 0
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, _worker_pid)
+            for _ in range(self.max_workers or 1)
+        ))
+        self._warmed_up = True
+        logger.info(f"图片处理进程池已就绪: {len(set(pids))} 个 worker")
+        return len(set(pids))
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
         self.session = aiohttp.ClientSession(
             timeout=aiohttp.ClientTimeout(total=self.timeout)
         )
+        await self.warm_up()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -163,7 +812,8 @@ class ImageProcessor:
     async def process_image(
             self,
             input_path: str,
-            config: Optional[Dict] = None
+            config: Optional[Dict] = None,
+            content_hash: Optional[str] = None
         ) -> ProcessingResult:
         """
         处理图片
@@ -174,21 +824,33 @@ class ImageProcessor:
                 - quality: 压缩质量 (1-100)
                 - max_width: 最大宽度
                 - max_height: 最大高度
-                - format: 目标格式
+                - format: 目标格式，auto 表示比较候选格式后选择最小的一个
                 - strip_metadata: 是否清除元数据
+                - draft_gap: JPEG 解码缩放后至少保留的缩小倍数，0 表示完整解码
+                - size_tolerance: 压缩到大小限制时允许低于限制的比例
+            content_hash: 输入文件内容的 SHA-256，用于缓存格式选择和处理结果，
+                未提供时读取文件计算
                 
         Returns:
             ProcessingResult: 处理结果
         """
         try:
+            options, decision_key, cache_key = await self._prepare_options(
+                input_path, config, content_hash
+            )
+            cached = await self._cached_result(cache_key, input_path)
+            if cached is not None:
+                return cached
             loop = asyncio.get_event_loop()
+            # 只传递路径和选项字典，进程后端不需要序列化处理器本身或像素数据
             result = await loop.run_in_executor(
                 self.executor,
-                self._process_image_sync,
+                process_image_file,
                 input_path,
-                config or {}
+                self.cache_dir,
+                options
             )
-            return result
+            return await self._record_result(result, decision_key, cache_key)
         except Exception as e:
             return ProcessingResult(
                 success=False,
@@ -198,137 +860,232 @@ class ImageProcessor:
                 error=str(e)
             )
 
-    def _process_image_sync(
+    async def process_bytes(
             self,
-            input_path: str,
-            config: Dict
+            data: Buffer,
+            config: Optional[Dict] = None,
+            content_hash: Optional[str] = None
         ) -> ProcessingResult:
-        """同步处理图片"""
+        """
+        处理内存中的图片，输入和输出都不经过磁盘
+        
+        结果的 output 可直接传给 R2Uploader.upload_bytes。线程后端不复制输入数据；
+        进程后端需要把数据发送到 worker，memoryview 和 bytearray 会先转换为 bytes。
+        
+        Args:
+            data: 图片数据，支持 bytes、bytearray、memoryview 和 BytesIO
+            config: 处理配置，覆盖默认配置，同 process_image
+            content_hash: 图片数据的 SHA-256，用于缓存格式选择和处理结果，
+                未提供时在线程中计算
+            
+        Returns:
+            ProcessingResult: 处理结果，编码数据在 output 中
+        """
         try:
-            with Image.open(input_path) as img:
-                # 基本信息
-                format = img.format
-                mime_type = Image.MIME[format]
-                
-                # 检查MIME类型
-                if mime_type not in self.ALLOWED_MIME_TYPES:
-                    raise ImageProcessingError(f"不支持的图片格式: {mime_type}")
-                
-                # 处理选项
-                quality = config.get('quality', self.processing_config.quality)
-                max_width = config.get('max_width', self.processing_config.max_width)
-                max_height = config.get('max_height', self.processing_config.max_height)
-                strip_metadata = config.get('strip_metadata', self.processing_config.strip_metadata)
-                target_format = config.get('format', self.processing_config.format)
-                if target_format == 'auto':
-                    target_format = format
-                
-                # 调整大小
-                if max_width or max_height:
-                    img.thumbnail((max_width, max_height), Image.LANCZOS)
-                
-                # 清除元数据
-                if strip_metadata:
-                    img = ImageOps.exif_transpose(img)
-                    
-                # 优化大小
-                output = io.BytesIO()
-                save_args = {'format': target_format}
-                
-                if target_format in ('JPEG', 'WEBP'):
-                    save_args['quality'] = quality
-                    if target_format == 'JPEG':
-                        save_args['progressive'] = True
-                        save_args['optimize'] = True
-                elif target_format == 'PNG':
-                    save_args['optimize'] = True
-                
-                img.save(output, **save_args)
-                
-                # 检查输出大小
-                output_size = output.tell()
-                if output_size > self.MAX_IMAGE_SIZE:
-                    if target_format in ('JPEG', 'WEBP'):
-                        # 尝试通过降低质量来减小文件大小
-                        output, quality = self._optimize_image_size(
-                            img, target_format, quality, self.MAX_IMAGE_SIZE
-                        )
-                    else:
-                        raise ImageProcessingError(f"处理后的图片太大: {output_size} bytes")
-                
-                # 保存结果
-                output_path = os.path.join(
-                    self.cache_dir,
-                    f"{os.path.splitext(os.path.basename(input_path))[0]}_processed.{target_format.lower()}"
-                )
-                with open(output_path, 'wb') as f:
-                    f.write(output.getvalue())
-                
-                return ProcessingResult(
-                    success=True,
-                    output_path=output_path,
-                    mime_type=Image.MIME[target_format],
-                    stats={
-                        'original_size': os.path.getsize(input_path),
-                        'processed_size': output_size,
-                        'width': img.width,
-                        'height': img.height,
-                        'format': target_format,
-                        'quality': quality
-                    }
-                )
-                
+            options, decision_key, cache_key = await self._prepare_options(
+                data, config, content_hash, buffer_sha256
+            )
+            cached = await self._cached_result(cache_key)
+            if cached is not None:
+                return cached
+            if isinstance(self.executor, ProcessPoolExecutor) and isinstance(data, (bytearray, memoryview)):
+                data = bytes(data)
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                process_image_buffer,
+                data,
+                options
+            )
+            return await self._record_result(result, decision_key, cache_key)
         except Exception as e:
-            error_msg = handle_processing_error(e)
-            logger.error(f"图片处理错误: {error_msg}")
             return ProcessingResult(
                 success=False,
                 output_path=None,
                 mime_type=None,
                 stats={},
-                error=error_msg
+                error=str(e)
             )
 
-    def _optimize_image_size(
+    async def process_variants(
             self,
-            image: Image.Image,
-            format: str,
-            initial_quality: int,
-            max_size: int
-        ) -> Tuple[io.BytesIO, int]:
+            input_path: str,
+            widths: Optional[Tuple[int, ...]] = None,
+            config: Optional[Dict] = None,
+            content_hash: Optional[str] = None,
+            output_dir: Optional[str] = None,
+            in_memory: bool = False
+        ) -> ProcessingResult:
         """
-        优化图片大小
+        一次解码生成多个宽度的图片，用于 srcset
         
         Args:
-            image: PIL图片对象
-            format: 目标格式
-            initial_quality: 初始质量
-            max_size: 最大文件大小
+            input_path: 输入图片路径
+            widths: 需要的宽度，默认使用配置中的 variant_widths
+            config: 处理配置，覆盖默认配置，同 process_image
+            content_hash: 输入文件内容的 SHA-256，同 process_image
+            output_dir: 输出目录，默认使用缓存目录
+            in_memory: 不写入磁盘，各尺寸的编码结果保存在 output 中，
+                可直接传给 R2Uploader.upload_bytes
             
         Returns:
-            Tuple[io.BytesIO, int]: (优化后的图片数据, 最终质量)
+            ProcessingResult: 处理结果，各尺寸见 variants
+        """
+        try:
+            options, decision_key, _ = await self._prepare_options(
+                input_path, config, content_hash, use_result_cache=False
+            )
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(
+                self.executor,
+                process_image_variants,
+                input_path,
+                None if in_memory else (output_dir or self.cache_dir),
+                tuple(widths or self.processing_config.variant_widths),
+                options
+            )
+            return await self._record_result(result, decision_key)
+        except Exception as e:
+            return ProcessingResult(
+                success=False,
+                output_path=None,
+                mime_type=None,
+                stats={},
+                error=str(e)
+            )
+
+    async def _prepare_options(
+            self,
+            source: Any,
+            config: Optional[Dict],
+            content_hash: Optional[str],
+            digest: Callable[[Any], str] = file_sha256,
+            use_result_cache: bool = True
+        ) -> Tuple[Dict[str, Any], Optional[Tuple[str, int]], Optional[str]]:
+        """
+        生成处理选项；auto 模式下已有格式选择时直接使用
+        
+        Args:
+            source: 输入图片路径或数据
+            config: 处理配置
+            content_hash: 已知的内容哈希
+            digest: 未提供 content_hash 时计算哈希的函数，在线程中执行
+            use_result_cache: 是否查找和保存处理结果缓存
+        
+        Returns:
+            Tuple[Dict[str, Any], Optional[Tuple[str, int]], Optional[str]]:
+                (处理选项, 需要记录格式选择的键, 处理结果缓存键)
+        """
+        options = self._resolve_options(config or {})
+        use_result_cache = use_result_cache and self.result_cache is not None
+        auto = options['format'].upper() == 'AUTO'
+        if content_hash is None and (auto or use_result_cache):
+            content_hash = await asyncio.to_thread(digest, source)
+        # 缓存键按调用方请求的选项计算，在替换为已选格式之前
+        cache_key = None
+        if use_result_cache:
+            cache_key = ResultCache.make_key(content_hash, options, PROCESSOR_VERSION)
+        decision_key = None
+        if auto:
+            decision_key = (content_hash, options['quality'])
+            if decision_key in self.format_decisions:
+                options['format'] = self.format_decisions[decision_key]
+                options['auto_decided'] = True
+                decision_key = None
+        return options, decision_key, cache_key
+
+    async def _cached_result(
+            self,
+            cache_key: Optional[str],
+            input_path: Optional[str] = None
+        ) -> Optional[ProcessingResult]:
         """
-        quality = initial_quality
-        output = io.BytesIO()
+        从处理结果缓存返回结果，不解码原图；索引和文件操作在线程中执行
         
-        while quality > 5:  # 最低质量限制
-            output = io.BytesIO()
-            save_args = {
-                'format': format,
-                'quality': quality
-            }
-            if format == 'JPEG':
-                save_args.update({
-                    'progressive': True,
-                    'optimize': True
-                })
-            
-            image.save(output, **save_args)
-            if output.tell() <= max_size:
-                break
-                
-            quality -= 5
+        Args:
+            cache_key: 处理结果缓存键
+            input_path: 输入图片路径，提供时结果放到缓存目录中，否则读入内存
         
+        Returns:
+            Optional[ProcessingResult]: 缓存的结果，未命中时为None
+        """
+        if cache_key is None:
+            return None
+        entry = await asyncio.to_thread(self.result_cache.get, cache_key)
+        if entry is None:
+            return None
+        output_path = output = None
+        if input_path is not None:
+            output_path = await asyncio.to_thread(self.result_cache.materialize, entry, os.path.join(
+                self.cache_dir,
+                f"{os.path.splitext(os.path.basename(input_path))[0]}_processed.{entry.stats['format'].lower()}"
+            ))
+        else:
+            output = await asyncio.to_thread(self.result_cache.read, entry)
+        logger.debug(f"处理结果缓存命中: {input_path or cache_key}")
+        return ProcessingResult(
+            success=True,
+            output_path=output_path,
+            mime_type=entry.mime_type,
+            stats=dict(entry.stats),
+            output=output,
+            cached=True
+        )
+
+    async def _record_result(
+            self,
+            result: ProcessingResult,
+            decision_key: Optional[Tuple[str, int]],
+            cache_key: Optional[str] = None
+        ) -> ProcessingResult:
+        """记录 auto 模式的格式选择、处理结果缓存和 worker 中测量的耗时"""
+        # 动画图片保持原格式，不作为 auto 模式的格式选择记录
+        if decision_key is not None and result.success and not result.stats.get('animated'):
+            self.format_decisions[decision_key] = result.stats['format']
+        if cache_key is not None and result.success:
+            await asyncio.to_thread(
+                self.result_cache.store,
+                cache_key, result.output_path or result.output, result.mime_type, result.stats
+            )
+        # 耗时在 worker 中测量，指标在父进程中记录
+        for operation, duration in result.timings.items():
+            self.metrics.record_processing_time(operation, duration)
+        return result
+
+    def _resolve_options(self, config: Dict) -> Dict[str, Any]:
+        """合并调用参数与默认配置，得到可传给 worker 进程的普通字典"""
+        return {
+            'quality': config.get('quality', self.processing_config.quality),
+            'max_width': config.get('max_width', self.processing_config.max_width),
+            'max_height': config.get('max_height', self.processing_config.max_height),
+            'strip_metadata': config.get('strip_metadata', self.processing_config.strip_metadata),
+            'format': config.get('format', self.processing_config.format),
+            'max_file_size': self.MAX_IMAGE_SIZE,
+            'draft_gap': config.get('draft_gap', self.processing_config.draft_gap),
+            'size_tolerance': config.get('size_tolerance', self.processing_config.size_tolerance),
+            'auto_formats': tuple(config.get('auto_formats', self.processing_config.auto_formats)),
+            'auto_min_psnr': config.get('auto_min_psnr', self.processing_config.auto_min_psnr),
+            'encode_workers': config.get('encode_workers', self.processing_config.encode_workers),
+            'allowed_mime_types': self.ALLOWED_MIME_TYPES,
+        }
+
+    def _process_image_sync(
+            self,
+            input_path: str,
+            config: Dict
+        ) -> ProcessingResult:
+        """同步处理图片"""
+        return process_image_file(input_path, self.cache_dir, self._resolve_options(config))
+
+    def _optimize_image_size(
+            self,
+            image: Image.Image,
+            format: str,
+            initial_quality: int,
+            max_size: int
+        ) -> Tuple[io.BytesIO, int]:
+        """优化图片大小，见 optimize_image_size；只返回数据和质量"""
+        output, quality, _ = optimize_image_size(image, format, initial_quality, max_size)
         return output, quality
 
     def get_mime_type(self, file_path: str) -> str:
@@ -3,37 +3,85 @@ Markdown处理器模块
 """
 import re
 import os
+import html
+import asyncio
 import aiohttp
 import logging
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Optional
 from dataclasses import dataclass
 from urllib.parse import urlparse, unquote
 from .image_downloader import ImageDownloader
 from .r2_uploader import R2Uploader
+from .host_limiter import interleave_by_host
+from .image_processor import ImageProcessor
 from ..config import config
 
 @dataclass
 class ImageLink:
-    """图片链接数据类"""
+    """图片链接数据类
+
+    start/end 记录原文中 URL 所在的切片位置，用于单遍重写；
+    tag_start/tag_end 记录整个图片语法的位置，生成 srcset 时整体替换。
+    """
     alt: str
     url: str
     title: str = ""
+    start: int = -1
+    end: int = -1
+    tag_start: int = -1
+    tag_end: int = -1
+    html: bool = False
+
+def render_srcset_img(alt: str, title: str, sources: List[Tuple[str, int]]) -> str:
+    """
+    生成带 srcset 的 img 标签
+
+    Args:
+        alt: 替代文本
+        title: 标题，为空时省略
+        sources: (URL, 宽度) 列表，第一个作为 src
+
+    Returns:
+        str: img 标签
+    """
+    srcset = ', '.join(f'{url} {width}w' for url, width in sources)
+    attrs = f'src="{html.escape(sources[0][0])}" srcset="{html.escape(srcset)}" alt="{html.escape(alt)}"'
+    if title:
+        attrs += f' title="{html.escape(title)}"'
+    return f'<img {attrs}>'
 
 class MarkdownProcessor:
     """Markdown处理器类"""
     
     # 图片链接正则表达式
-    IMAGE_PATTERN = r'!\[(.*?)\]\((.*?)(?:\s+"(.*?)")?\)'
+    IMAGE_PATTERN = r'!\[(.*?)\]\(\s*(.*?)(?:\s+"(.*?)")?\s*\)'
+    # HTML 图片标签正则表达式
+    HTML_IMAGE_PATTERN = r'<img.*?src=["\'](.*?)["\'].*?alt=["\'](.*?)["\'].*?>'
+
+    _image_re = re.compile(IMAGE_PATTERN)
+    _html_image_re = re.compile(HTML_IMAGE_PATTERN)
     
-    def __init__(self, downloader: ImageDownloader, r2_uploader: R2Uploader):
+    def __init__(self, downloader: ImageDownloader, r2_uploader: R2Uploader,
+                 download_concurrency: Optional[int] = None,
+                 upload_concurrency: Optional[int] = None,
+                 queue_size: Optional[int] = None,
+                 image_processor: Optional[ImageProcessor] = None):
         """初始化 Markdown 处理器
         
         Args:
             downloader: 图片下载器实例
             r2_uploader: R2上传器实例
+            download_concurrency: 下载阶段并发数，默认使用 MAX_CONCURRENT_DOWNLOADS
+            upload_concurrency: 上传阶段并发数，默认使用 MAX_CONCURRENT_UPLOADS
+            queue_size: 下载与上传阶段之间的队列容量，默认使用 PIPELINE_QUEUE_SIZE
+            image_processor: 图片处理器，提供时为每张图片生成多个宽度并以 srcset 引用
         """
         self.downloader = downloader
         self._r2_uploader = r2_uploader
+        self.image_processor = image_processor
+        self.download_concurrency = download_concurrency or config.MAX_CONCURRENT_DOWNLOADS
+        self.upload_concurrency = upload_concurrency or config.MAX_CONCURRENT_UPLOADS
+        self.queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
         self.image_links = []
         self.logger = logging.getLogger('mdimg_transfer.markdown_processor')
         self.errors = []  # Add error tracking list
@@ -56,35 +104,37 @@ class MarkdownProcessor:
         Returns:
             List[ImageLink]: 图片链接列表
         """
-        # 标准 Markdown 图片语法
-        standard_pattern = r'!\[(.*?)\]\((.*?)(?:\s+"(.*?)")?\)'
-        
-        # HTML 图片标签语法
-        html_pattern = r'<img.*?src=["\'](.*?)["\'].*?alt=["\'](.*?)["\'].*?>'
-        
         # 收集所有匹配的图片链接
         image_links = []
         
         # 处理标准 Markdown 语法
-        for match in re.finditer(standard_pattern, content):
+        for match in self._image_re.finditer(content):
             alt = match.group(1)
             url = unquote(match.group(2))
             title = match.group(3) or ""
             
             # 验证URL
             if self._is_valid_url(url):
-                image_links.append(ImageLink(alt=alt, url=url, title=title))
+                image_links.append(ImageLink(
+                    alt=alt, url=url, title=title,
+                    start=match.start(2), end=match.end(2),
+                    tag_start=match.start(), tag_end=match.end()
+                ))
             else:
                 self.logger.warning(f"跳过无效的图片URL: {url}")
         
         # 处理 HTML 图片标签
-        for match in re.finditer(html_pattern, content):
+        for match in self._html_image_re.finditer(content):
             url = unquote(match.group(1))
             alt = match.group(2)
             
             # 验证URL
             if self._is_valid_url(url):
-                image_links.append(ImageLink(alt=alt, url=url))
+                image_links.append(ImageLink(
+                    alt=alt, url=url,
+                    start=match.start(1), end=match.end(1),
+                    tag_start=match.start(), tag_end=match.end(), html=True
+                ))
             else:
                 self.logger.warning(f"跳过无效的图片URL: {url}")
         
@@ -92,6 +142,62 @@ class MarkdownProcessor:
         self.logger.info("找到 %d 个图片链接", len(self.image_links))
         return image_links
         
+    def rewrite_content(self, content: str, replacements: Dict[str, str],
+                        links: Optional[List[ImageLink]] = None,
+                        srcsets: Optional[Dict[str, List[Tuple[str, int]]]] = None) -> str:
+        """
+        按解析时记录的 URL 位置单遍重写文档。
+
+        只替换 URL 本身，alt、title 及原文中的空白和引号保持不变。
+        有多个宽度的图片：Markdown 图片替换为带 srcset 的 img 标签，
+        HTML 图片在 src 之后插入 srcset 属性。
+        输出由原文切片拼接而成，耗时与文档长度和图片数量成线性关系。
+
+        Args:
+            content: 原始 Markdown 内容（须与解析时相同）
+            replacements: 原始URL到新URL的映射
+            links: 图片链接列表，默认使用最近一次解析的结果
+            srcsets: 原始URL到 (URL, 宽度) 列表的映射
+
+        Returns:
+            str: 重写后的内容
+        """
+        if links is None:
+            links = self.image_links
+        srcsets = srcsets or {}
+        spans = []
+        for link in links:
+            if link.start < 0 or link.url not in replacements:
+                continue
+            sources = srcsets.get(link.url)
+            if not sources:
+                spans.append((link.start, link.end, replacements[link.url]))
+            elif not link.html:
+                spans.append((link.tag_start, link.tag_end,
+                              render_srcset_img(link.alt, link.title, sources)))
+            elif 'srcset' in content[link.tag_start:link.tag_end]:
+                spans.append((link.start, link.end, replacements[link.url]))
+            else:
+                srcset = html.escape(', '.join(f'{url} {width}w' for url, width in sources))
+                quote = content[link.end]
+                spans.append((link.start, link.end + 1,
+                              f'{replacements[link.url]}{quote} srcset="{srcset}"'))
+        if not spans:
+            return content
+        spans.sort()
+
+        parts = []
+        pos = 0
+        for start, end, new_text in spans:
+            # 跳过重叠的匹配（例如 alt 文本中嵌入了 <img> 标签）
+            if start < pos:
+                continue
+            parts.append(content[pos:start])
+            parts.append(new_text)
+            pos = end
+        parts.append(content[pos:])
+        return ''.join(parts)
+
     def _is_valid_url(self, url: str) -> bool:
         """验证URL是否有效"""
         try:
@@ -100,6 +206,123 @@ class MarkdownProcessor:
         except Exception:
             return False
             
+    async def _upload_variants(self, url: str, local_path: str,
+                               content_hash: Optional[str]) -> Optional[List[Tuple[str, int]]]:
+        """
+        生成并上传多个宽度的图片
+
+        Returns:
+            Optional[List[Tuple[str, int]]]: (R2 URL, 宽度) 列表，从大到小；
+                生成失败或动画图片不生成多个尺寸时为 None
+        """
+        # 各尺寸保留在内存中直接上传，不占用临时目录
+        result = await self.image_processor.process_variants(
+            local_path, content_hash=content_hash, in_memory=True
+        )
+        if not result.success:
+            self.logger.warning("生成响应式图片失败，上传原图: %s, %s", url, result.error)
+            return None
+        if not result.variants:
+            return None
+        stem = os.path.splitext(os.path.basename(local_path))[0]
+        extension = result.stats['format'].lower()
+        r2_urls = await asyncio.gather(*(
+            self.r2_uploader.upload_bytes(
+                variant.output, f"{stem}_{variant.width}w.{extension}", result.mime_type
+            )
+            for variant in result.variants
+        ))
+        return [(r2_url, variant.width) for r2_url, variant in zip(r2_urls, result.variants)]
+
+    async def _transfer_images(self, urls: List[str],
+                               results: Dict[str, Tuple[bool, str]],
+                               srcsets: Optional[Dict[str, List[Tuple[str, int]]]] = None) -> Dict[str, str]:
+        """
+        以流水线方式下载并上传图片。
+
+        下载阶段和上传阶段之间通过有界队列连接，各自拥有独立的并发数。
+        单个主机的并发由下载器的按主机限流控制。
+        每张图片下载完成后立即进入上传阶段；队列满时下载阶段暂停，形成背压。
+
+        Args:
+            urls: 去重后的图片URL列表
+            results: 用于记录每个URL处理结果的字典
+            srcsets: 配置了图片处理器时，用于记录每个URL各宽度的 R2 URL
+
+        Returns:
+            Dict[str, str]: 原始URL到R2 URL的映射
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # 按主机轮流取用，避免所有下载 worker 同时等待同一个慢速主机
+        pending = iter(interleave_by_host(urls))
+        replacements: Dict[str, str] = {}
+
+        async def download_worker():
+            # 多个 worker 共享同一个迭代器，每个URL只会被取出一次
+            for url in pending:
+                try:
+                    local_path = await self.downloader.download_image(url, job=job)
+                except Exception as e:
+                    self.logger.error("下载图片出错: %s, %s", url, str(e))
+                    local_path = None
+                if not local_path:
+                    self.logger.error("下载图片失败: %s", url)
+                    results[url] = (False, "下载失败")
+                    continue
+                await queue.put((url, local_path))
+
+        async def upload_worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    url, local_path = item
+                    try:
+                        filename = os.path.basename(local_path)
+                        # 下载时已计算的内容哈希，避免上传前重新读取文件
+                        content_hash = self.downloader.get_content_hash(url)
+                        sources = None
+                        if self.image_processor is not None:
+                            sources = await self._upload_variants(url, local_path, content_hash)
+                        if sources:
+                            r2_url = sources[0][0]
+                            if srcsets is not None and len(sources) > 1:
+                                srcsets[url] = sources
+                        else:
+                            r2_url = await self.r2_uploader.upload_image(
+                                local_path, filename, content_hash=content_hash
+                            )
+                        self.logger.info("成功上传图片到R2: %s -> %s", local_path, r2_url)
+                        replacements[url] = r2_url
+                        results[url] = (True, r2_url)
+                    except Exception as e:
+                        self.logger.error("上传到R2失败: %s", str(e))
+                        results[url] = (False, f"上传失败: {str(e)}")
+                        self.errors.append(str(e))  # Add error to tracking list
+                finally:
+                    queue.task_done()
+
+        # 下载的临时文件在全部上传结束后随任务目录一起删除
+        async with self.downloader, self.downloader.temp_job() as job:
+            uploaders = [
+                asyncio.create_task(upload_worker())
+                for _ in range(self.upload_concurrency)
+            ]
+            try:
+                await asyncio.gather(*(
+                    download_worker()
+                    for _ in range(min(self.download_concurrency, len(urls)))
+                ))
+                for _ in uploaders:
+                    await queue.put(None)
+                await asyncio.gather(*uploaders)
+            finally:
+                for task in uploaders:
+                    task.cancel()
+
+        return replacements
+
     async def process_content(self, content: str) -> Tuple[str, Dict[str, Tuple[bool, str]]]:
         """处理 Markdown 内容。
 
@@ -122,43 +345,14 @@ class MarkdownProcessor:
         new_content = content
         
         try:
-            # 批量下载图片
-            urls = [link.url for link in self.image_links]
-            download_results_dict = await self.downloader.download_images(urls)
+            # 下载和上传流水线处理
+            urls = list(dict.fromkeys(link.url for link in self.image_links))
+            srcsets: Dict[str, List[Tuple[str, int]]] = {}
+            replacements = await self._transfer_images(urls, download_results, srcsets)
             
-            # 处理每个链接
-            for link in self.image_links:
-                local_path = download_results_dict.get(link.url)
-                if not local_path:
-                    self.logger.error("下载图片失败: %s", link.url)
-                    download_results[link.url] = (False, "下载失败")
-                    continue
-                    
-                # 上传到 R2
-                try:
-                    filename = os.path.basename(local_path)
-                    r2_url = await self.r2_uploader.upload_image(local_path, filename)
-                    self.logger.info("成功上传图片到R2: %s -> %s", local_path, r2_url)
-                    
-                    # 替换链接
-                    if '"' in link.title:
-                        old_link = f'![{link.alt}]({link.url} "{link.title}")'
-                    else:
-                        old_link = f'![{link.alt}]({link.url})'
-                        
-                    if '"' in link.title:
-                        new_link = f'![{link.alt}]({r2_url} "{link.title}")'
-                    else:
-                        new_link = f'![{link.alt}]({r2_url})'
-                        
-                    new_content = new_content.replace(old_link, new_link)
-                    self.logger.info("替换图片链接: %s -> %s", link.url, r2_url)
-                    download_results[link.url] = (True, r2_url)
-                    
-                except Exception as e:
-                    self.logger.error("上传到R2失败: %s", str(e))
-                    download_results[link.url] = (False, f"上传失败: {str(e)}")
-                    self.errors.append(str(e))  # Add error to tracking list
+            # 单遍替换所有链接
+            new_content = self.rewrite_content(content, replacements, srcsets=srcsets)
+            self.logger.info("替换了 %d 个图片链接", len(replacements))
                     
         except Exception as e:
             self.logger.error("处理图片失败: %s", str(e))
@@ -2,37 +2,243 @@
 Cloudflare R2 上传模块
 """
 import os
+import asyncio
+import hashlib
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from ..config import config
+from .buffers import Buffer, as_fileobj, buffer_sha256, buffer_size
+from .failure_cache import BoundedDict
 
 logger = logging.getLogger(__name__)
 
+def build_transfer_config(
+        multipart_threshold: Optional[int] = None,
+        multipart_chunksize: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ) -> TransferConfig:
+    """
+    创建分片上传配置，未指定的参数使用全局配置
+
+    Args:
+        multipart_threshold: 超过该大小(字节)时使用分片上传
+        multipart_chunksize: 分片大小(字节)
+        max_concurrency: 单个对象的分片并发数
+
+    Returns:
+        TransferConfig: boto3 传输配置
+    """
+    return TransferConfig(
+        multipart_threshold=multipart_threshold or config.R2_MULTIPART_THRESHOLD,
+        multipart_chunksize=multipart_chunksize or config.R2_MULTIPART_CHUNKSIZE,
+        max_concurrency=max_concurrency or config.R2_MULTIPART_CONCURRENCY,
+        use_threads=True
+    )
+
 class R2Uploader:
-    def __init__(self):
-        """初始化 R2 客户端"""
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # 本地记录的已存在对象键数量上限
+    KNOWN_KEYS_MAX = 50000
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 max_pool_connections: Optional[int] = None,
+                 content_addressed: Optional[bool] = None,
+                 transfer_config: Optional[TransferConfig] = None):
+        """
+        初始化 R2 客户端
+
+        boto3 客户端是同步的，上传在上传器自有的有界线程池中执行，
+        避免阻塞事件循环。
+
+        Args:
+            max_workers: 上传线程数，默认使用 R2_UPLOAD_WORKERS
+            max_pool_connections: HTTP 连接池大小，默认使用 R2_MAX_POOL_CONNECTIONS
+            content_addressed: 是否按内容哈希命名对象并去重，默认使用 R2_CONTENT_ADDRESSED
+            transfer_config: 分片上传配置，默认使用 R2_MULTIPART_* 配置
+        """
         if not config.R2_ENDPOINT_URL:
             raise ValueError("R2_ENDPOINT_URL is not configured")
             
+        self.max_workers = max_workers or config.R2_UPLOAD_WORKERS
+        # 连接池不应小于线程数，否则线程会等待空闲连接
+        pool_size = max(max_pool_connections or config.R2_MAX_POOL_CONNECTIONS, self.max_workers)
         self.s3_client = boto3.client(
             's3',
             endpoint_url=config.R2_ENDPOINT_URL,
             aws_access_key_id=config.R2_ACCESS_KEY_ID,
             aws_secret_access_key=config.R2_SECRET_ACCESS_KEY,
             config=Config(
-                retries={'max_attempts': 3}
+                retries={'max_attempts': 3},
+                max_pool_connections=pool_size
             )
         )
         self.bucket_name = config.R2_BUCKET_NAME
+        self.transfer_config = transfer_config or build_transfer_config()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='r2-upload'
+        )
+        self.content_addressed = (
+            config.R2_CONTENT_ADDRESSED if content_addressed is None else content_addressed
+        )
+        # 已确认存在于 R2 的对象键，按最近使用淘汰；被淘汰的键下次上传时通过 HEAD 确认
+        self._known_keys = BoundedDict(self.KNOWN_KEYS_MAX)
+        # 正在上传的对象键，相同内容的并发上传共享同一个任务
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        """在上传线程池中执行同步的 boto3 调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def _put_file(self, file_path: str, object_name: str, content_type: str) -> None:
+        """
+        上传文件（在线程池中执行）
+
+        小文件使用单个 PutObject 请求；超过分片阈值时按 transfer_config
+        并发上传各个分片。
+        """
+        if os.path.getsize(file_path) >= self.transfer_config.multipart_threshold:
+            self.s3_client.upload_file(
+                file_path,
+                self.bucket_name,
+                object_name,
+                ExtraArgs={'ContentType': content_type},
+                Config=self.transfer_config
+            )
+            return
+        with open(file_path, 'rb') as f:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=object_name,
+                Body=f,
+                ContentType=content_type
+            )
+
+    def _put_buffer(self, data: Buffer, object_name: str, content_type: str) -> None:
+        """上传内存缓冲区，无需写入临时文件（在线程池中执行）"""
+        fileobj = as_fileobj(data)
+        if buffer_size(data) >= self.transfer_config.multipart_threshold:
+            self.s3_client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                object_name,
+                ExtraArgs={'ContentType': content_type},
+                Config=self.transfer_config
+            )
+            return
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=object_name,
+            Body=fileobj,
+            ContentType=content_type
+        )
+
+    def _hash_file(self, file_path: str) -> str:
+        """计算文件内容的 SHA-256（在线程池中执行）"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _hash_buffer(data: Buffer) -> str:
+        """计算内存缓冲区的 SHA-256（在线程池中执行）"""
+        return buffer_sha256(data)
+
+    @staticmethod
+    def content_key(content_hash: str, ext: str) -> str:
+        """
+        根据内容哈希生成对象键，形如 sha256/ab/cd/abcd....png
+
+        Args:
+            content_hash: 十六进制 SHA-256
+            ext: 文件扩展名（含点）
+
+        Returns:
+            str: 对象键
+        """
+        return f"sha256/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{ext.lower()}"
+
+    def _object_exists(self, object_name: str) -> bool:
+        """通过 HEAD 请求检查对象是否已存在（在线程池中执行）"""
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=object_name)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def _put_if_missing(self, put: Callable[[object, str, str], None], source,
+                        object_name: str, content_type: str) -> bool:
+        """对象不存在时才上传，返回是否实际传输了数据（在线程池中执行）"""
+        if self._object_exists(object_name):
+            return False
+        put(source, object_name, content_type)
+        return True
+
+    async def _upload_deduplicated(self, put: Callable[[object, str, str], None], source,
+                                   content_hash: str, ext: str, content_type: str) -> str:
+        """按内容哈希上传，已存在的对象不会重复传输"""
+        key = self.content_key(content_hash, ext)
+
+        if key in self._known_keys:
+            self._known_keys.move_to_end(key)
+            logger.debug(f"Object already known to exist, skipping upload: {key}")
+            return key
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            await asyncio.shield(inflight)
+            return key
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            transferred = await self._run_in_executor(
+                self._put_if_missing,
+                put,
+                source,
+                key,
+                content_type
+            )
+            self._known_keys[key] = True
+            future.set_result(key)
+            if not transferred:
+                logger.debug(f"Object already exists in R2, skipped upload: {key}")
+            return key
+        except Exception as e:
+            future.set_exception(e)
+            # 避免未被等待的异常产生警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def close(self) -> None:
+        """关闭上传线程池"""
+        self.executor.shutdown(wait=True)
         
-    async def upload_image(self, file_path: str, object_name: str) -> str:
+    async def upload_image(self, file_path: str, object_name: str,
+                           content_hash: Optional[str] = None) -> str:
         """
         上传图片到 R2
         
         Args:
             file_path: 本地文件路径
-            object_name: R2中的对象名称
+            object_name: R2中的对象名称；启用内容寻址时仅用于确定扩展名
+            content_hash: 已知的文件内容 SHA-256，提供时不再重新读取文件计算
             
         Returns:
             str: R2 公共访问URL
@@ -45,12 +251,20 @@ class R2Uploader:
             content_type = self._get_content_type(file_path)
             
             # 上传文件
-            self.s3_client.upload_file(
-                file_path,
-                self.bucket_name,
-                object_name,
-                ExtraArgs={'ContentType': content_type}
-            )
+            if self.content_addressed:
+                ext = os.path.splitext(object_name)[1] or os.path.splitext(file_path)[1]
+                if content_hash is None:
+                    content_hash = await self._run_in_executor(self._hash_file, file_path)
+                object_name = await self._upload_deduplicated(
+                    self._put_file, file_path, content_hash, ext, content_type
+                )
+            else:
+                await self._run_in_executor(
+                    self._put_file,
+                    file_path,
+                    object_name,
+                    content_type
+                )
             
             # 构建公共访问URL
             public_url = f"{config.R2_PUBLIC_URL}/{object_name}"
@@ -61,6 +275,44 @@ class R2Uploader:
             logger.error(f"Failed to upload image to R2: {str(e)}", exc_info=True)
             raise
             
+    async def upload_bytes(self, data: Buffer, object_name: str,
+                           content_type: Optional[str] = None) -> str:
+        """
+        直接上传内存中的图片数据到 R2，无需先写入临时文件
+
+        Args:
+            data: 图片数据，支持 bytes、bytearray、memoryview 和 BytesIO
+            object_name: R2中的对象名称；启用内容寻址时仅用于确定扩展名
+            content_type: MIME类型，默认根据对象名称的扩展名推断
+
+        Returns:
+            str: R2 公共访问URL
+        """
+        try:
+            content_type = content_type or self._get_content_type(object_name)
+
+            if self.content_addressed:
+                ext = os.path.splitext(object_name)[1]
+                content_hash = await self._run_in_executor(self._hash_buffer, data)
+                object_name = await self._upload_deduplicated(
+                    self._put_buffer, data, content_hash, ext, content_type
+                )
+            else:
+                await self._run_in_executor(
+                    self._put_buffer,
+                    data,
+                    object_name,
+                    content_type
+                )
+
+            public_url = f"{config.R2_PUBLIC_URL}/{object_name}"
+            logger.info(f"Successfully uploaded image to R2: {public_url}")
+            return public_url
+
+        except Exception as e:
+            logger.error(f"Failed to upload image to R2: {str(e)}", exc_info=True)
+            raise
+
     def _get_content_type(self, file_path: str) -> str:
         """获取文件的MIME类型"""
         ext = os.path.splitext(file_path)[1].lower()
@@ -72,5 +324,8 @@ class R2Uploader:
             '.webp': 'image/webp',
             '.bmp': 'image/bmp',
             '.tiff': 'image/tiff',
+            '.avif': 'image/avif',
+            '.svg': 'image/svg+xml',
+            '.ico': 'image/x-icon',
         }
         return content_types.get(ext, 'application/octet-stream')
@@ -0,0 +1,150 @@
+"""
+图片处理结果缓存模块。
+按 (原图内容哈希, 处理选项, 处理器版本) 在磁盘上保存处理结果，
+相同图片以相同配置再次处理时直接返回，无需解码和编码。
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import logging
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Optional, Union
+
+from .buffers import Buffer
+from .disk_store import DiskStore
+
+logger = logging.getLogger(__name__)
+
+# 不影响输出内容的处理选项，不参与缓存键
+IGNORED_OPTIONS = frozenset({'allowed_mime_types', 'encode_workers', 'auto_decided'})
+
+@dataclass
+class ResultEntry:
+    """缓存的处理结果"""
+    key: str
+    size: int
+    mime_type: str
+    stats: Dict[str, Any] = field(default_factory=dict)
+    stored_at: float = 0.0
+
+class ResultCache:
+    """基于磁盘的处理结果缓存，按字节数做 LRU 淘汰，可由多个工作进程共享"""
+
+    def __init__(self, cache_dir: str, max_size: int):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 缓存结果的最大总字节数
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._store = DiskStore(cache_dir, max_size)
+
+    @staticmethod
+    def make_key(content_hash: str, options: Dict[str, Any], version: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            content_hash: 原图内容的 SHA-256
+            options: 处理选项，与键顺序无关
+            version: 处理器版本，处理逻辑或编码库变化时使旧结果失效
+
+        Returns:
+            str: 十六进制 SHA-256
+        """
+        normalized = {k: v for k, v in options.items() if k not in IGNORED_OPTIONS}
+        payload = json.dumps([content_hash, normalized, version], sort_keys=True, default=list)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @property
+    def total_size(self) -> int:
+        """当前缓存结果的总字节数"""
+        return self._store.total_size
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def body_path(self, entry: ResultEntry) -> str:
+        return self._store.body_path(entry.key)
+
+    def get(self, key: str) -> Optional[ResultEntry]:
+        """
+        查找缓存结果
+
+        Args:
+            key: make_key 生成的缓存键
+
+        Returns:
+            Optional[ResultEntry]: 缓存条目，不存在时为None
+        """
+        record = self._store.get(key)
+        if record is None:
+            return None
+        try:
+            return ResultEntry(**record)
+        except TypeError:
+            self._store.remove(key)
+            return None
+
+    def materialize(self, entry: ResultEntry, dest_path: str) -> str:
+        """
+        将缓存结果放到目标路径，同一文件系统上使用硬链接避免复制
+
+        Args:
+            entry: 缓存条目
+            dest_path: 目标路径
+
+        Returns:
+            str: 目标路径
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(self.body_path(entry), dest_path)
+        except OSError:
+            shutil.copyfile(self.body_path(entry), dest_path)
+        return dest_path
+
+    def read(self, entry: ResultEntry) -> io.BytesIO:
+        """读取缓存结果到内存"""
+        with open(self.body_path(entry), 'rb') as f:
+            return io.BytesIO(f.read())
+
+    def store(self, key: str, source: Union[str, Buffer], mime_type: str,
+              stats: Dict[str, Any]) -> Optional[ResultEntry]:
+        """
+        保存处理结果
+
+        写入结果文件和索引，在事件循环中应通过 asyncio.to_thread 调用。
+
+        Args:
+            key: make_key 生成的缓存键
+            source: 结果文件路径或内存中的结果
+            mime_type: 结果的MIME类型
+            stats: 处理统计信息
+
+        Returns:
+            Optional[ResultEntry]: 新的缓存条目，结果超过缓存上限时为None
+        """
+        entry = ResultEntry(key=key, size=0, mime_type=mime_type,
+                            stats=dict(stats), stored_at=time.time())
+        record = self._store.put(key, key, source, asdict(entry))
+        if record is None:
+            return None
+        entry.size = record['size']
+        return entry
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._store.clear()
+
+    def close(self) -> None:
+        """关闭索引"""
+        self._store.close()
@@ -0,0 +1,198 @@
+"""
+SQLite 索引模块。
+SQLiteBackend 和 DiskStore 共用的存储层：条目保存在 SQLite 表中，按字节数做近似 LRU 淘汰，
+可由同一主机上的多个工作进程共享，重启后仍然有效。
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SQLiteIndex:
+    """
+    按字节数做近似 LRU 淘汰的 SQLite 键值索引
+
+    每个条目保存一个 BLOB 值、计入容量的字节数和可选的过期时间。使用 WAL 模式，
+    多个进程可以同时读取，写入由 SQLite 文件锁串行化。读取时的访问时间按
+    TOUCH_INTERVAL 秒的粒度更新，热点键的连续读取不产生写入。
+
+    方法均为同步调用，在事件循环中使用时应放到线程中执行。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+        CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta VALUES ('total_size', 0);
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+            UPDATE meta SET value = value + NEW.size WHERE name = 'total_size';
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+            UPDATE meta SET value = value - OLD.size WHERE name = 'total_size';
+        END;
+    """
+
+    # 访问时间的刷新间隔（秒）
+    TOUCH_INTERVAL = 5.0
+
+    def __init__(self, path: str, max_size: int, busy_timeout: float = 5.0):
+        """
+        打开或创建索引
+
+        Args:
+            path: 数据库文件路径
+            max_size: 所有条目的最大总字节数
+            busy_timeout: 等待其他进程释放写锁的秒数
+        """
+        self.path = path
+        self.max_size = max_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 同一连接会被多个线程使用，由锁串行化
+        self._lock = threading.Lock()
+        self._last_access = 0.0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout,
+                                     check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @property
+    def total_size(self) -> int:
+        """所有条目的总字节数"""
+        with self._lock:
+            return self._total_size()
+
+    def _total_size(self) -> int:
+        return self._conn.execute(
+            "SELECT value FROM meta WHERE name = 'total_size'"
+        ).fetchone()[0]
+
+    def _now(self) -> float:
+        """访问时间，同一进程内严格递增，保证 LRU 顺序"""
+        self._last_access = max(time.time(), self._last_access + 1e-6)
+        return self._last_access
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """持有锁并在写事务中执行，出错时回滚"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _read(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        """
+        读取条目，访问时间超过刷新间隔时更新
+
+        Returns:
+            Optional[Tuple[bytes, Optional[float]]]: (值, 过期时间)，不存在时为None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[2] >= self.TOUCH_INTERVAL:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", (self._now(), key)
+                )
+        return row[0], row[1]
+
+    def _write(self, key: str, value: bytes, size: int,
+               expires_at: Optional[float] = None) -> List[bytes]:
+        """
+        写入条目并淘汰超出容量的最久未使用条目
+
+        Args:
+            key: 条目键
+            value: 条目值
+            size: 计入容量的字节数
+            expires_at: 过期时间
+
+        Returns:
+            List[bytes]: 被淘汰条目的值
+        """
+        with self._transaction():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, self._now())
+            )
+            return self._evict()
+
+    def _evict(self) -> List[bytes]:
+        """删除最久未使用的条目直到总大小不超过上限，调用方需在写事务中"""
+        excess = self._total_size() - self.max_size
+        if excess <= 0:
+            return []
+        rows = []
+        for key, value, size in self._conn.execute(
+                "SELECT key, value, size FROM entries ORDER BY accessed_at"):
+            rows.append((key, value))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        for key, _ in rows:
+            logger.debug(f"缓存淘汰: {key}")
+        return [value for _, value in rows]
+
+    def _replace(self, key: str, value: bytes) -> None:
+        """替换已有条目的值并更新访问时间，不改变计入容量的字节数"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET value = ?, accessed_at = ? WHERE key = ?",
+                (value, self._now(), key)
+            )
+
+    def _delete(self, key: str) -> Optional[bytes]:
+        """
+        删除条目
+
+        Returns:
+            Optional[bytes]: 被删除条目的值，不存在时为None
+        """
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return row[0]
+
+    def _delete_all(self) -> List[bytes]:
+        """删除所有条目，返回被删除条目的值"""
+        with self._transaction():
+            rows = self._conn.execute("SELECT value FROM entries").fetchall()
+            self._conn.execute("DELETE FROM entries")
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        """关闭索引"""
+        with self._lock:
+            self._conn.close()
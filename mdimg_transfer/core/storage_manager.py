@@ -5,13 +5,19 @@
 
 import os
 import shutil
+import asyncio
 import logging
+import functools
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any, Tuple
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from pathlib import Path
 
+from .buffers import Buffer, as_fileobj
+from .r2_uploader import build_transfer_config
+
 logger = logging.getLogger(__name__)
 
 class StorageProvider(ABC):
@@ -32,6 +38,21 @@ class StorageProvider(ABC):
         """
         pass
     
+    @abstractmethod
+    async def upload_bytes(self, data: Buffer, destination_path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        上传内存中的数据到存储服务，无需先写入临时文件。
+        
+        Args:
+            data: 文件数据
+            destination_path: 目标路径
+            
+        Returns:
+            Tuple[Optional[str], Optional[str]]:
+            (文件URL, 错误信息)
+        """
+        pass
+    
     @abstractmethod
     async def delete_file(self, file_path: str) -> Optional[str]:
         """
@@ -78,6 +99,22 @@ class LocalStorageProvider(StorageProvider):
             logger.error(error_message)
             return None, error_message
     
+    async def upload_bytes(self, data: Buffer, destination_path: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            dest_path = self.base_dir / destination_path
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            with open(dest_path, 'wb') as f:
+                shutil.copyfileobj(as_fileobj(data), f)
+            
+            url = f"{self.base_url}/{destination_path}"
+            return url, None
+            
+        except Exception as e:
+            error_message = f"Error writing file: {str(e)}"
+            logger.error(error_message)
+            return None, error_message
+    
     async def delete_file(self, file_path: str) -> Optional[str]:
         try:
             full_path = self.base_dir / file_path
@@ -93,24 +130,34 @@ class LocalStorageProvider(StorageProvider):
 class S3StorageProvider(StorageProvider):
     """AWS S3 存储提供者"""
     
-    def __init__(self, bucket_name: str, **kwargs):
+    def __init__(self, bucket_name: str, transfer_config: Optional[TransferConfig] = None, **kwargs):
         """
         初始化 S3 存储提供者。
         
         Args:
             bucket_name: S3 存储桶名称
+            transfer_config: 分片上传配置（阈值、分片大小、分片并发数），
+                默认使用 R2_MULTIPART_* 配置
             **kwargs: 其他 S3 客户端配置参数
         """
         self.bucket_name = bucket_name
         self.s3_client = boto3.client('s3', **kwargs)
+        self.transfer_config = transfer_config or build_transfer_config()
+    
+    async def _run_in_executor(self, func, *args, **kwargs):
+        """在线程池中执行同步的 boto3 调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
         
     async def upload_file(self, file_path: str, destination_path: str) -> Tuple[Optional[str], Optional[str]]:
         try:
-            # 上传文件到 S3
-            self.s3_client.upload_file(
+            # 上传文件到 S3，超过阈值时并发上传分片
+            await self._run_in_executor(
+                self.s3_client.upload_file,
                 file_path,
                 self.bucket_name,
-                destination_path
+                destination_path,
+                Config=self.transfer_config
             )
             
             # 生成文件 URL
@@ -127,6 +174,29 @@ class S3StorageProvider(StorageProvider):
             logger.error(error_message)
             return None, error_message
     
+    async def upload_bytes(self, data: Buffer, destination_path: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            await self._run_in_executor(
+                self.s3_client.upload_fileobj,
+                as_fileobj(data),
+                self.bucket_name,
+                destination_path,
+                Config=self.transfer_config
+            )
+            
+            url = f"https://{self.bucket_name}.s3.amazonaws.com/{destination_path}"
+            return url, None
+            
+        except ClientError as e:
+            error_message = f"Error uploading to S3: {str(e)}"
+            logger.error(error_message)
+            return None, error_message
+        
+        except Exception as e:
+            error_message = f"Unexpected error: {str(e)}"
+            logger.error(error_message)
+            return None, error_message
+    
     async def delete_file(self, file_path: str) -> Optional[str]:
         try:
             self.s3_client.delete_object(
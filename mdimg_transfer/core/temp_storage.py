@@ -0,0 +1,214 @@
+"""
+临时文件存储模块。
+每个处理任务在 TEMP_DIR 下拥有独立的子目录，文件按内容哈希命名，
+任务结束时整体删除；同时统计目录占用并执行磁盘配额。
+"""
+
+import os
+import uuid
+import shutil
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from ..monitoring.metrics import DISK_USAGE
+
+logger = logging.getLogger(__name__)
+
+class TempQuotaExceeded(OSError):
+    """写入会超出临时目录配额"""
+
+class TempJob:
+    """单个处理任务的临时目录"""
+
+    def __init__(self, storage: 'TempStorage', job_id: str):
+        self.storage = storage
+        self.id = job_id
+        self.dir = os.path.join(storage.jobs_dir, job_id)
+        self._paths: Set[str] = set()
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        """任务目录中的文件路径"""
+        return os.path.join(self.dir, name)
+
+    def owns(self, path: str) -> bool:
+        return os.path.dirname(path) == self.dir
+
+    def add(self, path: str) -> str:
+        """登记任务目录中新写入的文件，计入磁盘占用"""
+        if path not in self._paths:
+            self.storage._track(path)
+            self._paths.add(path)
+        return path
+
+    def commit(self, src_path: str, name: str) -> str:
+        """
+        将写入完成的文件移动到任务目录中的最终路径
+
+        相同内容的文件已存在时直接复用，丢弃新写入的文件。
+
+        Args:
+            src_path: 已写入的文件
+            name: 最终文件名
+
+        Returns:
+            str: 最终路径
+        """
+        dest = self.path(name)
+        if dest in self._paths:
+            os.remove(src_path)
+            return dest
+        os.replace(src_path, dest)
+        return self.add(dest)
+
+    def adopt(self, path: str) -> str:
+        """
+        将其他任务目录中的文件链接到本任务目录，避免复制
+
+        Args:
+            path: 源文件路径
+
+        Returns:
+            str: 本任务目录中的路径
+        """
+        if self.owns(path):
+            return path
+        dest = self.path(os.path.basename(path))
+        if dest in self._paths:
+            return dest
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(path, dest)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(path, dest)
+        return self.add(dest)
+
+    def cleanup(self) -> None:
+        """删除任务目录及其中的全部文件"""
+        for path in self._paths:
+            self.storage._untrack(path)
+        self._paths.clear()
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.storage._update_gauge()
+
+class TempStorage:
+    """管理 TEMP_DIR 下的任务目录和磁盘配额"""
+
+    JOBS_DIR = 'jobs'
+    SHARED_JOB = 'shared'
+
+    def __init__(self, root: str, quota: int = 0):
+        """
+        初始化临时存储
+
+        Args:
+            root: 临时目录
+            quota: 临时目录允许占用的最大字节数，0 表示不限制
+        """
+        self.root = root
+        self.quota = quota
+        self.jobs_dir = os.path.join(root, self.JOBS_DIR)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        # 按 inode 统计，硬链接到多个任务目录的文件只计算一次
+        self._inodes: Dict[Tuple[int, int], List[int]] = {}
+        self._tracked = 0
+        self._pending = 0
+        self._baseline = self._scan()
+        self._shared: Optional[TempJob] = None
+        self._update_gauge()
+
+    def _scan(self) -> int:
+        """统计启动时目录中已有文件的大小"""
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
+
+    @property
+    def usage(self) -> int:
+        """当前占用的字节数，包含写入中的文件"""
+        return self._baseline + self._tracked + self._pending
+
+    @property
+    def shared(self) -> TempJob:
+        """未指定任务时使用的共享目录，不会自动清理"""
+        if self._shared is None:
+            self._shared = TempJob(self, self.SHARED_JOB)
+        return self._shared
+
+    def _update_gauge(self) -> None:
+        DISK_USAGE.labels(path='temp').set(self.usage)
+
+    def reserve(self, size: int) -> None:
+        """
+        为即将写入的数据预留配额
+
+        Raises:
+            TempQuotaExceeded: 写入后会超出配额
+        """
+        if self.quota and self.usage + size > self.quota:
+            raise TempQuotaExceeded(
+                f"临时目录空间不足: 已用 {self.usage:,} bytes, 配额 {self.quota:,} bytes"
+            )
+        self._pending += size
+        self._update_gauge()
+
+    def release(self, size: int) -> None:
+        """释放预留的配额"""
+        self._pending = max(0, self._pending - size)
+        self._update_gauge()
+
+    def _track(self, path: str) -> None:
+        st = os.stat(path)
+        record = self._inodes.get((st.st_dev, st.st_ino))
+        if record is None:
+            self._inodes[(st.st_dev, st.st_ino)] = [st.st_size, 1]
+            self._tracked += st.st_size
+        else:
+            record[1] += 1
+        self._update_gauge()
+
+    def _untrack(self, path: str) -> None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        key = (st.st_dev, st.st_ino)
+        record = self._inodes.get(key)
+        if record is None:
+            return
+        record[1] -= 1
+        if record[1] <= 0:
+            del self._inodes[key]
+            self._tracked -= record[0]
+
+    def create_job(self, job_id: Optional[str] = None) -> TempJob:
+        """创建任务目录"""
+        return TempJob(self, job_id or uuid.uuid4().hex)
+
+    def close(self) -> None:
+        """删除共享目录，并重新统计启动时已有文件的占用"""
+        if self._shared is not None:
+            self._shared.cleanup()
+            self._shared = None
+        # 启动时已有的文件可能已被删除，已登记的文件不重复计算
+        self._baseline = max(0, self._scan() - self._tracked)
+        self._update_gauge()
+
+    @asynccontextmanager
+    async def job(self, job_id: Optional[str] = None) -> AsyncIterator[TempJob]:
+        """创建任务目录，退出时删除"""
+        job = self.create_job(job_id)
+        try:
+            yield job
+        finally:
+            job.cleanup()
+            logger.debug(f"已清理临时任务目录: {job.dir}")
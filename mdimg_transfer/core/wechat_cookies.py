@@ -0,0 +1,86 @@
+"""
+微信 cookies 缓存模块。
+下载微信 GIF 需要先访问文章页面获取 cookies，同一批 cookies 可以在有效期内
+被所有下载共享，只有遇到 403 或图片验证失败时才重新获取。
+"""
+
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class WeChatCookieCache:
+    """带有效期的共享 cookies，同一时间只有一个后台任务负责刷新"""
+
+    def __init__(self, fetch: Callable[[], Awaitable[Dict[str, str]]], ttl: float,
+                 refresh_ahead: float = 0.8, failure_ttl: float = 30.0):
+        """
+        初始化缓存
+
+        Args:
+            fetch: 获取 cookies 的协程函数，失败时返回空字典
+            ttl: cookies 有效期（秒）
+            refresh_ahead: 超过有效期的该比例后，在后台提前刷新，期间继续返回旧值
+            failure_ttl: 获取失败后空结果的保留时间（秒），避免频繁访问文章页面
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.failure_ttl = failure_ttl
+        self._cookies: Optional[Dict[str, str]] = None
+        self._fetched_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.fetch_count = 0
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh())
+        return self._task
+
+    async def _refresh(self) -> Dict[str, str]:
+        try:
+            cookies = await self._fetch()
+        except Exception as e:
+            logger.warning(f"获取微信cookies失败: {e}")
+            cookies = {}
+        self.fetch_count += 1
+        self._cookies = cookies or {}
+        self._fetched_at = time.monotonic()
+        return self._cookies
+
+    async def get(self) -> Dict[str, str]:
+        """
+        获取 cookies，缓存有效时不发起请求；返回值不应被修改
+
+        Returns:
+            Dict[str, str]: cookies，获取失败时为空字典
+        """
+        if self._cookies is not None:
+            age = time.monotonic() - self._fetched_at
+            ttl = self.ttl if self._cookies else self.failure_ttl
+            if age < ttl:
+                if self._cookies and age >= ttl * self.refresh_ahead:
+                    self._start_refresh()
+                return self._cookies
+        # 并发调用共享同一次获取，调用方取消时不影响其他等待者
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self, cookies: Optional[Dict[str, str]] = None) -> None:
+        """
+        使缓存失效
+
+        Args:
+            cookies: 请求时使用的 cookies；缓存已被其他请求刷新时不再失效
+        """
+        if cookies is not None and cookies is not self._cookies:
+            return
+        logger.info("微信cookies已失效，下次使用时重新获取")
+        self._cookies = None
+
+    def close(self) -> None:
+        """取消进行中的刷新"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -1,8 +1,9 @@
 """
 应用程序配置和创建。
 """
-import logging
 import os
+import asyncio
+import logging
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
 from quart import Quart, send_from_directory, render_template
@@ -12,6 +13,10 @@ from .core.markdown_processor import MarkdownProcessor
 from .core.image_downloader import ImageDownloader
 from .core.r2_uploader import R2Uploader
 from .core.html_converter import HTMLConverter
+from .core.http_session import HTTPSessionManager
+from .core.host_limiter import HostLimiter
+from .core.image_processor import ImageProcessor
+from .core.config import ImageConfig
 
 def setup_logging():
     """配置日志系统"""
@@ -73,15 +78,52 @@ def create_app():
     
     # 创建依赖组件
     logger.debug("正在创建依赖组件...")
-    downloader = ImageDownloader()
+    # 应用范围共享的HTTP会话，各抓取组件复用同一个连接池；
+    # 未单独配置时，连接池大小与下载限流配置一致
+    limiter = HostLimiter(
+        config.MAX_CONCURRENT_DOWNLOADS,
+        config.DOWNLOAD_LIMIT_PER_HOST,
+        config.DOWNLOAD_HOST_LIMITS
+    )
+    pool_size, pool_size_per_host = limiter.connection_limits()
+    session_manager = HTTPSessionManager(
+        limit=max(config.HTTP_POOL_SIZE, pool_size),
+        limit_per_host=config.HTTP_POOL_SIZE_PER_HOST or pool_size_per_host
+    )
+    downloader = ImageDownloader(limiter=limiter, session_manager=session_manager)
     r2_uploader = R2Uploader()
-    html_converter = HTMLConverter()
+    html_converter = HTMLConverter(session_manager=session_manager)
+    # 配置了响应式图片宽度时，每张图片生成多个宽度并以 srcset 引用
+    image_processor = None
+    if config.IMAGE_VARIANT_WIDTHS:
+        image_processor = ImageProcessor(
+            temp_dir=config.TEMP_DIR,
+            config=ImageConfig(quality=config.IMAGE_QUALITY, variant_widths=config.IMAGE_VARIANT_WIDTHS)
+        )
     
     # 创建 MarkdownProcessor 实例
     logger.debug("正在创建 MarkdownProcessor 实例...")
-    processor = MarkdownProcessor(downloader=downloader, r2_uploader=r2_uploader)
+    processor = MarkdownProcessor(downloader=downloader, r2_uploader=r2_uploader,
+                                  image_processor=image_processor)
     app.processor = processor
     app.html_converter = html_converter
+    app.session_manager = session_manager
+    
+    @app.before_serving
+    async def warm_up():
+        """进程后端预先启动 worker"""
+        if image_processor is not None:
+            await image_processor.warm_up()
+    
+    @app.after_serving
+    async def close_resources():
+        """关闭共享的HTTP会话、上传线程池和图片处理 worker，删除共享临时目录"""
+        await session_manager.close()
+        # 等待进行中的上传结束和删除临时文件都会阻塞，放到线程中执行
+        await asyncio.to_thread(downloader.close)
+        await asyncio.to_thread(r2_uploader.close)
+        if image_processor is not None:
+            image_processor.executor.shutdown(wait=False)
     
     # 注册蓝图
     logger.debug("正在注册蓝图...")
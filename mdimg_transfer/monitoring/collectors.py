@@ -70,17 +70,17 @@ class CacheMetrics:
     @staticmethod
     def record_hit():
         """记录缓存命中"""
-        CACHE_OPERATIONS.labels(operation='hit', status='success').inc()
+        CACHE_OPERATIONS.labels(operation='hit', status='success', shard='').inc()
     
     @staticmethod
     def record_miss():
         """记录缓存未命中"""
-        CACHE_OPERATIONS.labels(operation='miss', status='success').inc()
+        CACHE_OPERATIONS.labels(operation='miss', status='success', shard='').inc()
     
     @staticmethod
     def record_error(operation: str):
         """记录缓存错误"""
-        CACHE_OPERATIONS.labels(operation=operation, status='error').inc()
+        CACHE_OPERATIONS.labels(operation=operation, status='error', shard='').inc()
 
 class WorkerCollector:
     """工作进程指标收集器"""
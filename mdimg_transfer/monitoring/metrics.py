@@ -78,10 +78,18 @@ COMPRESSION_RATIO = Histogram(
 PROCESSING_TIME = Histogram(
     'mdimg_processing_duration_seconds',
     'Time spent processing images',
-    ['operation'],  # operation: total/io/processing/optimization
+    ['operation'],  # operation: total/io/processing/optimization/decode/decode_draft/resize
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
 )
 
+# 下载图片验证耗时
+VALIDATION_TIME = Histogram(
+    'mdimg_validation_duration_seconds',
+    'Time spent validating downloaded images',
+    ['tier'],  # tier: header/full
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+)
+
 # 磁盘IO指标
 DISK_IO = Counter(
     'mdimg_disk_io_bytes',
@@ -112,7 +120,14 @@ CACHE_SIZE = Gauge(
 CACHE_OPERATIONS = Counter(
     'mdimg_cache_operations_total',
     'Cache operations count',
-    ['operation', 'status']  # operation: hit/miss/error
+    ['operation', 'status', 'shard']  # operation: hit/miss/error; shard: 分片缓存的分片编号，其他为空
+)
+
+# HTTP 连接指标
+HTTP_CONNECTIONS = Counter(
+    'mdimg_http_connections_total',
+    'Outgoing HTTP connections by type',
+    ['type']  # type: created/reused
 )
 
 # 资源使用指标
@@ -188,6 +203,10 @@ class MetricsCollector:
             REQUEST_LATENCY.labels(method='process', endpoint=operation).observe(duration)
             PROCESSING_TIME.labels(operation=operation).observe(duration)
     
+    def record_processing_time(self, operation: str, duration: float):
+        """记录已测量的处理耗时，用于 worker 进程中测量、返回父进程的结果"""
+        PROCESSING_TIME.labels(operation=operation).observe(duration)
+    
     def update_resource_usage(self, memory_bytes: int, cpu_percent: float):
         """更新资源使用情况"""
         MEMORY_USAGE.set(memory_bytes)
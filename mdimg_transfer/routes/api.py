@@ -8,8 +8,6 @@ import logging
 import aiofiles
 from quart import Blueprint, request, jsonify, current_app, send_file
 from ..core.markdown_processor import MarkdownProcessor
-from ..core.image_downloader import ImageDownloader
-from ..core.r2_uploader import R2Uploader
 from pathlib import Path
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
@@ -19,10 +17,9 @@ logger = logging.getLogger(__name__)
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
-# 创建必要的实例
-downloader = ImageDownloader()
-r2_uploader = R2Uploader()
-markdown_processor = MarkdownProcessor(downloader=downloader, r2_uploader=r2_uploader)
+def _get_processor() -> MarkdownProcessor:
+    """应用创建的处理器，复用应用范围的共享HTTP会话和上传器"""
+    return current_app.processor
 
 @bp.route('/process', methods=['POST'])
 async def process_markdown():
@@ -67,12 +64,13 @@ async def process_markdown():
         
         # 处理 Markdown 文件
         logger.info("开始处理Markdown文本...")
-        new_content, download_results = await markdown_processor.process_content(content)
+        processor = _get_processor()
+        new_content, download_results = await processor.process_content(content)
         
         # 统计成功下载的图片数量
         successful_downloads = sum(1 for result in download_results.values() if isinstance(result, tuple) and result[0])
         
-        logger.info("处理完成！处理了 %s 个链接，成功下载 %s 个图片", len(markdown_processor.image_links), successful_downloads)
+        logger.info("处理完成！处理了 %s 个链接，成功下载 %s 个图片", len(processor.image_links), successful_downloads)
         
         if download_results:
             logger.info("下载失败的图片:")
@@ -81,9 +79,9 @@ async def process_markdown():
                     logger.info("- %s", url)
                     
         # Check for errors in markdown processor
-        if hasattr(markdown_processor, 'errors') and markdown_processor.errors:
+        if hasattr(processor, 'errors') and processor.errors:
             logger.info("处理过程中的错误:")
-            for error in markdown_processor.errors:
+            for error in processor.errors:
                 logger.info("- %s", error)
         
         # 保存处理后的文件
@@ -101,7 +99,7 @@ async def process_markdown():
             "message": "File processed successfully",
             "original_filename": filename,
             "processed_filename": processed_filename,
-            "total_images": len(markdown_processor.image_links),
+            "total_images": len(processor.image_links),
             "successful_downloads": successful_downloads,
             "download_url": f"/api/download/{processed_filename}"
         })
@@ -199,8 +197,9 @@ async def process_url():
         temp_path = os.path.join(config.UPLOAD_FOLDER, filename)
         
         try:
+            processor = _get_processor()
             # 下载并处理URL内容
-            content = await downloader.download_url_content(url)
+            content = await processor.downloader.download_url_content(url)
             if not content:
                 return jsonify({
                     "error": "Failed to fetch URL content"
@@ -211,7 +210,7 @@ async def process_url():
                 await f.write(content)
 
             # 处理文件中的图片
-            processed_path = await markdown_processor.process_file(temp_path)
+            processed_path = await processor.process_file(temp_path)
             if not processed_path:
                 return jsonify({
                     "error": "Failed to process content"
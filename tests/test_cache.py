@@ -1,9 +1,12 @@
 """缓存测试模块"""
 
+import time
+import zlib
 import pytest
 import asyncio
-from mdimg_transfer.core.cache import Cache
-from mdimg_transfer.monitoring.metrics import CACHE_OPERATIONS, CACHE_SIZE
+from mdimg_transfer.core.cache import Cache, ShardedCache, cached
+from mdimg_transfer.core.metrics import metrics
+from mdimg_transfer.monitoring.metrics import CACHE_OPERATIONS
 
 @pytest.mark.asyncio
 async def test_cache_basic_operations():
@@ -84,13 +87,200 @@ async def test_cache_clear():
         value = await cache.get(f"key{i}")
         assert value is None
 
+@pytest.mark.asyncio
+async def test_cache_weigher_evicts_by_bytes():
+    """测试按字节权重淘汰最久未使用的条目"""
+    cache = Cache(max_size=100, weigher=len, max_weight=10)
+
+    await cache.set("a", b"1234")
+    await cache.set("b", b"1234")
+    await cache.get("a")  # a 变为最近使用
+    await cache.set("c", b"1234")  # 总权重 12 > 10，淘汰 b
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"1234"
+    assert await cache.get("c") == b"1234"
+    assert cache.weight == 8
+
+    # 覆盖已有键只替换自身权重，不淘汰其他条目
+    await cache.set("a", b"123456")
+    assert len(cache) == 2
+    assert cache.weight == 10
+
+    # 超过总容量的单个条目不缓存
+    await cache.set("big", b"x" * 11)
+    assert await cache.get("big") is None
+    assert len(cache) == 2
+
+@pytest.mark.asyncio
+async def test_cached_single_flight():
+    """测试同一个键的并发未命中只执行一次，异常不被缓存"""
+    cache = Cache(max_size=10)
+    calls = []
+
+    @cached(cache)
+    async def fetch(url):
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        if url == "bad":
+            raise ValueError(url)
+        return url.upper()
+
+    results = await asyncio.gather(*(fetch("a") for _ in range(10)))
+    assert results == ["A"] * 10
+    assert calls == ["a"]
+
+    results = await asyncio.gather(*(fetch("bad") for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert calls == ["a", "bad"]
+    with pytest.raises(ValueError):
+        await fetch("bad")
+    assert calls == ["a", "bad", "bad"]
+
+@pytest.mark.asyncio
+async def test_cached_negative_ttl():
+    """测试 None 结果按单独的有效期缓存"""
+    cache = Cache(max_size=10)
+    calls = []
+
+    @cached(cache, negative_ttl=0.1)
+    async def lookup(name):
+        calls.append(name)
+        return None
+
+    assert await lookup("x") is None
+    assert await lookup("x") is None
+    assert calls == ["x"]
+
+    await asyncio.sleep(0.15)
+    assert await lookup("x") is None
+    assert calls == ["x", "x"]
+
+@pytest.mark.asyncio
+async def test_cached_stale_while_revalidate():
+    """测试过期后返回旧值，并只在后台刷新一次"""
+    cache = Cache(max_size=10)
+    version = 0
+
+    @cached(cache, ttl=0.1, stale_ttl=10)
+    async def fetch():
+        nonlocal version
+        version += 1
+        await asyncio.sleep(0.05)
+        return version
+
+    assert await fetch() == 1
+    await asyncio.sleep(0.15)
+
+    # 过期后立即返回旧值，并发调用只触发一次刷新
+    results = await asyncio.gather(*(fetch() for _ in range(5)))
+    assert results == [1] * 5
+    await asyncio.sleep(0.1)
+    assert version == 2
+    assert await fetch() == 2
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_cache_eviction_benchmark():
+    """测试10万条目规模下写入和淘汰的耗时"""
+    entries = 100_000
+    cache = Cache(max_size=entries)
+
+    start = time.perf_counter()
+    for i in range(entries):
+        await cache.set(f"key{i}", i)
+    fill = time.perf_counter() - start
+
+    # 缓存已满，每次写入都会淘汰一个条目
+    start = time.perf_counter()
+    for i in range(entries, entries * 2):
+        await cache.set(f"key{i}", i)
+        await cache.get(f"key{i - entries // 2}")
+    churn = time.perf_counter() - start
+
+    print(f"\n填充 {entries} 条目: {fill:.3f}s, 淘汰 {entries} 次: {churn:.3f}s")
+    assert len(cache) == entries
+    assert await cache.get("key0") is None
+    # O(n) 淘汰在该规模下需要数分钟，O(1) 淘汰应在数秒内完成
+    assert churn < fill * 5 + 5
+
+@pytest.mark.asyncio
+async def test_sharded_cache_basic_operations():
+    """测试分片缓存的读写、容量和分片指标，每次操作只记录一次"""
+    def shard_gets(status):
+        return sum(
+            CACHE_OPERATIONS.labels(operation='get', status=status, shard=str(i))._value.get()
+            for i in range(4)
+        )
+
+    core_gets = metrics.cache_operations.labels(operation='get', status='success')._value.get()
+    hits_before, misses_before = shard_gets('success'), shard_gets('miss')
+    cache = ShardedCache(shards=4, max_size=400)
+    for i in range(100):
+        await cache.set(f"key{i}", i)
+    for i in range(100):
+        assert await cache.get(f"key{i}") == i
+    assert await cache.get("nonexistent") is None
+    assert len(cache) == 100
+
+    assert shard_gets('success') - hits_before == 100
+    assert shard_gets('miss') - misses_before == 1
+    assert metrics.cache_operations.labels(operation='get', status='success')._value.get() == core_gets
+
+    await cache.clear()
+    assert len(cache) == 0
+
+def test_sharded_cache_index_is_stable():
+    """测试分片编号不依赖进程的哈希随机化"""
+    cache = ShardedCache(shards=16)
+    assert cache.shard_index("key") == zlib.crc32(b"key") % 16
+    assert len({cache.shard_index(f"key{i}") for i in range(1000)}) == 16
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("sharded", [False, True], ids=["single", "sharded"])
+def test_cache_contention_benchmark(sharded, benchmark):
+    """测量大量协程并发读写单锁缓存与分片缓存的耗时，结果见基准测试报告"""
+    workers, iterations, keys = 500, 200, 1000
+    cache = ShardedCache(shards=16, max_size=keys * 2) if sharded else Cache(max_size=keys)
+    loop = asyncio.new_event_loop()
+
+    async def fill():
+        for i in range(keys):
+            await cache.set(f"key{i}", i)
+
+    async def worker(worker_id):
+        hits = 0
+        for i in range(iterations):
+            key = f"key{(worker_id * 7 + i) % keys}"
+            if i % 10 == 0:
+                await cache.set(key, -1)
+            elif await cache.get(key) is not None:
+                hits += 1
+        return hits
+
+    async def contend():
+        return await asyncio.gather(*(worker(i) for i in range(workers)))
+
+    try:
+        loop.run_until_complete(fill())
+        hits = benchmark.pedantic(lambda: loop.run_until_complete(contend()), rounds=1, iterations=1)
+    finally:
+        loop.close()
+
+    # 所有键都能放下，每次读取都应命中
+    assert sum(hits) == workers * (iterations - iterations // 10)
+    assert len(cache) == keys
+
 @pytest.mark.asyncio
 async def test_cache_metrics():
     """测试缓存指标"""
-    # 重置指标
-    CACHE_OPERATIONS._metrics.clear()
-    CACHE_SIZE._value.set(0)
-    
+    def count(operation, status):
+        return metrics.cache_operations.labels(operation=operation, status=status)._value.get()
+
+    hits_before = count('get', 'success')
+    misses_before = count('get', 'miss')
+    sets_before = count('set', 'success')
+
     cache = Cache(max_size=10)
     
     # 测试命中和未命中
@@ -102,16 +292,13 @@ async def test_cache_metrics():
     assert value is None
     
     # 验证指标
-    hits = CACHE_OPERATIONS.labels(operation='hit', status='success')._value.get()
-    misses = CACHE_OPERATIONS.labels(operation='miss', status='success')._value.get()
-    assert hits == 1
-    assert misses == 1
+    assert count('get', 'success') - hits_before == 1
+    assert count('get', 'miss') - misses_before == 1
+    assert count('set', 'success') - sets_before == 1
     
     # 测试缓存大小指标
     await cache.set("key2", b"value2")
-    size = CACHE_SIZE._value.get()
-    assert size == 2
+    assert metrics.cache_size._value.get() == 2
     
     await cache.clear()
-    size = CACHE_SIZE._value.get()
-    assert size == 0
+    assert metrics.cache_size._value.get() == 0
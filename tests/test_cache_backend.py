@@ -0,0 +1,158 @@
+"""缓存二级存储测试模块"""
+
+import time
+import asyncio
+import multiprocessing
+import pytest
+
+from mdimg_transfer.core.cache import Cache, cached
+from mdimg_transfer.core.cache_backend import SQLiteBackend, decode_value, encode_value
+
+
+def _write_entries(path, count):
+    """在另一个进程中写入缓存"""
+    async def main():
+        cache = Cache(backend=SQLiteBackend(path))
+        for i in range(count):
+            await cache.set(f"key{i}", {"value": i})
+        cache.close()
+    asyncio.run(main())
+
+
+@pytest.mark.asyncio
+async def test_warm_restart(tmp_path):
+    """测试重启后从磁盘恢复缓存，内存层未命中时回填"""
+    path = str(tmp_path / "cache.db")
+    cache = Cache(max_size=10, backend=SQLiteBackend(path))
+    await cache.set("key1", b"value1")
+    await cache.set("short", b"value2", ttl=0.1)
+    cache.close()
+
+    restarted = Cache(max_size=10, backend=SQLiteBackend(path))
+    assert len(restarted) == 0
+    assert await restarted.get("key1") == b"value1"
+    assert len(restarted) == 1
+
+    await asyncio.sleep(0.15)
+    assert await restarted.get("short") is None
+    value, stale = await restarted.lookup("short", stale_ttl=10)
+    assert value == b"value2" and stale
+
+    await restarted.clear()
+    assert await restarted.get("key1") is None
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_across_processes(tmp_path):
+    """测试多个工作进程共享同一个磁盘缓存"""
+    path = str(tmp_path / "cache.db")
+    cache = Cache(backend=SQLiteBackend(path))
+    await cache.set("parent", "from parent")
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_write_entries, args=(path, 50)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    for i in range(50):
+        assert await cache.get(f"key{i}") == {"value": i}
+    assert await cache.get("parent") == "from parent"
+    cache.close()
+
+
+def test_sqlite_backend_evicts_by_bytes(tmp_path):
+    """测试按序列化后的字节数淘汰最久未使用的条目"""
+    backend = SQLiteBackend(str(tmp_path / "cache.db"), max_size=10_000)
+    # 每次读取都刷新访问时间，按严格的 LRU 顺序淘汰
+    backend.TOUCH_INTERVAL = 0
+    expires_at = time.time() + 60
+    for i in range(20):
+        backend.set(f"key{i}", b"x" * 1000, expires_at)
+        if i >= 1:
+            # key0 保持最近使用
+            assert backend.get("key0") is not None
+
+    assert backend.total_size <= 10_000
+    assert backend.get("key0") is not None
+    assert backend.get("key1") is None
+    assert backend.get("key19") is not None
+
+    # 覆盖写入不会重复计算大小
+    before = backend.total_size
+    backend.set("key19", b"x" * 1000, expires_at)
+    assert backend.total_size == before
+    backend.close()
+
+
+def test_sqlite_backend_touch_interval(tmp_path):
+    """测试刷新间隔内的重复读取不写入数据库"""
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    backend.TOUCH_INTERVAL = 0.2
+    backend.set("key", b"value", time.time() + 60)
+
+    changes = backend._conn.total_changes
+    for _ in range(100):
+        assert backend.get("key")[0] == b"value"
+    assert backend._conn.total_changes == changes
+
+    time.sleep(0.25)
+    assert backend.get("key") is not None
+    assert backend._conn.total_changes == changes + 1
+    backend.close()
+
+
+def test_values_stored_as_json(tmp_path):
+    """测试缓存值以 JSON 保存，bytes 可以往返，其他类型拒绝写入"""
+    value = {"body": b"\x00\xff", "items": [1, "a", None], "nested": {"ok": True}}
+    assert decode_value(encode_value(value)) == value
+    with pytest.raises(TypeError):
+        encode_value(object())
+
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    backend.set("key", value, time.time() + 60)
+    raw = backend._conn.execute("SELECT value FROM entries WHERE key = 'key'").fetchone()[0]
+    assert raw.startswith(b"{")
+    assert backend.get("key")[0] == value
+
+    # 无法解码的条目按未命中处理并被删除
+    backend._conn.execute("UPDATE entries SET value = ? WHERE key = 'key'", (b"\x80\x04junk",))
+    assert backend.get("key") is None
+    assert backend.total_size == 0
+    backend.close()
+
+
+@pytest.mark.asyncio
+async def test_unsupported_value_stays_in_memory(tmp_path):
+    """测试无法编码的值只保存在内存层"""
+    path = str(tmp_path / "cache.db")
+    cache = Cache(backend=SQLiteBackend(path))
+    await cache.set("obj", {1, 2})
+    assert await cache.get("obj") == {1, 2}
+    cache.close()
+
+    restarted = Cache(backend=SQLiteBackend(path))
+    assert await restarted.get("obj") is None
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_negative_result_on_disk(tmp_path):
+    """测试 None 结果在磁盘缓存中同样生效"""
+    path = str(tmp_path / "cache.db")
+    calls = []
+
+    async def lookup(name):
+        calls.append(name)
+        return None
+
+    first = cached(Cache(backend=SQLiteBackend(path)), negative_ttl=60)(lookup)
+    assert await first("x") is None
+
+    # 新进程的内存层为空，从磁盘读到负缓存
+    second = cached(Cache(backend=SQLiteBackend(path)), negative_ttl=60)(lookup)
+    assert await second("x") is None
+    assert calls == ["x"]
@@ -0,0 +1,65 @@
+"""下载失败记录测试模块"""
+
+import time
+
+from mdimg_transfer.core.failure_cache import BoundedDict, FailureCache
+
+
+def test_backoff_doubles_and_is_capped(monkeypatch):
+    """测试连续失败时退避时间翻倍且不超过上限"""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = FailureCache(max_size=10, base_ttl=10, max_ttl=30)
+    url = "https://a.com/1.png"
+
+    waits = []
+    for _ in range(4):
+        cache.record_failure(url, "timeout")
+        waits.append(cache.retry_after(url))
+        assert url in cache
+        # 退避期结束后允许重试
+        now[0] += waits[-1]
+        assert url not in cache
+
+    assert waits == [10, 20, 30, 30]
+    assert cache.get(url).last_error == "timeout"
+
+
+def test_record_expires_and_success_clears(monkeypatch):
+    """测试记录过期后重新计算退避，成功后清除记录"""
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0] + 1)
+    cache = FailureCache(max_size=10, base_ttl=10, max_ttl=100)
+
+    cache.record_failure("a")
+    cache.record_failure("a")
+    now[0] += 40  # 超过 20 秒退避期的两倍
+    assert cache.get("a") is None
+    assert cache.record_failure("a").failures == 1
+
+    cache.record_success("a")
+    assert "a" not in cache and len(cache) == 0
+
+
+def test_size_is_bounded():
+    """测试记录数量不超过上限，淘汰最久未失败的URL"""
+    cache = FailureCache(max_size=3, base_ttl=60, max_ttl=60)
+    for i in range(5):
+        cache.record_failure(f"u{i}")
+    cache.record_failure("u2")
+    cache.record_failure("u5")
+
+    assert len(cache) == 3
+    assert "u2" in cache and "u4" in cache and "u5" in cache
+    assert "u3" not in cache
+
+
+def test_bounded_dict_evicts_least_recently_used():
+    """测试有界字典按最近使用淘汰"""
+    state = BoundedDict(2)
+    state["a"] = 1
+    state["b"] = 2
+    assert state["a"] == 1
+    state["c"] = 3
+
+    assert list(state) == ["a", "c"]
@@ -0,0 +1,99 @@
+"""按主机限流测试模块"""
+
+import time
+import asyncio
+import pytest
+
+from mdimg_transfer.core.host_limiter import HostLimiter, host_of, interleave_by_host
+
+
+async def _request(limiter, url, delay, peaks, finished):
+    async with limiter.acquire(url):
+        host = host_of(url)
+        peaks[host] = max(peaks.get(host, 0), limiter.active(host))
+        peaks["*"] = max(peaks.get("*", 0), limiter.active())
+        await asyncio.sleep(delay)
+    finished[url] = time.monotonic()
+
+
+@pytest.mark.asyncio
+async def test_slow_host_does_not_starve_other_hosts():
+    """测试慢速主机占满自身名额后，其他主机仍能并发下载"""
+    limiter = HostLimiter(global_limit=4, per_host_limit=2)
+    peaks, finished = {}, {}
+    slow = [f"https://slow.example.com/{i}.png" for i in range(6)]
+    fast = [f"https://FAST.example.com/{i}.png" for i in range(4)]
+
+    start = time.monotonic()
+    await asyncio.gather(
+        *(_request(limiter, url, 0.2, peaks, finished) for url in slow),
+        *(_request(limiter, url, 0.01, peaks, finished) for url in fast),
+    )
+
+    assert peaks["slow.example.com"] == 2
+    assert peaks["fast.example.com"] == 2
+    assert peaks["*"] <= 4
+    # 快速主机的请求不必等待慢速主机排队完成
+    assert max(finished[url] for url in fast) - start < 0.15
+    assert limiter.active() == 0
+
+
+@pytest.mark.asyncio
+async def test_host_override_and_global_cap():
+    """测试指定主机的并发数覆盖，且不超过全局上限"""
+    limiter = HostLimiter(global_limit=3, per_host_limit=2,
+                          host_limits={"mmbiz.qpic.cn": 1, "big.example.com": 8})
+    peaks, finished = {}, {}
+    urls = [f"https://mmbiz.qpic.cn/mmbiz_png/{i}/640" for i in range(3)]
+    urls += [f"https://big.example.com/{i}.png" for i in range(5)]
+
+    await asyncio.gather(*(_request(limiter, url, 0.02, peaks, finished) for url in urls))
+
+    assert peaks["mmbiz.qpic.cn"] == 1
+    assert peaks["big.example.com"] <= 3
+    assert limiter.limit_for("big.example.com") == 3
+    assert peaks["*"] <= 3
+
+
+@pytest.mark.asyncio
+async def test_idle_hosts_are_dropped():
+    """测试主机没有请求持有或等待名额时从主机表中删除"""
+    limiter = HostLimiter(global_limit=4, per_host_limit=1)
+    for i in range(100):
+        async with limiter.acquire(f"https://host{i}.example.com/a.png"):
+            pass
+    assert limiter._hosts == {} and limiter._active == {}
+
+    # 有请求等待时保留信号量，并发上限仍然生效
+    url = "https://busy.example.com/a.png"
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.acquire(url):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert limiter.active("busy.example.com") == 1
+    waiter.cancel()
+    release.set()
+    await asyncio.gather(holder, waiter, return_exceptions=True)
+    assert limiter._hosts == {} and limiter._users == {} and limiter.active() == 0
+
+
+def test_interleave_by_host():
+    """测试按主机轮流排列URL"""
+    urls = ["https://a.com/1", "https://a.com/2", "https://a.com/3",
+            "https://b.com/1", "https://c.com/1", "https://b.com/2"]
+    assert interleave_by_host(urls) == [
+        "https://a.com/1", "https://b.com/1", "https://c.com/1",
+        "https://a.com/2", "https://b.com/2", "https://a.com/3",
+    ]
+
+
+def test_connection_limits_follow_host_limits():
+    """测试连接池大小按全局和单主机并发上限计算，单主机连接数不超过全局上限"""
+    assert HostLimiter(10, 3, {"slow.com": 5}).connection_limits() == (20, 10)
+    assert HostLimiter(4, 3, {"slow.com": 8}).connection_limits() == (8, 8)
@@ -0,0 +1,505 @@
+"""图片下载器测试模块"""
+
+import io
+import os
+import asyncio
+import hashlib
+import threading
+import pytest
+from aiohttp import web
+from prometheus_client import REGISTRY
+from PIL import Image
+
+from mdimg_transfer.core.http_cache import HTTPCache
+from mdimg_transfer.core.http_session import HTTPSessionManager
+from mdimg_transfer.core.failure_cache import FailureCache
+from mdimg_transfer.core.temp_storage import TempStorage
+from mdimg_transfer.core.image_downloader import ImageDownloader, sniff_image_format
+
+
+def create_png() -> bytes:
+    """创建测试图片"""
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16), color="blue").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def create_gif() -> bytes:
+    """创建测试GIF"""
+    buf = io.BytesIO()
+    Image.new("P", (8, 8)).save(buf, format="GIF")
+    return buf.getvalue()
+
+
+@pytest.fixture
+async def image_server():
+    """启动本地图片服务，记录每个路径的请求次数"""
+    hits = {}
+    body = create_png()
+
+    async def handler(request):
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.path in server.failing:
+            return web.Response(status=503)
+        await asyncio.sleep(0.05)
+        return web.Response(body=body, content_type="image/png")
+
+    async def cacheable(request):
+        etag = server.etags[request.path]
+        if request.headers.get("If-None-Match") == etag:
+            server.statuses.append(304)
+            return web.Response(status=304, headers={"ETag": etag})
+        server.statuses.append(200)
+        headers = {"ETag": etag, "Cache-Control": server.cache_control}
+        return web.Response(body=server.bodies[request.path], content_type="image/png",
+                            headers=headers)
+
+    app = web.Application()
+    async def streamed(request):
+        # 分块传输且不带 Content-Length
+        response = web.StreamResponse(headers={"Content-Type": "image/png"})
+        await response.prepare(request)
+        body = server.bodies[request.path]
+        for i in range(0, len(body), 1024):
+            await response.write(body[i:i + 1024])
+        await response.write_eof()
+        return response
+
+    async def wechat(request):
+        # 模拟微信图片服务：cookies 不匹配时返回 403
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.cookies.get("sid") != server.wechat_sid:
+            return web.Response(status=403)
+        return web.Response(body=create_gif(), content_type="image/gif")
+
+    app.router.add_get("/mmbiz.qpic.cn/{name}", wechat)
+    async def nested(request):
+        await asyncio.sleep(0.05)
+        return web.Response(body=server.bodies[request.path], content_type="image/png")
+
+    app.router.add_get("/files/{dir}/{name}", nested)
+    app.router.add_get("/cached/{name}", cacheable)
+    app.router.add_get("/stream/{name}", streamed)
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    server = type("ImageServer", (), {
+        "base": f"http://127.0.0.1:{port}",
+        "hits": hits,
+        "etags": {},
+        "bodies": {},
+        "statuses": [],
+        "cache_control": "no-cache",
+        "wechat_sid": "v1",
+        "failing": set(),
+    })
+    yield server
+    await runner.cleanup()
+
+
+@pytest.fixture
+def make_downloader(tmp_path):
+    """创建使用临时目录和独立HTTP缓存的下载器"""
+    def factory(cache_size: int = 10 * 1024 * 1024, session_manager=None, temp_quota: int = 0):
+        return ImageDownloader(
+            http_cache=HTTPCache(str(tmp_path / "http_cache"), cache_size),
+            session_manager=session_manager,
+            temp_storage=TempStorage(str(tmp_path / "temp"), temp_quota)
+        )
+    return factory
+
+
+@pytest.fixture
+def downloader(make_downloader):
+    return make_downloader()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_urls_download_once(downloader, image_server):
+    """测试重复URL只下载一次"""
+    url = f"{image_server.base}/logo.png"
+    results = await downloader.download_images([url, url, url])
+
+    assert results[url]
+    assert image_server.hits == {"/logo.png": 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_download(downloader, image_server):
+    """测试并发调用共享同一次下载"""
+    url = f"{image_server.base}/banner.png"
+    async with downloader:
+        paths = await asyncio.gather(
+            downloader.download_image(url),
+            downloader.download_image(url.replace("http://", "HTTP://") + "#top"),
+            downloader.download_image(url),
+        )
+
+    assert len(set(paths)) == 1 and paths[0]
+    assert image_server.hits == {"/banner.png": 1}
+    assert not downloader._inflight
+    # 各种写法的URL都能查到共享下载的内容哈希
+    content_hash = downloader.get_content_hash(url)
+    assert content_hash is not None
+    assert downloader.get_content_hash(url.replace("http://", "HTTP://") + "#top") == content_hash
+
+
+@pytest.mark.asyncio
+async def test_streamed_download_records_hash_and_format(downloader, image_server):
+    """测试流式下载时计算哈希并识别格式"""
+    body = create_png()
+    image_server.bodies["/stream/s.png"] = body
+    url = f"{image_server.base}/stream/s.png"
+
+    path = (await downloader.download_images([url]))[url]
+
+    with open(path, "rb") as f:
+        assert f.read() == body
+    assert downloader.get_content_hash(url) == hashlib.sha256(body).hexdigest()
+    assert downloader.processing_state[url]["format"] == "PNG"
+    assert not os.path.exists(f"{path}.part")
+
+
+@pytest.mark.asyncio
+async def test_streamed_download_enforces_size_limit(downloader, image_server):
+    """测试未声明长度的响应在超过大小限制时中止"""
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (256, 256), os.urandom(256 * 256 * 3)).save(buf, format="PNG")
+    image_server.bodies["/stream/big.png"] = buf.getvalue()
+    downloader.max_file_size = 64 * 1024
+    downloader.max_retries = 1
+    url = f"{image_server.base}/stream/big.png"
+
+    results = await downloader.download_images([url])
+
+    assert results[url] is None
+    assert "文件太大" in downloader.processing_state[url]["errors"][0]
+    assert not any(name.endswith(".part") for name in os.listdir(downloader.temp_dir))
+
+
+def test_sniff_image_format():
+    """测试根据文件头识别格式"""
+    assert sniff_image_format(create_png()[:32]) == "PNG"
+    assert sniff_image_format(b"GIF89a" + b"\x00" * 10) == "GIF"
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "WEBP"
+    assert sniff_image_format(b'\n<svg xmlns="http://www.w3.org/2000/svg">') == "SVG"
+    assert sniff_image_format(b"<html><body>") is None
+
+
+def test_normalize_wechat_url(downloader):
+    """测试微信URL按改写后的形式规范化"""
+    bare = "https://mmbiz.qpic.cn/mmbiz_png/abc/640"
+    rewritten = f"{bare}?wx_fmt=png&wxfrom=5&wx_lazy=1&wx_co=1"
+    assert downloader._normalize_url(bare) == downloader._normalize_url(rewritten)
+
+
+@pytest.mark.asyncio
+async def test_http_cache_revalidates_unchanged_image(make_downloader, image_server):
+    """测试未变化的图片通过304使用本地缓存"""
+    url = f"{image_server.base}/cached/a.png"
+    image_server.etags["/cached/a.png"] = '"v1"'
+    image_server.bodies["/cached/a.png"] = create_png()
+
+    first = await make_downloader().download_images([url])
+    # 新的下载器实例从磁盘加载缓存索引
+    second = await make_downloader().download_images([url])
+
+    assert image_server.statuses == [200, 304]
+    with open(first[url], "rb") as f1, open(second[url], "rb") as f2:
+        assert f1.read() == f2.read() == image_server.bodies["/cached/a.png"]
+
+
+@pytest.mark.asyncio
+async def test_http_cache_fetches_changed_image(make_downloader, image_server):
+    """测试图片变化后重新下载"""
+    path = "/cached/b.png"
+    url = f"{image_server.base}{path}"
+    image_server.etags[path] = '"v1"'
+    image_server.bodies[path] = create_png()
+    await make_downloader().download_images([url])
+
+    new_body = io.BytesIO()
+    Image.new("RGB", (8, 8), color="green").save(new_body, format="PNG")
+    image_server.etags[path] = '"v2"'
+    image_server.bodies[path] = new_body.getvalue()
+    result = await make_downloader().download_images([url])
+
+    assert image_server.statuses == [200, 200]
+    with open(result[url], "rb") as f:
+        assert f.read() == new_body.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_http_cache_serves_fresh_entry_without_request(make_downloader, image_server):
+    """测试 max-age 内的缓存不发起请求"""
+    url = f"{image_server.base}/cached/c.png"
+    image_server.etags["/cached/c.png"] = '"v1"'
+    image_server.bodies["/cached/c.png"] = create_png()
+    image_server.cache_control = "max-age=3600"
+
+    await make_downloader().download_images([url])
+    result = await make_downloader().download_images([url])
+
+    assert image_server.statuses == [200]
+    assert result[url]
+
+
+@pytest.mark.asyncio
+async def test_http_cache_hit_names_file_by_sniffed_format(make_downloader, image_server):
+    """测试缓存命中与新下载一样按识别出的格式命名文件"""
+    url = f"{image_server.base}/cached/photo.jpg"
+    image_server.etags["/cached/photo.jpg"] = '"v1"'
+    image_server.bodies["/cached/photo.jpg"] = create_png()
+    image_server.cache_control = "max-age=3600"
+
+    first = await make_downloader().download_images([url])
+    second = await make_downloader().download_images([url])
+
+    assert image_server.statuses == [200]
+    assert first[url].endswith(".png")
+    assert os.path.basename(second[url]) == os.path.basename(first[url])
+
+
+@pytest.mark.asyncio
+async def test_close_removes_shared_downloads(downloader, image_server):
+    """测试关闭下载器时删除共享目录中的文件并更新占用统计"""
+    result = await downloader.download_images([f"{image_server.base}/shared.png"])
+    path = result[f"{image_server.base}/shared.png"]
+    assert os.path.exists(path)
+    assert downloader.temp_storage.usage > 0
+
+    downloader.close()
+
+    assert not os.path.exists(path)
+    assert downloader.temp_storage.usage == 0
+
+
+def test_http_cache_evicts_by_bytes(tmp_path):
+    """测试按字节数淘汰最久未使用的条目"""
+    cache = HTTPCache(str(tmp_path / "cache"), max_size=250)
+    # 每次读取都刷新访问时间，按严格的 LRU 顺序淘汰
+    cache._store.TOUCH_INTERVAL = 0
+    for name in ("a", "b", "c"):
+        src = tmp_path / name
+        src.write_bytes(b"x" * 100)
+        cache.get("https://x/a")  # 保持 a 为最近使用
+        cache.store(f"https://x/{name}", str(src), {"ETag": f'"{name}"'})
+
+    assert cache.get("https://x/b") is None
+    assert cache.get("https://x/a") is not None
+    assert cache.get("https://x/c") is not None
+    assert cache.total_size == 200
+    assert len(HTTPCache(str(tmp_path / "cache"), max_size=250)) == 2
+
+
+def test_http_cache_index_shared_between_instances(tmp_path):
+    """测试同一缓存目录的多个实例（例如多个工作进程）立即看到彼此的写入"""
+    first = HTTPCache(str(tmp_path / "cache"), max_size=1000)
+    second = HTTPCache(str(tmp_path / "cache"), max_size=1000)
+    src = tmp_path / "body"
+    src.write_bytes(b"x" * 100)
+
+    first.store("https://x/a", str(src), {"ETag": '"a"'}, format="PNG")
+    entry = second.get("https://x/a")
+    assert entry is not None and entry.format == "PNG"
+
+    second.revalidated("https://x/a", {"ETag": '"b"'})
+    assert first.get("https://x/a").etag == '"b"'
+    assert first.total_size == second.total_size == 100
+
+
+@pytest.mark.asyncio
+async def test_session_uses_tuned_connector(downloader):
+    """测试会话连接池与按主机限流配置一致"""
+    async with downloader:
+        connector = downloader.session.connector
+        assert connector.limit == downloader.limiter.global_limit * 2
+        assert connector.limit_per_host >= downloader.limiter.per_host_limit
+        assert connector.use_dns_cache
+
+
+@pytest.mark.asyncio
+async def test_shared_session_reuses_connections(make_downloader, image_server):
+    """测试多个文档共用应用范围的会话并复用连接"""
+    manager = HTTPSessionManager()
+    downloader = make_downloader(session_manager=manager)
+    try:
+        for doc in range(3):
+            results = await downloader.download_images([f"{image_server.base}/doc{doc}.png"])
+            assert all(results.values())
+            # 下载器退出上下文后不会关闭共享会话
+            assert not manager.closed
+
+        assert manager.stats() == {"created": 1, "reused": 2}
+    finally:
+        await manager.close()
+    assert manager.closed
+
+
+@pytest.mark.asyncio
+async def test_wechat_gifs_share_cached_cookies(downloader, image_server):
+    """测试同一文章的微信GIF共用一次获取的cookies，403后才重新获取"""
+    fetched = []
+
+    async def fetch_cookies():
+        fetched.append(image_server.wechat_sid)
+        return {"sid": image_server.wechat_sid}
+
+    downloader.wechat_cookies._fetch = fetch_cookies
+    urls = [f"{image_server.base}/mmbiz.qpic.cn/{i}.gif" for i in range(40)]
+
+    results = await downloader.download_images(urls)
+    assert all(results.values())
+    assert fetched == ["v1"]
+
+    # 服务端轮换 cookies 后，首次请求返回 403 并触发一次重新获取
+    image_server.wechat_sid = "v2"
+    async with downloader:
+        path = await downloader.download_image(f"{image_server.base}/mmbiz.qpic.cn/new.gif")
+    assert path
+    assert fetched == ["v1", "v2"]
+    assert image_server.hits["/mmbiz.qpic.cn/new.gif"] == 2
+
+
+@pytest.mark.asyncio
+async def test_header_validation_rejects_corrupt_image(downloader, image_server):
+    """测试文件头检查拒绝魔数正确但结构损坏的图片"""
+    image_server.bodies["/stream/broken.png"] = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+    image_server.bodies["/stream/ok.png"] = create_png()
+    downloader.max_retries = 1
+
+    async with downloader:
+        broken = await downloader.download_image(f"{image_server.base}/stream/broken.png")
+        ok = await downloader.download_image(f"{image_server.base}/stream/ok.png")
+
+    assert broken is None and ok
+
+
+@pytest.mark.asyncio
+async def test_full_validation_runs_off_event_loop(downloader, image_server, monkeypatch):
+    """测试完整验证只在配置后执行，且在工作线程中运行并记录耗时"""
+    def observed(tier):
+        return REGISTRY.get_sample_value(
+            "mdimg_validation_duration_seconds_count", {"tier": tier}
+        ) or 0
+
+    threads = []
+    full_validate = downloader._validate_image_file
+
+    def tracking_validate(path, image_format):
+        threads.append(threading.get_ident())
+        full_validate(path, image_format)
+
+    monkeypatch.setattr(downloader, "_validate_image_file", tracking_validate)
+    image_server.bodies["/stream/a.gif"] = create_gif()
+    image_server.bodies["/stream/b.gif"] = create_gif()
+    header_before, full_before = observed("header"), observed("full")
+
+    async with downloader:
+        assert await downloader.download_image(f"{image_server.base}/stream/a.gif")
+        assert threads == []
+        downloader.validation = "full"
+        assert await downloader.download_image(f"{image_server.base}/stream/b.gif")
+
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+    assert observed("header") == header_before + 2
+    assert observed("full") == full_before + 1
+
+
+@pytest.mark.asyncio
+async def test_failed_url_retried_after_backoff(downloader, image_server):
+    """测试失败的URL在退避期内跳过，到期后重新下载"""
+    downloader.failed_urls = FailureCache(max_size=10, base_ttl=0.2, max_ttl=1)
+    downloader.max_retries = 1
+    url = f"{image_server.base}/flaky.png"
+    image_server.failing.add("/flaky.png")
+
+    async with downloader:
+        assert await downloader.download_image(url) is None
+        assert await downloader.download_image(url) is None
+        assert image_server.hits["/flaky.png"] == 1
+
+        image_server.failing.clear()
+        await asyncio.sleep(0.25)
+        assert await downloader.download_image(url)
+
+    assert image_server.hits["/flaky.png"] == 2
+    assert len(downloader.failed_urls) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_wechat_url_backs_off(downloader, image_server):
+    """测试改写后的微信URL失败时按原始URL记录，退避期内不再请求"""
+    downloader.max_retries = 1
+    url = f"{image_server.base}/mmbiz.qpic.cn/denied.png?wx_fmt=png"
+
+    async with downloader:
+        assert await downloader.download_image(url) is None
+        assert await downloader.download_image(url) is None
+
+    assert image_server.hits["/mmbiz.qpic.cn/denied.png"] == 1
+    assert downloader.failed_urls.retry_after(downloader._normalize_url(url)) > 0
+
+
+@pytest.mark.asyncio
+async def test_same_basename_downloads_are_content_addressed(downloader, image_server):
+    """测试同名不同URL的图片互不覆盖，任务结束后临时文件被删除"""
+    bodies = {"/files/a/640": create_png(), "/files/b/640": create_gif()}
+    image_server.bodies.update(bodies)
+    storage = downloader.temp_storage
+
+    async with downloader, downloader.temp_job() as job:
+        paths = await asyncio.gather(*(
+            downloader.download_image(f"{image_server.base}{path}", job=job) for path in bodies
+        ))
+        for path, body in zip(paths, bodies.values()):
+            assert os.path.dirname(path) == job.dir
+            assert os.path.basename(path) == hashlib.sha256(body).hexdigest() + os.path.splitext(path)[1]
+            assert open(path, "rb").read() == body
+        assert storage.usage == sum(len(body) for body in bodies.values())
+
+    assert not os.path.exists(job.dir)
+    assert storage.usage == 0
+    assert REGISTRY.get_sample_value("mdimg_disk_usage_bytes", {"path": "temp"}) == 0
+
+
+@pytest.mark.asyncio
+async def test_jobs_sharing_a_download_get_their_own_copy(downloader, image_server):
+    """测试多个任务共享同一次下载时各自持有文件，互不影响清理"""
+    url = f"{image_server.base}/files/c/shared.png"
+    image_server.bodies["/files/c/shared.png"] = create_png()
+    storage = downloader.temp_storage
+
+    async with downloader:
+        job_a, job_b = storage.create_job(), storage.create_job()
+        path_a, path_b = await asyncio.gather(
+            downloader.download_image(url, job=job_a),
+            downloader.download_image(url, job=job_b),
+        )
+        # 硬链接只计算一次占用
+        assert storage.usage == len(create_png())
+        job_a.cleanup()
+
+    assert path_a != path_b and not os.path.exists(path_a)
+    assert open(path_b, "rb").read() == create_png()
+    job_b.cleanup()
+    assert storage.usage == 0
+
+
+@pytest.mark.asyncio
+async def test_temp_quota_aborts_download(make_downloader, image_server):
+    """测试超过临时目录配额时中止下载且不记录为URL失败"""
+    downloader = make_downloader(temp_quota=100)
+    image_server.bodies["/stream/big.png"] = create_png() + b"\x00" * 4096
+    url = f"{image_server.base}/stream/big.png"
+
+    async with downloader, downloader.temp_job() as job:
+        assert await downloader.download_image(url, job=job) is None
+        assert os.listdir(job.dir) == []
+
+    assert "临时目录空间不足" in downloader.processing_state[url]["errors"][0]
+    assert len(downloader.failed_urls) == 0
+    assert downloader.temp_storage.usage == 0
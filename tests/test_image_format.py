@@ -0,0 +1,101 @@
+"""自动选择输出格式测试模块"""
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+from mdimg_transfer.core import image_processor
+from mdimg_transfer.core.config import ImageConfig
+from mdimg_transfer.core.image_processor import ImageProcessor, choose_format
+
+
+def screenshot(size=(800, 450)):
+    """文字截图，适合无损 WebP"""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 18):
+        draw.text((10, y), "def handler(request): return render(request) " * 2, fill="black")
+    return image
+
+
+def photo(size=(800, 600)):
+    noise = Image.effect_noise(size, 30).convert("RGB").filter(ImageFilter.GaussianBlur(2))
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    return Image.blend(noise, gradient, 0.5)
+
+
+def test_png_screenshot_uses_lossless_webp():
+    """测试 PNG 截图改用更小的无损 WebP，像素不变"""
+    image = screenshot()
+    output, format, sizes = choose_format(image, "PNG", 85, ("WEBP", "AVIF"), 38.0, workers=2)
+
+    assert format == "WEBP"
+    assert set(sizes) == {"PNG", "WEBP"}
+    assert sizes["WEBP"] < sizes["PNG"]
+    with Image.open(output) as decoded:
+        assert ImageChops.difference(decoded.convert("RGB"), image).getbbox() is None
+
+
+def test_quality_threshold_keeps_source_format():
+    """测试有损候选格式达不到质量要求时保留原格式"""
+    output, format, sizes = choose_format(photo(), "JPEG", 85, ("WEBP", "AVIF", "NOPE"), 1000.0)
+
+    assert format == "JPEG"
+    assert "NOPE" not in sizes
+    assert output.tell() == sizes["JPEG"]
+
+
+def test_smallest_acceptable_format_wins():
+    """测试满足质量要求时取最小的格式"""
+    _, format, sizes = choose_format(photo(), "JPEG", 85, ("WEBP",), 30.0)
+
+    assert sizes[format] == min(sizes.values())
+
+
+@pytest.mark.asyncio
+async def test_decision_cached_per_content_hash(tmp_path, monkeypatch):
+    """测试相同内容的图片只比较一次格式"""
+    calls = []
+    original = image_processor.choose_format
+
+    def counting(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(image_processor, "choose_format", counting)
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    screenshot().save(first)
+    screenshot().save(second)
+    out = tmp_path / "out"
+    out.mkdir()
+    processor = ImageProcessor(cache_dir=str(out), temp_dir=str(tmp_path / "temp"),
+                               backend="thread", config=ImageConfig(format="auto"))
+
+    async with processor:
+        results = [await processor.process_image(str(path)) for path in (first, second)]
+
+    assert calls == ["PNG"]
+    assert [result.stats["format"] for result in results] == ["WEBP", "WEBP"]
+    assert results[1].output_path.endswith("b_processed.webp")
+    assert len(processor.format_decisions) == 1
+
+
+@pytest.mark.asyncio
+async def test_animated_gif_skips_auto_format(tmp_path):
+    """测试 auto 模式不把动画GIF转换为只有一帧的格式"""
+    source = tmp_path / "anim.gif"
+    frames = [Image.new("RGB", (64, 64), (i * 50, 0, 0)) for i in range(5)]
+    frames[0].save(source, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    out = tmp_path / "out"
+    out.mkdir()
+    processor = ImageProcessor(cache_dir=str(out), temp_dir=str(tmp_path / "temp"),
+                               backend="thread", config=ImageConfig(format="auto"))
+
+    async with processor:
+        result = await processor.process_image(str(source))
+
+    assert result.success, result.error
+    assert result.stats["format"] == "GIF"
+    assert result.mime_type == "image/gif"
+    with Image.open(result.output_path) as image:
+        assert image.n_frames == 5
+    assert len(processor.format_decisions) == 0
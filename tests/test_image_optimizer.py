@@ -0,0 +1,96 @@
+"""图片大小优化测试模块"""
+
+import io
+import pytest
+from PIL import Image
+
+from mdimg_transfer.core import image_processor
+from mdimg_transfer.core.config import ImageConfig
+from mdimg_transfer.core.image_processor import ImageProcessor, encode_image, optimize_image_size
+from mdimg_transfer.errors import ImageProcessingError
+
+
+def noisy_image(size=(800, 600)):
+    """带噪声的图片，编码大小随质量明显变化"""
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    return Image.blend(noise, gradient, 0.5)
+
+
+@pytest.fixture
+def encode_count(monkeypatch):
+    """统计编码次数"""
+    calls = []
+    original = image_processor.encode_image
+
+    def counting(image, format, quality):
+        calls.append(quality)
+        return original(image, format, quality)
+
+    monkeypatch.setattr(image_processor, "encode_image", counting)
+    return calls
+
+
+@pytest.mark.parametrize("format", ["JPEG", "WEBP"])
+def test_binary_search_finds_highest_fitting_quality(format, encode_count):
+    """测试二分查找得到满足限制的最高质量，且编码次数远少于逐级降低"""
+    image = noisy_image()
+    max_size = encode_image(image, format, 40).tell() + 1
+
+    output, quality, result = optimize_image_size(image, format, 85, max_size, tolerance=0)
+
+    assert output.tell() <= max_size
+    assert encode_image(image, format, quality + 1).tell() > max_size
+    assert result is image
+    assert len(encode_count) <= 7
+
+
+def test_tolerance_stops_early(encode_count):
+    """测试结果进入容差范围后停止查找"""
+    image = noisy_image()
+    max_size = encode_image(image, "JPEG", 60).tell()
+
+    output, _, _ = optimize_image_size(image, "JPEG", 85, max_size, tolerance=0.5)
+
+    assert max_size * 0.5 <= output.tell() <= max_size
+    assert len(encode_count) == 1
+
+
+@pytest.mark.parametrize("format", ["JPEG", "PNG"])
+def test_downscale_when_quality_is_not_enough(format):
+    """测试最低质量仍超出限制时缩小尺寸"""
+    image = noisy_image()
+    max_size = encode_image(image, "JPEG", 10).tell() // 3
+
+    output, _, result = optimize_image_size(image, format, 85, max_size)
+
+    assert output.tell() <= max_size
+    assert result.width < image.width and result.height < image.height
+    assert result.width / result.height == pytest.approx(image.width / image.height, rel=0.01)
+    with Image.open(io.BytesIO(output.getvalue())) as decoded:
+        assert decoded.size == result.size
+
+
+def test_impossible_limit_raises():
+    """测试无法满足的大小限制"""
+    with pytest.raises(ImageProcessingError):
+        optimize_image_size(noisy_image((64, 64)), "JPEG", 85, 10, max_downscales=1)
+
+
+@pytest.mark.asyncio
+async def test_processor_reports_final_size(tmp_path):
+    """测试处理结果中的尺寸和质量来自优化后的图片"""
+    source = tmp_path / "photo.jpg"
+    noisy_image((1600, 1200)).save(source, format="JPEG", quality=95)
+    out = tmp_path / "out"
+    out.mkdir()
+    processor = ImageProcessor(cache_dir=str(out), temp_dir=str(tmp_path / "temp"),
+                               config=ImageConfig(max_file_size=40 * 1024))
+
+    async with processor:
+        result = await processor.process_image(str(source))
+
+    assert result.success, result.error
+    assert result.stats["processed_size"] <= 40 * 1024
+    with Image.open(result.output_path) as image:
+        assert image.size == (result.stats["width"], result.stats["height"])
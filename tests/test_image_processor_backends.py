@@ -0,0 +1,146 @@
+"""图片处理后端测试模块"""
+
+import io
+import os
+import asyncio
+import math
+import pytest
+from PIL import Image, ImageChops, ImageStat
+from prometheus_client import REGISTRY
+
+from mdimg_transfer.core.config import ImageConfig
+from mdimg_transfer.core.image_processor import ImageProcessor
+
+
+def write_image(path, size, format, mode="RGB"):
+    """写入带渐变的测试图片，避免纯色图片被过度压缩"""
+    image = Image.linear_gradient("L").resize(size).convert(mode)
+    image.save(path, format=format)
+    return str(path)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """混合格式和尺寸的测试图片"""
+    return [
+        write_image(tmp_path / "photo.jpg", (3840, 2160), "JPEG"),
+        write_image(tmp_path / "shot.png", (1920, 1080), "PNG"),
+        write_image(tmp_path / "banner.webp", (2560, 1440), "WEBP"),
+        write_image(tmp_path / "thumb.jpg", (800, 600), "JPEG"),
+    ]
+
+
+def make_processor(tmp_path, backend, **kwargs):
+    out = tmp_path / f"out_{backend}"
+    out.mkdir(exist_ok=True)
+    return ImageProcessor(
+        cache_dir=str(out), temp_dir=str(tmp_path / "temp"), backend=backend,
+        config=ImageConfig(max_width=1280, max_height=720), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_backend_matches_thread_backend(tmp_path, corpus):
+    """测试进程后端与线程后端输出一致"""
+    results = {}
+    for backend in ("thread", "process"):
+        async with make_processor(tmp_path, backend, max_workers=2) as processor:
+            results[backend] = await asyncio.gather(
+                *(processor.process_image(path) for path in corpus)
+            )
+
+    for thread_result, process_result in zip(results["thread"], results["process"]):
+        assert thread_result.success and process_result.success
+        assert thread_result.stats == process_result.stats
+        assert open(thread_result.output_path, "rb").read() == open(process_result.output_path, "rb").read()
+        assert os.path.dirname(process_result.output_path) == str(tmp_path / "out_process")
+
+
+@pytest.mark.asyncio
+async def test_process_backend_warms_workers(tmp_path):
+    """测试进入上下文时启动全部 worker，处理失败以结果返回"""
+    processor = make_processor(tmp_path, "process", max_workers=2)
+    async with processor:
+        assert processor._warmed_up
+        result = await processor.process_image(str(tmp_path / "missing.png"))
+
+    assert result.success is False
+    assert "missing.png" in result.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["thread", "process"])
+async def test_process_bytes_matches_file_api(tmp_path, corpus, backend):
+    """测试内存 API 与文件 API 输出一致，且不写入输出目录"""
+    async with make_processor(tmp_path, backend, max_workers=1, result_cache_size=0) as processor:
+        from_file = await processor.process_image(corpus[1])
+        data = open(corpus[1], "rb").read()
+        from_view = await processor.process_bytes(memoryview(data))
+        from_bytes = await processor.process_bytes(io.BytesIO(data))
+
+    for result in (from_view, from_bytes):
+        assert result.success, result.error
+        assert result.output_path is None
+        assert result.output.getbuffer() == open(from_file.output_path, "rb").read()
+        # 格式选择已缓存，后续调用不再比较候选格式
+        assert result.stats["format_candidates"] is None
+        assert dict(result.stats, format_candidates=None) == dict(from_file.stats, format_candidates=None)
+    assert os.listdir(tmp_path / f"out_{backend}") == [os.path.basename(from_file.output_path)]
+
+
+def test_unknown_backend_rejected(tmp_path):
+    """测试未知后端"""
+    with pytest.raises(ValueError):
+        make_processor(tmp_path, "gpu")
+
+
+def processing_count(operation):
+    return REGISTRY.get_sample_value(
+        "mdimg_processing_duration_seconds_count", {"operation": operation}
+    ) or 0
+
+
+@pytest.mark.asyncio
+async def test_jpeg_draft_fast_path(tmp_path, corpus):
+    """测试大尺寸 JPEG 由解码器直接缩小，输出质量与完整解码一致"""
+    before = processing_count("decode_draft")
+    async with make_processor(tmp_path, "thread") as processor:
+        fast = await processor.process_image(corpus[0])
+        fast_image = Image.open(fast.output_path).convert("RGB")
+        full = await processor.process_image(corpus[0], {"draft_gap": 0})
+        full_image = Image.open(full.output_path).convert("RGB")
+        small = await processor.process_image(corpus[3])
+
+    assert "decode_draft" in fast.timings and "resize" in fast.timings
+    assert "decode" in full.timings and "decode" in small.timings
+    assert processing_count("decode_draft") == before + 1
+    assert (fast.stats["width"], fast.stats["height"]) == (1280, 720)
+    assert (full.stats["width"], full.stats["height"]) == (1280, 720)
+
+    diff = ImageChops.difference(fast_image, full_image)
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(diff).rms) / 3
+    assert mse == 0 or 10 * math.log10(255 ** 2 / mse) > 40
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_backend_throughput(tmp_path, corpus, backend, benchmark):
+    """测量线程后端与进程后端处理混合图片的耗时，结果见基准测试报告"""
+    batch = corpus * 3
+    loop = asyncio.new_event_loop()
+    # 关闭处理结果缓存，重复的图片同样需要完整处理
+    processor = make_processor(tmp_path, backend, max_workers=os.cpu_count(), result_cache_size=0)
+    try:
+        loop.run_until_complete(processor.__aenter__())
+
+        async def process_batch():
+            return await asyncio.gather(*(processor.process_image(path) for path in batch))
+
+        results = benchmark.pedantic(lambda: loop.run_until_complete(process_batch()),
+                                     rounds=1, iterations=1)
+        loop.run_until_complete(processor.__aexit__(None, None, None))
+    finally:
+        loop.close()
+
+    assert all(result.success for result in results)
+    assert not any(result.cached for result in results)
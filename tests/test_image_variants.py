@@ -0,0 +1,105 @@
+"""响应式图片生成测试模块"""
+
+import os
+import pytest
+from PIL import Image
+
+from mdimg_transfer.core import image_processor
+from mdimg_transfer.core.config import ImageConfig
+from mdimg_transfer.core.image_processor import ImageProcessor
+
+
+def write_image(path, size, format="JPEG"):
+    Image.linear_gradient("L").resize(size).convert("RGB").save(path, format=format)
+    return str(path)
+
+
+@pytest.fixture
+def processor(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    return ImageProcessor(cache_dir=str(out), temp_dir=str(tmp_path / "temp"), backend="thread",
+                          config=ImageConfig(format="jpeg", variant_widths=(480, 960, 1920)))
+
+
+@pytest.mark.asyncio
+async def test_variants_from_single_decode(tmp_path, processor, monkeypatch):
+    """测试只打开一次原图即生成全部宽度"""
+    source = write_image(tmp_path / "photo.jpg", (5760, 3240))
+    opened = []
+    original_open = image_processor.Image.open
+
+    def counting_open(fp, *args, **kwargs):
+        opened.append(fp)
+        return original_open(fp, *args, **kwargs)
+
+    monkeypatch.setattr(image_processor.Image, "open", counting_open)
+    async with processor:
+        result = await processor.process_variants(source)
+
+    assert result.success, result.error
+    assert opened == [source]
+    assert [(v.width, v.height) for v in result.variants] == [(1920, 1080), (960, 540), (480, 270)]
+    assert result.output_path == result.variants[0].output_path
+    assert "decode_draft" in result.timings and "encode" in result.timings
+    for variant in result.variants:
+        assert variant.output_path.endswith(f"photo_{variant.width}w.jpeg")
+        assert os.path.getsize(variant.output_path) == variant.size
+        with Image.open(variant.output_path) as image:
+            assert image.size == (variant.width, variant.height)
+
+
+@pytest.mark.asyncio
+async def test_widths_above_source_collapse(tmp_path, processor):
+    """测试超过原图的宽度合并为原图尺寸"""
+    source = write_image(tmp_path / "small.png", (800, 600), "PNG")
+    output_dir = tmp_path / "job"
+    output_dir.mkdir()
+    async with processor:
+        result = await processor.process_variants(source, widths=(1920, 480, 960),
+                                                  output_dir=str(output_dir))
+
+    assert [v.width for v in result.variants] == [800, 480]
+    assert all(os.path.dirname(v.output_path) == str(output_dir) for v in result.variants)
+
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["thread", "process"])
+async def test_variants_in_memory(tmp_path, backend):
+    """测试内存模式下各尺寸不写入磁盘，编码结果保存在 output 中"""
+    source = write_image(tmp_path / "photo.jpg", (2400, 1350))
+    out = tmp_path / "out"
+    out.mkdir()
+    processor = ImageProcessor(cache_dir=str(out), temp_dir=str(tmp_path / "temp"), backend=backend,
+                               config=ImageConfig(format="webp", variant_widths=(480, 960)))
+    async with processor:
+        result = await processor.process_variants(source, in_memory=True)
+
+    assert result.success, result.error
+    assert not [name for name in os.listdir(out) if name.startswith("photo")]
+    assert result.output_path is None and result.output is result.variants[0].output
+    for variant in result.variants:
+        assert variant.output_path is None
+        assert variant.output.getbuffer().nbytes == variant.size
+        with Image.open(variant.output) as image:
+            assert image.format == "WEBP"
+            assert image.size == (variant.width, variant.height)
+
+
+@pytest.mark.asyncio
+async def test_animated_source_keeps_original(tmp_path, processor):
+    """测试动画图片不生成多个尺寸，保留原图的全部帧"""
+    source = str(tmp_path / "anim.gif")
+    frames = [Image.new("RGB", (1600, 900), (i * 50, 0, 0)) for i in range(5)]
+    frames[0].save(source, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    async with processor:
+        result = await processor.process_variants(source, config={"format": "webp"})
+
+    assert result.success, result.error
+    assert result.variants == []
+    assert result.output_path == source
+    assert result.stats["animated"]
+    assert not [name for name in os.listdir(processor.cache_dir) if name.startswith("anim")]
+    with Image.open(source) as image:
+        assert image.n_frames == 5
@@ -0,0 +1,207 @@
+"""Markdown处理器测试模块"""
+
+import io
+import asyncio
+import contextlib
+import pytest
+from mdimg_transfer.core.image_processor import ImageVariant, ProcessingResult
+from mdimg_transfer.core.markdown_processor import MarkdownProcessor
+
+
+class FakeDownloader:
+    """模拟图片下载器"""
+
+    def __init__(self, failed=(), waits=None):
+        self.failed = set(failed)
+        self.waits = waits or {}
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def temp_job(self):
+        return contextlib.nullcontext()
+
+    async def download_image(self, url, job=None):
+        self.calls.append(url)
+        if url in self.waits:
+            await self.waits[url].wait()
+        return None if url in self.failed else f"/tmp/{abs(hash(url))}.png"
+
+    def get_content_hash(self, url):
+        return None
+
+
+class FakeUploader:
+    """模拟R2上传器"""
+
+    def __init__(self):
+        self.uploaded = []
+        self.first_upload = asyncio.Event()
+
+    async def upload_image(self, file_path, object_name, content_hash=None):
+        self.uploaded.append(file_path)
+        self.first_upload.set()
+        return f"https://cdn.example.com/{object_name}"
+
+    async def upload_bytes(self, data, object_name, content_type=None):
+        self.uploaded.append((object_name, data.getvalue(), content_type))
+        self.first_upload.set()
+        return f"https://cdn.example.com/{object_name}"
+
+
+class FakeImageProcessor:
+    """模拟图片处理器，每张图片在内存中生成两个宽度"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def process_variants(self, input_path, content_hash=None, output_dir=None, in_memory=False):
+        self.calls.append((input_path, in_memory))
+        variants = [ImageVariant(width, width // 2, None, 100, io.BytesIO(b"w%d" % width))
+                    for width in (960, 480)]
+        return ProcessingResult(True, None, "image/webp", {"format": "WEBP"},
+                                variants=variants, output=variants[0].output)
+
+
+@pytest.fixture
+def processor():
+    return MarkdownProcessor(downloader=FakeDownloader(), r2_uploader=FakeUploader())
+
+
+def test_parse_records_url_spans(processor):
+    """测试解析时记录URL位置"""
+    content = 'a ![x](https://a.com/1.png "t") b <img src="https://b.com/2.png" alt="y"> c'
+    links = processor.parse_image_links(content)
+
+    assert [link.url for link in links] == ["https://a.com/1.png", "https://b.com/2.png"]
+    for link in links:
+        assert content[link.start:link.end] == link.url
+
+
+def test_rewrite_preserves_formatting(processor):
+    """测试重写只替换URL，保留原有格式"""
+    content = (
+        '![logo]( https://a.com/1.png   "My Title" )\n'
+        "<img alt='pic' src='https://b.com/2.png' alt='pic'>\n"
+        "![again](https://a.com/1.png)\n"
+    )
+    processor.parse_image_links(content)
+    result = processor.rewrite_content(content, {
+        "https://a.com/1.png": "https://r2/1.png",
+        "https://b.com/2.png": "https://r2/2.png",
+    })
+
+    assert result.count("https://r2/1.png") == 2
+    assert "src='https://r2/2.png'" in result
+    assert '"My Title"' in result
+    assert "https://a.com" not in result
+
+
+def test_rewrite_keeps_unmapped_links(processor):
+    """测试未映射的链接保持不变"""
+    content = "![a](https://a.com/1.png) ![b](https://b.com/2.png)"
+    processor.parse_image_links(content)
+    result = processor.rewrite_content(content, {"https://b.com/2.png": "https://r2/2.png"})
+    assert result == "![a](https://a.com/1.png) ![b](https://r2/2.png)"
+
+
+@pytest.mark.asyncio
+async def test_process_content_rewrites_successful_uploads():
+    """测试处理内容时替换成功上传的链接"""
+    downloader = FakeDownloader(failed={"https://b.com/2.png"})
+    processor = MarkdownProcessor(downloader=downloader, r2_uploader=FakeUploader())
+    content = "![a](https://a.com/1.png)\n![b](https://b.com/2.png)\n![a](https://a.com/1.png)"
+
+    new_content, results = await processor.process_content(content)
+
+    assert sorted(downloader.calls) == ["https://a.com/1.png", "https://b.com/2.png"]
+    assert results["https://a.com/1.png"][0] is True
+    assert results["https://b.com/2.png"] == (False, "下载失败")
+    assert "https://a.com/1.png" not in new_content
+    assert "![b](https://b.com/2.png)" in new_content
+
+
+@pytest.mark.asyncio
+async def test_uploads_start_before_slow_download_finishes():
+    """测试慢速下载不会阻塞其他图片的上传"""
+    slow_url = "https://slow.com/big.gif"
+    uploader = FakeUploader()
+    # 慢速下载要等到第一次上传之后才完成；上传必须等全部下载结束时会一直等待
+    downloader = FakeDownloader(waits={slow_url: uploader.first_upload})
+    processor = MarkdownProcessor(
+        downloader=downloader, r2_uploader=uploader,
+        download_concurrency=4, upload_concurrency=2, queue_size=1
+    )
+    content = f"![slow]({slow_url})\n" + "".join(
+        f"![f{i}](https://fast.com/{i}.png)\n" for i in range(5)
+    )
+
+    _, results = await asyncio.wait_for(processor.process_content(content), timeout=10)
+
+    assert all(ok for ok, _ in results.values())
+    assert len(uploader.uploaded) == 6
+    assert uploader.uploaded[0] != f"/tmp/{abs(hash(slow_url))}.png"
+
+
+class SliceCountingStr(str):
+    """记录切片操作的字符串，用于统计重写时读取原文的次数和字符数"""
+
+    def __getitem__(self, key):
+        self.slices.append(key)
+        return super().__getitem__(key)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("n", [500, 4000])
+def test_rewrite_scales_linearly(processor, n, benchmark):
+    """测试重写对原文只做一遍切片，工作量与文档大小和图片数量成线性关系"""
+    block = "Some paragraph text that pads the document.\n" * 20
+    content = "".join(
+        f"{block}![img{i}](https://cdn.example.com/img{i}.png)\n" for i in range(n)
+    )
+    links = processor.parse_image_links(content)
+    replacements = {link.url: link.url.replace("cdn", "r2") for link in links}
+
+    counted = SliceCountingStr(content)
+    counted.slices = []
+    result = processor.rewrite_content(counted, replacements, links)
+
+    assert result == content.replace("cdn", "r2")
+    # 每个链接之间切一次，原文每个字符至多复制一次；O(n·m) 实现会反复扫描整篇文档
+    assert len(counted.slices) == n + 1
+    copied = sum(len(range(*key.indices(len(content)))) for key in counted.slices)
+    assert copied <= len(content)
+
+    benchmark(processor.rewrite_content, content, replacements, links)
+
+
+@pytest.mark.asyncio
+async def test_process_content_emits_srcset():
+    """测试配置图片处理器时生成 srcset"""
+    image_processor = FakeImageProcessor()
+    uploader = FakeUploader()
+    processor = MarkdownProcessor(downloader=FakeDownloader(), r2_uploader=uploader,
+                                  image_processor=image_processor)
+    content = ('![a "b"](https://a.com/1.png "T")\n'
+               "<img src='https://b.com/2.png' alt='y'>\n")
+
+    result, results = await processor.process_content(content)
+
+    assert all(ok for ok, _ in results.values())
+    # 各尺寸在内存中生成并直接上传，不写入临时目录
+    assert [in_memory for _, in_memory in image_processor.calls] == [True, True]
+    assert sorted((data, content_type) for _, data, content_type in uploader.uploaded) == [
+        (b"w480", "image/webp"), (b"w480", "image/webp"),
+        (b"w960", "image/webp"), (b"w960", "image/webp"),
+    ]
+    lines = result.splitlines()
+    assert lines[0].startswith('<img src="https://cdn.example.com/')
+    assert '_960w.webp 960w, https://cdn.example.com/' in lines[0]
+    assert 'alt="a &quot;b&quot;" title="T">' in lines[0]
+    assert lines[1].startswith("<img src='https://cdn.example.com/")
+    assert "_960w.webp' srcset=\"https://cdn.example.com/" in lines[1]
+    assert lines[1].endswith("_480w.webp 480w\" alt='y'>")
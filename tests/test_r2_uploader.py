@@ -0,0 +1,368 @@
+"""R2上传器测试模块"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import hashlib
+import multiprocessing
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+from mdimg_transfer.config import config
+from mdimg_transfer.core.image_processor import ImageProcessor
+from mdimg_transfer.core.r2_uploader import R2Uploader, build_transfer_config
+
+
+class S3StubHandler(BaseHTTPRequestHandler):
+    """最小的 S3 兼容接口，实现 PutObject、GetObject、HeadObject 和分片上传"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    # 丢弃 trailer
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        body = self._read_body()
+        time.sleep(self.server.delay)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if "uploadId" in query:
+            upload_id = query["uploadId"][0]
+            part = int(query["partNumber"][0])
+            self.server.uploads[upload_id][part] = body
+            self.server.parts += 1
+        else:
+            self.server.objects[url.path] = body
+            self.server.puts += 1
+        self._send(200, headers={"ETag": '"stub"'})
+
+    def do_POST(self):
+        self._read_body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        if "uploads" in query:
+            upload_id = f"upload-{len(self.server.uploads)}"
+            self.server.uploads[upload_id] = {}
+            body = (
+                "<InitiateMultipartUploadResult>"
+                f"<Bucket>bucket</Bucket><Key>{url.path}</Key><UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>"
+            )
+        else:
+            parts = self.server.uploads.pop(query["uploadId"][0])
+            self.server.objects[url.path] = b"".join(parts[n] for n in sorted(parts))
+            self.server.puts += 1
+            body = (
+                "<CompleteMultipartUploadResult>"
+                f"<Key>{url.path}</Key><ETag>\"stub\"</ETag>"
+                "</CompleteMultipartUploadResult>"
+            )
+        self._send(200, body.encode(), {"Content-Type": "application/xml"})
+
+    def do_HEAD(self):
+        path = urlparse(self.path).path
+        if path in self.server.objects:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(self.server.objects[path])))
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/_stats":
+            stats = {
+                "objects": len(self.server.objects),
+                "puts": self.server.puts,
+                "parts": self.server.parts,
+            }
+            self._send(200, json.dumps(stats).encode())
+        elif path in self.server.objects:
+            self._send(200, self.server.objects[path])
+        else:
+            self._send(404)
+
+
+def _serve_s3_stub(conn, delay: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), S3StubHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.objects = {}
+    server.puts = 0
+    server.parts = 0
+    server.uploads = {}
+    conn.send(server.server_address)
+    server.serve_forever()
+
+
+class S3Stub:
+    """在独立进程中运行的本地 S3 兼容服务"""
+
+    def __init__(self, delay: float = 0.0):
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve_s3_stub, args=(child, delay), daemon=True
+        )
+        self.process.start()
+        host, port = parent.recv()
+        self.endpoint = f"http://{host}:{port}"
+
+    def get(self, path: str) -> bytes:
+        with urlopen(f"{self.endpoint}{path}") as response:
+            return response.read()
+
+    def stats(self) -> dict:
+        return json.loads(self.get("/_stats"))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+
+@pytest.fixture
+def s3_stub_factory():
+    """启动本地 S3 兼容服务"""
+    stubs = []
+
+    def factory(delay: float = 0.0) -> S3Stub:
+        stub = S3Stub(delay)
+        stubs.append(stub)
+        return stub
+
+    yield factory
+    for stub in stubs:
+        stub.stop()
+
+
+@pytest.fixture
+def uploader_factory(monkeypatch):
+    """创建连接到本地 S3 服务的上传器"""
+    monkeypatch.setattr(config, "R2_ACCESS_KEY_ID", "test_key")
+    monkeypatch.setattr(config, "R2_SECRET_ACCESS_KEY", "test_secret")
+    monkeypatch.setattr(config, "R2_BUCKET_NAME", "bucket")
+    monkeypatch.setattr(config, "R2_PUBLIC_URL", "https://cdn.example.com")
+    uploaders = []
+
+    def factory(stub: S3Stub, **kwargs) -> R2Uploader:
+        monkeypatch.setattr(config, "R2_ENDPOINT_URL", stub.endpoint)
+        uploader = R2Uploader(**kwargs)
+        uploaders.append(uploader)
+        return uploader
+
+    yield factory
+    for uploader in uploaders:
+        uploader.close()
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"0" * 1024)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_upload_image(uploader_factory, s3_stub_factory, image_file):
+    """测试上传图片"""
+    stub = s3_stub_factory()
+    uploader = uploader_factory(stub, content_addressed=False)
+    url = await uploader.upload_image(image_file, "a/image.png")
+
+    assert url == "https://cdn.example.com/a/image.png"
+    assert stub.get("/bucket/a/image.png").startswith(b"\x89PNG")
+
+
+def test_content_type_by_extension(uploader_factory, s3_stub_factory):
+    """测试按扩展名设置 ContentType，auto 模式可能输出 AVIF"""
+    uploader = uploader_factory(s3_stub_factory())
+    assert uploader._get_content_type("a/image.avif") == "image/avif"
+    assert uploader._get_content_type("a/icon.svg") == "image/svg+xml"
+    assert uploader._get_content_type("a/favicon.ICO") == "image/x-icon"
+    assert uploader._get_content_type("a/file.bin") == "application/octet-stream"
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_upload_dedupes(uploader_factory, s3_stub_factory, image_file, tmp_path):
+    """测试相同内容只上传一次"""
+    stub = s3_stub_factory()
+    uploader = uploader_factory(stub)
+    copy = tmp_path / "copy.PNG"
+    copy.write_bytes(open(image_file, "rb").read())
+
+    urls = await asyncio.gather(
+        uploader.upload_image(image_file, "image.png"),
+        uploader.upload_image(image_file, "image.png"),
+        uploader.upload_image(str(copy), "copy.PNG"),
+    )
+    again = await uploader.upload_image(image_file, "other.png")
+
+    digest = hashlib.sha256(open(image_file, "rb").read()).hexdigest()
+    key = f"sha256/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert set(urls) == {again} == {f"https://cdn.example.com/{key}"}
+    assert stub.stats() == {"objects": 1, "puts": 1, "parts": 0}
+
+
+@pytest.mark.asyncio
+async def test_known_keys_are_bounded(uploader_factory, s3_stub_factory, tmp_path):
+    """测试已存在对象键的本地记录有上限，被淘汰的键通过 HEAD 确认而不重复上传"""
+    stub = s3_stub_factory()
+    uploader = uploader_factory(stub)
+    uploader._known_keys.max_size = 2
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes([i]) * 64)
+        paths.append(str(path))
+        await uploader.upload_image(str(path), f"{i}.png")
+
+    assert len(uploader._known_keys) == 2
+    await uploader.upload_image(paths[0], "0.png")
+    assert stub.stats()["puts"] == 3
+
+
+@pytest.mark.asyncio
+async def test_content_addressed_upload_skips_existing_object(uploader_factory, s3_stub_factory, image_file):
+    """测试对象已存在时通过 HEAD 跳过上传"""
+    stub = s3_stub_factory()
+    await uploader_factory(stub).upload_image(image_file, "image.png")
+
+    # 新的上传器没有本地索引，需要通过 HEAD 确认
+    url = await uploader_factory(stub).upload_image(image_file, "image.png")
+
+    assert url.startswith("https://cdn.example.com/sha256/")
+    assert stub.stats()["puts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_large_file_uses_multipart_upload(uploader_factory, s3_stub_factory, tmp_path):
+    """测试超过阈值的文件并发上传分片"""
+    stub = s3_stub_factory()
+    mb = 1024 * 1024
+    uploader = uploader_factory(
+        stub,
+        content_addressed=False,
+        transfer_config=build_transfer_config(
+            multipart_threshold=5 * mb, multipart_chunksize=5 * mb, max_concurrency=3
+        )
+    )
+    data = os.urandom(12 * mb)
+    path = tmp_path / "large.gif"
+    path.write_bytes(data)
+
+    await uploader.upload_image(str(path), "large.gif")
+
+    assert stub.stats()["parts"] == 3
+    assert stub.get("/bucket/large.gif") == data
+
+
+@pytest.mark.asyncio
+async def test_upload_bytes_from_buffer(uploader_factory, s3_stub_factory):
+    """测试直接上传内存缓冲区"""
+    stub = s3_stub_factory()
+    mb = 1024 * 1024
+    uploader = uploader_factory(
+        stub,
+        transfer_config=build_transfer_config(
+            multipart_threshold=5 * mb, multipart_chunksize=5 * mb
+        )
+    )
+    small = b"GIF89a" + b"1" * 100
+    large = io.BytesIO(os.urandom(6 * mb))
+    large.seek(1000)
+
+    small_url = await uploader.upload_bytes(small, "small.gif")
+    large_url = await uploader.upload_bytes(large, "large.png")
+    # 上传整个缓冲区，不改变调用方的读写位置
+    assert large.tell() == 1000
+    # 相同内容以 memoryview 形式再次上传会被去重
+    again_url = await uploader.upload_bytes(memoryview(small), "dup.gif")
+
+    assert small_url == again_url
+    assert small_url.endswith(".gif") and large_url.endswith(".png")
+    assert stub.get(small_url.replace("https://cdn.example.com", "/bucket")) == small
+    assert stub.get(large_url.replace("https://cdn.example.com", "/bucket")) == large.getvalue()
+    assert stub.stats() == {"objects": 2, "puts": 2, "parts": 2}
+
+
+@pytest.mark.asyncio
+async def test_upload_processed_buffer(uploader_factory, s3_stub_factory, tmp_path):
+    """测试处理结果不经过磁盘直接上传"""
+    from PIL import Image
+    stub = s3_stub_factory()
+    uploader = uploader_factory(stub)
+    source = io.BytesIO()
+    Image.linear_gradient("L").resize((640, 480)).convert("RGB").save(source, format="JPEG")
+
+    async with ImageProcessor(temp_dir=str(tmp_path / "temp"), backend="thread") as processor:
+        result = await processor.process_bytes(source.getbuffer())
+    url = await uploader.upload_bytes(result.output, f"photo.{result.stats['format'].lower()}",
+                                      result.mime_type)
+
+    assert result.success, result.error
+    assert stub.get(url.replace("https://cdn.example.com", "/bucket")) == result.output.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_responsive_during_uploads(uploader_factory, s3_stub_factory, image_file):
+    """测试100个并发上传期间事件循环保持响应"""
+    stub = s3_stub_factory(delay=0.2)
+    uploader = uploader_factory(
+        stub, max_workers=20, max_pool_connections=20, content_addressed=False
+    )
+    # 预热：首次调用时 botocore 会加载服务模型
+    await uploader.upload_image(image_file, "warmup.png")
+    max_lag = 0.0
+    ticks = 0
+    done = asyncio.Event()
+
+    async def heartbeat():
+        nonlocal max_lag, ticks
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    urls = await asyncio.gather(*(
+        uploader.upload_image(image_file, f"img/{i}.png") for i in range(100)
+    ))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker
+
+    assert len(set(urls)) == 100
+    assert stub.stats()["objects"] == 101
+    # 同步上传每次会阻塞事件循环至少 200ms，100次共约20秒
+    assert elapsed < 5
+    assert max_lag < 0.2
+    assert ticks >= elapsed / 0.01 * 0.5
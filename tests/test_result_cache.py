@@ -0,0 +1,132 @@
+"""处理结果缓存测试模块"""
+
+import io
+import os
+import pytest
+from PIL import Image
+
+from mdimg_transfer.core import image_processor
+from mdimg_transfer.core.config import ImageConfig
+from mdimg_transfer.core.image_processor import ImageProcessor
+from mdimg_transfer.core.result_cache import ResultCache
+
+
+def test_key_normalizes_options():
+    """测试缓存键与选项顺序无关，忽略不影响输出的选项"""
+    options = {"quality": 85, "format": "auto", "auto_formats": ("WEBP",), "encode_workers": 2}
+    reordered = {"encode_workers": 8, "auto_formats": ("WEBP",), "format": "auto", "quality": 85}
+
+    key = ResultCache.make_key("abc", options, "1")
+    assert key == ResultCache.make_key("abc", reordered, "1")
+    assert key != ResultCache.make_key("abc", dict(options, quality=80), "1")
+    assert key != ResultCache.make_key("abd", options, "1")
+    assert key != ResultCache.make_key("abc", options, "2")
+
+
+def test_lru_eviction_and_persistence(tmp_path):
+    """测试按字节数淘汰最久未使用的结果，索引可在重启后恢复"""
+    cache = ResultCache(str(tmp_path), max_size=250)
+    # 每次读取都刷新访问时间，按严格的 LRU 顺序淘汰
+    cache._store.TOUCH_INTERVAL = 0
+    for key in ("a", "b"):
+        cache.store(key, b"x" * 100, "image/png", {"format": "PNG"})
+    cache.get("a")
+    cache.store("c", io.BytesIO(b"y" * 100), "image/png", {"format": "PNG"})
+
+    assert cache.get("b") is None
+    assert cache.total_size == 200
+    assert cache.store("huge", b"z" * 300, "image/png", {}) is None
+
+    reloaded = ResultCache(str(tmp_path), max_size=250)
+    assert [key for key in ("a", "b", "c") if reloaded.get(key)] == ["a", "c"]
+    assert reloaded.read(reloaded.get("c")).getvalue() == b"y" * 100
+
+
+def test_index_shared_between_instances(tmp_path):
+    """测试同一缓存目录的多个实例（例如多个工作进程）立即看到彼此的写入"""
+    first = ResultCache(str(tmp_path), max_size=250)
+    second = ResultCache(str(tmp_path), max_size=250)
+
+    first.store("a", b"x" * 100, "image/webp", {"format": "WEBP"})
+    entry = second.get("a")
+    assert entry is not None and entry.stats == {"format": "WEBP"}
+
+    # 另一个实例写入导致淘汰后，本实例不再返回已删除的结果
+    second.store("b", b"y" * 100, "image/webp", {})
+    second.store("c", b"z" * 100, "image/webp", {})
+    assert first.get("a") is None
+    assert first.total_size == 200
+
+
+def test_reads_do_not_write_index(tmp_path):
+    """测试刷新间隔内的重复读取不写入索引，删除和清空同时删除结果文件"""
+    cache = ResultCache(str(tmp_path), max_size=1000)
+    cache.store("a", b"x" * 100, "image/webp", {})
+    cache.store("b", b"y" * 100, "image/webp", {})
+
+    changes = cache._store._conn.total_changes
+    for _ in range(100):
+        assert cache.get("a") is not None
+    assert cache._store._conn.total_changes == changes
+
+    cache._store.remove("a")
+    assert cache.get("a") is None
+    assert not os.path.exists(tmp_path / "a")
+    cache.clear()
+    assert len(cache) == 0 and cache.total_size == 0
+    assert not os.path.exists(tmp_path / "b")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.linear_gradient("L").resize((1600, 1200)).convert("RGB").save(path, format="JPEG")
+    return str(path)
+
+
+def make_processor(tmp_path, **config):
+    return ImageProcessor(cache_dir=str(tmp_path / "out"), temp_dir=str(tmp_path / "temp"),
+                          backend="thread", config=ImageConfig(**config))
+
+
+@pytest.mark.asyncio
+async def test_hit_skips_processing(tmp_path, source, monkeypatch):
+    """测试相同内容和配置再次处理时不解码，重启后仍然命中"""
+    calls = []
+    original = image_processor.process_image_file
+
+    def counting(*args):
+        calls.append(args[0])
+        return original(*args)
+
+    monkeypatch.setattr(image_processor, "process_image_file", counting)
+    async with make_processor(tmp_path, format="jpeg") as processor:
+        first = await processor.process_image(source)
+        os.remove(first.output_path)
+        second = await processor.process_image(source)
+        other = await processor.process_image(source, {"quality": 60})
+
+    async with make_processor(tmp_path, format="jpeg") as restarted:
+        third = await restarted.process_image(source)
+        from_bytes = await restarted.process_bytes(open(source, "rb").read())
+
+    assert len(calls) == 2
+    assert not first.cached and not other.cached
+    assert second.cached and third.cached and from_bytes.cached
+    assert second.stats == first.stats and third.stats == first.stats
+    assert second.output_path == first.output_path == other.output_path
+    # 不同配置的结果写入同名文件时，不影响缓存中共享硬链接的结果
+    assert from_bytes.output.getbuffer().nbytes == first.stats["processed_size"]
+    with open(third.output_path, "rb") as f:
+        assert from_bytes.output.getvalue() == f.read()
+
+
+@pytest.mark.asyncio
+async def test_cache_disabled(tmp_path, source):
+    """测试缓存上限为0时不缓存"""
+    async with make_processor(tmp_path, result_cache_size=0) as processor:
+        await processor.process_image(source)
+        again = await processor.process_image(source)
+
+    assert processor.result_cache is None
+    assert not again.cached
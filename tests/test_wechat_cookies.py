@@ -0,0 +1,80 @@
+"""微信cookies缓存测试模块"""
+
+import asyncio
+import pytest
+
+from mdimg_transfer.core.wechat_cookies import WeChatCookieCache
+
+
+def make_fetch(values, delay=0.02):
+    """依次返回给定 cookies 的获取函数，记录调用次数"""
+    calls = []
+
+    async def fetch():
+        calls.append(len(calls))
+        await asyncio.sleep(delay)
+        return values[min(len(calls) - 1, len(values) - 1)]
+
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gets_share_one_fetch():
+    """测试40个并发请求只获取一次cookies"""
+    fetch, calls = make_fetch([{"sid": "1"}])
+    cache = WeChatCookieCache(fetch, ttl=60)
+
+    results = await asyncio.gather(*(cache.get() for _ in range(40)))
+    again = await cache.get()
+
+    assert len(calls) == 1
+    assert all(result == {"sid": "1"} for result in results)
+    assert again is results[0]
+
+
+@pytest.mark.asyncio
+async def test_invalidate_only_current_cookies():
+    """测试只有当前使用的cookies被拒绝时才重新获取"""
+    fetch, calls = make_fetch([{"sid": "1"}, {"sid": "2"}])
+    cache = WeChatCookieCache(fetch, ttl=60)
+    old = await cache.get()
+
+    cache.invalidate(old)
+    cache.invalidate(old)
+    new = await asyncio.gather(cache.get(), cache.get())
+    # 其他请求带着旧cookies失败时不会再次使新cookies失效
+    cache.invalidate(old)
+
+    assert new == [{"sid": "2"}, {"sid": "2"}]
+    assert await cache.get() == {"sid": "2"}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_refreshes_ahead_in_background():
+    """测试接近过期时返回旧值并在后台刷新"""
+    fetch, calls = make_fetch([{"sid": "1"}, {"sid": "2"}], delay=0.05)
+    cache = WeChatCookieCache(fetch, ttl=0.2, refresh_ahead=0.5)
+    await cache.get()
+    await asyncio.sleep(0.12)
+
+    stale = await asyncio.gather(*(cache.get() for _ in range(5)))
+    assert stale == [{"sid": "1"}] * 5
+    await asyncio.sleep(0.08)
+
+    assert await cache.get() == {"sid": "2"}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_cached_briefly():
+    """测试获取失败的结果在短时间内复用"""
+    fetch, calls = make_fetch([{}, {"sid": "1"}], delay=0)
+    cache = WeChatCookieCache(fetch, ttl=60, failure_ttl=0.1)
+
+    assert await cache.get() == {}
+    assert await cache.get() == {}
+    await asyncio.sleep(0.12)
+
+    assert await cache.get() == {"sid": "1"}
+    assert len(calls) == 2